@@ -0,0 +1,68 @@
+import random
+from datetime import datetime, timedelta
+from config.settings import DEFAULT_FAMILY_ID
+from repositories.expense_repository import DynamoDBExpenseRepository
+from repositories.family_repository import create_family_repository
+from repositories.rollup_repository import RollupRepository
+
+DESCRICOES = {
+    'alimentacao': ['almoço no restaurante', 'mercado do mês', 'padaria', 'ifood pizza', 'feira de domingo'],
+    'transporte': ['uber para o trabalho', 'gasolina', 'estacionamento shopping', 'passagem de ônibus'],
+    'saude': ['farmácia', 'consulta médica', 'exame de sangue', 'dentista'],
+    'lazer': ['cinema', 'netflix', 'bar com amigos', 'ingresso show'],
+    'outros': ['presente de aniversário', 'conserto do celular', 'material escolar']
+}
+
+# Skewed like real usage: most expenses are food and transport
+PESOS_CATEGORIAS = {'alimentacao': 45, 'transporte': 25, 'saude': 10, 'lazer': 12, 'outros': 8}
+
+
+def family_of(numero_usuario, familias):
+    """Family of a synthetic user: users are dealt round-robin over `familias` families"""
+    if familias <= 1:
+        return DEFAULT_FAMILY_ID
+    return f'familia-{numero_usuario % familias:03d}'
+
+
+def generate_expenses(quantidade, inicio_data, fim_data, usuarios=50, seed=42, familias=1):
+    """Synthetic expenses shaped like ExpenseService's items, spread over users, families and a period"""
+    aleatorio = random.Random(seed)
+    inicio = datetime.fromisoformat(inicio_data)
+    segundos = max(1, int((datetime.fromisoformat(fim_data) - inicio).total_seconds()))
+    categorias = list(PESOS_CATEGORIAS)
+    pesos = list(PESOS_CATEGORIAS.values())
+    
+    despesas = []
+    for indice in range(quantidade):
+        categoria = aleatorio.choices(categorias, pesos)[0]
+        numero_usuario = aleatorio.randrange(usuarios)
+        # Microseconds keep (user_id, timestamp) unique like real message timestamps
+        momento = inicio + timedelta(seconds=aleatorio.randrange(segundos), microseconds=indice % 1000000)
+        despesas.append({
+            'timestamp': momento.isoformat(),
+            'valor_centavos': round(aleatorio.lognormvariate(3.5, 0.9) * 100),
+            'categoria': categoria,
+            'descricao': aleatorio.choice(DESCRICOES[categoria]),
+            'user_id': f'Usuario {numero_usuario:03d}',
+            'whatsapp_from': f'whatsapp:+55119{numero_usuario:08d}',
+            'familia_id': family_of(numero_usuario, familias),
+            'data_criacao': momento.isoformat()
+        })
+    
+    return despesas
+
+
+def load_expenses(despesas, repository=None, family_repository=None):
+    """Store expenses and their family members and, for DynamoDB (fake tables must be installed), rebuild rollups"""
+    repository = repository or DynamoDBExpenseRepository()
+    family_repository = family_repository or create_family_repository()
+    membros = {despesa['whatsapp_from']: despesa.get('familia_id', DEFAULT_FAMILY_ID) for despesa in despesas}
+    for whatsapp_from, familia_id in membros.items():
+        if familia_id == DEFAULT_FAMILY_ID:
+            continue
+        family_repository.add_member(whatsapp_from, familia_id)
+    
+    repository.save_expenses(despesas)
+    if not repository.native_aggregation:
+        RollupRepository().rebuild(despesas, DEFAULT_FAMILY_ID, espera=0)
+    return repository
@@ -0,0 +1,366 @@
+import random
+import re
+from bisect import bisect_left, bisect_right
+from types import SimpleNamespace
+from config.settings import (
+    DYNAMODB_TABLE_NAME, DYNAMODB_PERIOD_INDEX, DYNAMODB_FAMILY_INDEX, DYNAMODB_ROLLUP_TABLE_NAME,
+    DYNAMODB_CACHE_TABLE_NAME, DYNAMODB_FAMILY_TABLE_NAME, DYNAMODB_VOCABULARY_TABLE_NAME
+)
+from utils import dynamodb_helper
+
+
+class ConditionalCheckFailedException(Exception):
+    """Raised like botocore's error when a ConditionExpression does not hold"""
+
+
+class TransactionCanceledException(Exception):
+    """Raised like botocore's error when a transaction is cancelled, with one reason per action"""
+    
+    def __init__(self, motivos):
+        super().__init__('Transaction cancelled')
+        self.response = {'CancellationReasons': motivos}
+
+
+class FakeTable:
+    """In-memory stand-in for a boto3 DynamoDB Table, covering the calls the repositories make.
+    
+    Partitions keep their sort keys ordered so queries cost O(log n + page), like the real
+    service; results are paged every `itens_por_pagina` items to exercise LastEvaluatedKey.
+    """
+    
+    def __init__(self, nome, chave_particao, chave_ordenacao=None, indices=None, itens_por_pagina=1000):
+        self.nome = self.name = nome
+        self.itens_por_pagina = itens_por_pagina
+        self.meta = SimpleNamespace(client=FakeClient({nome: self}))
+        self._itens = {}
+        self._esquemas = {None: (chave_particao, chave_ordenacao)}
+        self._esquemas.update(indices or {})
+        self._particoes = {indice: {} for indice in self._esquemas}
+    
+    def __len__(self):
+        return len(self._itens)
+    
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **_):
+        chave = self._primary_key(Item)
+        if ConditionExpression is not None:
+            existente = self._itens.get(chave, {})
+            if not _evaluate(ConditionExpression, existente, ExpressionAttributeNames, ExpressionAttributeValues):
+                raise ConditionalCheckFailedException(ConditionExpression)
+        self._store(chave, dict(Item))
+        return {}
+    
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    ConditionExpression=None, ReturnValues=None, **_):
+        chave = self._primary_key(Key)
+        item = dict(self._itens.get(chave) or Key)
+        if ConditionExpression is not None and not _evaluate(
+            ConditionExpression, self._itens.get(chave, {}), ExpressionAttributeNames, ExpressionAttributeValues
+        ):
+            raise ConditionalCheckFailedException(ConditionExpression)
+        
+        nomes = ExpressionAttributeNames or {}
+        valores = ExpressionAttributeValues or {}
+        for acao, corpo in re.findall(r'\b(SET|ADD|REMOVE)\s+(.+?)(?=\s+\b(?:SET|ADD|REMOVE)\b|$)', UpdateExpression):
+            # Commas inside if_not_exists(...) do not separate actions
+            for parte in re.split(r',(?![^(]*\))', corpo):
+                if acao == 'REMOVE':
+                    item.pop(nomes.get(parte.strip(), parte.strip()), None)
+                elif acao == 'SET':
+                    atributo, valor = (p.strip() for p in parte.split('=', 1))
+                    atributo = nomes.get(atributo, atributo)
+                    padrao = re.fullmatch(r'if_not_exists\(\s*([#\w]+)\s*,\s*(:\w+)\s*\)', valor)
+                    if padrao:
+                        existente = nomes.get(padrao.group(1), padrao.group(1))
+                        item[atributo] = item[existente] if existente in item else valores[padrao.group(2)]
+                    else:
+                        item[atributo] = valores[valor]
+                else:
+                    atributo, valor = parte.split()
+                    atributo = nomes.get(atributo, atributo)
+                    item[atributo] = item.get(atributo, 0) + valores[valor]
+        
+        self._store(chave, item)
+        return {'Attributes': dict(item)} if ReturnValues == 'ALL_NEW' else {}
+    
+    def delete_item(self, Key, **_):
+        chave = self._primary_key(Key)
+        item = self._itens.pop(chave, None)
+        if item is not None:
+            self._unindex(chave, item)
+        return {}
+    
+    def batch_writer(self, **_):
+        return _FakeBatchWriter(self)
+    
+    def get_item(self, Key, **_):
+        item = self._itens.get(self._primary_key(Key))
+        return {'Item': dict(item)} if item is not None else {}
+    
+    def query(self, KeyConditionExpression, IndexName=None, ScanIndexForward=True, Limit=None,
+              ExclusiveStartKey=None, **_):
+        atributo_particao, atributo_ordenacao = self._esquemas[IndexName]
+        condicoes = _flatten(KeyConditionExpression)
+        valor_particao = condicoes.pop(atributo_particao)[1][0]
+        
+        chaves_ordenacao, chaves = self._partition(IndexName, valor_particao)
+        inicio, fim = 0, len(chaves)
+        if atributo_ordenacao in condicoes:
+            inicio, fim = _sort_range(chaves_ordenacao, *condicoes[atributo_ordenacao])
+        
+        posicoes = range(inicio, fim) if ScanIndexForward else range(fim - 1, inicio - 1, -1)
+        return self._page(posicoes, lambda p: self._itens[chaves[p]], Limit, ExclusiveStartKey)
+    
+    def scan(self, Limit=None, ExclusiveStartKey=None, **_):
+        itens = list(self._itens.values())
+        return self._page(range(len(itens)), itens.__getitem__, Limit, ExclusiveStartKey)
+    
+    def _page(self, posicoes, ler, limite, inicio_exclusivo):
+        """Slice one result page; LastEvaluatedKey is an opaque offset into the result"""
+        posicao = inicio_exclusivo['_posicao'] if inicio_exclusivo else 0
+        tamanho = min(limite or self.itens_por_pagina, self.itens_por_pagina)
+        pagina = posicoes[posicao:posicao + tamanho]
+        
+        response = {'Items': [dict(ler(p)) for p in pagina], 'Count': len(pagina)}
+        if posicao + tamanho < len(posicoes) and not limite:
+            response['LastEvaluatedKey'] = {'_posicao': posicao + tamanho}
+        return response
+    
+    def _primary_key(self, item):
+        atributo_particao, atributo_ordenacao = self._esquemas[None]
+        return (item[atributo_particao], item[atributo_ordenacao] if atributo_ordenacao else None)
+    
+    def _store(self, chave, item):
+        anterior = self._itens.get(chave)
+        if anterior is not None:
+            self._unindex(chave, anterior)
+        self._itens[chave] = item
+        
+        for indice, (atributo_particao, atributo_ordenacao) in self._esquemas.items():
+            if atributo_particao not in item:
+                continue
+            chaves_ordenacao, chaves = self._partition(indice, item[atributo_particao])
+            ordem = (item.get(atributo_ordenacao), chave)
+            posicao = bisect_left(chaves_ordenacao, ordem)
+            chaves_ordenacao.insert(posicao, ordem)
+            chaves.insert(posicao, chave)
+    
+    def _unindex(self, chave, item):
+        for indice, (atributo_particao, atributo_ordenacao) in self._esquemas.items():
+            if atributo_particao not in item:
+                continue
+            chaves_ordenacao, chaves = self._partition(indice, item[atributo_particao])
+            posicao = bisect_left(chaves_ordenacao, (item.get(atributo_ordenacao), chave))
+            del chaves_ordenacao[posicao]
+            del chaves[posicao]
+    
+    def _partition(self, indice, valor):
+        particao = self._particoes[indice].get(valor)
+        if particao is None:
+            particao = self._particoes[indice][valor] = ([], [])
+        return particao
+
+
+class FakeClient:
+    """Low-level client reached through table.meta.client (batch calls and error classes)"""
+    
+    exceptions = SimpleNamespace(
+        ConditionalCheckFailedException=ConditionalCheckFailedException,
+        TransactionCanceledException=TransactionCanceledException
+    )
+    
+    def __init__(self, tabelas, nao_processados=0.0, seed=0):
+        self.tabelas = tabelas
+        # Share of batch requests handed back unprocessed, like a throttled table
+        self.nao_processados = nao_processados
+        self.aleatorio = random.Random(seed)
+    
+    def batch_write_item(self, RequestItems, **_):
+        pendentes = {}
+        for nome, pedidos in RequestItems.items():
+            if len(pedidos) > 25:
+                raise ValueError('Too many items requested for the BatchWriteItem call')
+            for pedido in pedidos:
+                if self.aleatorio.random() < self.nao_processados:
+                    pendentes.setdefault(nome, []).append(pedido)
+                elif 'PutRequest' in pedido:
+                    self.tabelas[nome].put_item(Item=pedido['PutRequest']['Item'])
+                else:
+                    self.tabelas[nome].delete_item(Key=pedido['DeleteRequest']['Key'])
+        return {'UnprocessedItems': pendentes}
+    
+    def transact_write_items(self, TransactItems, **_):
+        """All-or-nothing Put/Update actions: every condition is checked before anything is written"""
+        if len(TransactItems) > 100:
+            raise ValueError('Too many actions requested for the TransactWriteItems call')
+        chaves = set()
+        motivos = []
+        for acao in TransactItems:
+            (tipo, pedido), = acao.items()
+            tabela = self.tabelas[pedido['TableName']]
+            chave = (pedido['TableName'], tabela._primary_key(pedido.get('Item') or pedido['Key']))
+            if chave in chaves:
+                raise ValueError('Transaction request cannot include multiple operations on one item')
+            chaves.add(chave)
+            
+            condicao = pedido.get('ConditionExpression')
+            existente = tabela._itens.get(chave[1], {})
+            valido = condicao is None or _evaluate(
+                condicao, existente, pedido.get('ExpressionAttributeNames'), pedido.get('ExpressionAttributeValues')
+            )
+            motivos.append({'Code': 'None' if valido else 'ConditionalCheckFailed'})
+        
+        if any(motivo['Code'] != 'None' for motivo in motivos):
+            raise TransactionCanceledException(motivos)
+        for acao in TransactItems:
+            (tipo, pedido), = acao.items()
+            argumentos = {nome: valor for nome, valor in pedido.items() if nome not in ('TableName', 'ConditionExpression')}
+            getattr(self.tabelas[pedido['TableName']], 'put_item' if tipo == 'Put' else 'update_item')(**argumentos)
+        return {}
+    
+    def batch_get_item(self, RequestItems, **_):
+        respostas, pendentes = {}, {}
+        for nome, pedido in RequestItems.items():
+            if len(pedido['Keys']) > 100:
+                raise ValueError('Too many items requested for the BatchGetItem call')
+            for chave in pedido['Keys']:
+                if self.aleatorio.random() < self.nao_processados:
+                    pendentes.setdefault(nome, {**pedido, 'Keys': []})['Keys'].append(chave)
+                    continue
+                item = self.tabelas[nome].get_item(Key=chave).get('Item')
+                respostas.setdefault(nome, [])
+                if item is not None:
+                    respostas[nome].append(item)
+        return {'Responses': respostas, 'UnprocessedKeys': pendentes}
+
+
+class _FakeBatchWriter:
+    """Context manager mirroring Table.batch_writer()"""
+    
+    def __init__(self, table):
+        self.table = table
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *_):
+        return False
+    
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+    
+    def delete_item(self, Key):
+        self.table.delete_item(Key=Key)
+
+
+def _flatten(condicao):
+    """Turn a boto3 Key condition (joined with &) into {attribute: (operator, values)}"""
+    expressao = condicao.get_expression()
+    if expressao['operator'] == 'AND':
+        resultado = {}
+        for parte in expressao['values']:
+            resultado.update(_flatten(parte))
+        return resultado
+    chave, *valores = expressao['values']
+    return {chave.name: (expressao['operator'], valores)}
+
+
+def _sort_range(chaves_ordenacao, operador, valores):
+    """Slice bounds of an ordered (sort key, primary key) list matching a sort key condition"""
+    minimo, maximo = (), (chr(0x10FFFF),)
+    if operador == 'BETWEEN':
+        return bisect_left(chaves_ordenacao, (valores[0],)), bisect_right(chaves_ordenacao, (valores[1], maximo))
+    if operador == 'begins_with':
+        return bisect_left(chaves_ordenacao, (valores[0],)), bisect_left(chaves_ordenacao, (valores[0] + maximo[0],))
+    if operador == '=':
+        return bisect_left(chaves_ordenacao, (valores[0],)), bisect_right(chaves_ordenacao, (valores[0], maximo))
+    if operador in ('<', '<='):
+        fim = bisect_left if operador == '<' else bisect_right
+        return 0, fim(chaves_ordenacao, (valores[0], minimo) if operador == '<' else (valores[0], maximo))
+    if operador in ('>', '>='):
+        inicio = bisect_right if operador == '>' else bisect_left
+        return inicio(chaves_ordenacao, (valores[0], maximo) if operador == '>' else (valores[0],)), len(chaves_ordenacao)
+    raise NotImplementedError(f'Unsupported key condition: {operador}')
+
+
+_TOKEN_RE = re.compile(r'\s*(\(|\)|<=|>=|<>|=|<|>|,|[#:]?[\w.]+)')
+
+
+def _evaluate(expressao, item, nomes, valores):
+    """Evaluate a string ConditionExpression (functions, comparisons, AND/OR/NOT, parentheses)"""
+    tokens = _TOKEN_RE.findall(expressao)
+    nomes = nomes or {}
+    valores = valores or {}
+    posicao = 0
+    
+    def operand(token):
+        if token.startswith(':'):
+            return valores[token]
+        return item.get(nomes.get(token, token))
+    
+    def primary():
+        nonlocal posicao
+        token = tokens[posicao]
+        posicao += 1
+        if token == '(':
+            resultado = disjunction()
+            posicao += 1
+            return resultado
+        if token.upper() == 'NOT':
+            return not primary()
+        if token in ('attribute_exists', 'attribute_not_exists'):
+            atributo = nomes.get(tokens[posicao + 1], tokens[posicao + 1])
+            posicao += 3
+            return (atributo in item) == (token == 'attribute_exists')
+        
+        esquerda = operand(token)
+        operador, direita = tokens[posicao], operand(tokens[posicao + 1])
+        posicao += 2
+        if esquerda is None or direita is None:
+            return operador == '<>' and esquerda != direita
+        return {
+            '=': esquerda == direita, '<>': esquerda != direita, '<': esquerda < direita,
+            '<=': esquerda <= direita, '>': esquerda > direita, '>=': esquerda >= direita
+        }[operador]
+    
+    def conjunction():
+        nonlocal posicao
+        resultado = primary()
+        while posicao < len(tokens) and tokens[posicao].upper() == 'AND':
+            posicao += 1
+            resultado = primary() and resultado
+        return resultado
+    
+    def disjunction():
+        nonlocal posicao
+        resultado = conjunction()
+        while posicao < len(tokens) and tokens[posicao].upper() == 'OR':
+            posicao += 1
+            resultado = conjunction() or resultado
+        return resultado
+    
+    return disjunction()
+
+
+def install_fake_tables(itens_por_pagina=1000, nao_processados=0.0):
+    """Register fake tables in DynamoDBHelper's cache so repositories use them; returns them by name"""
+    tabelas = {
+        DYNAMODB_TABLE_NAME: FakeTable(
+            DYNAMODB_TABLE_NAME, 'user_id', 'timestamp',
+            indices={
+                DYNAMODB_PERIOD_INDEX: ('mes_referencia', 'timestamp'),
+                DYNAMODB_FAMILY_INDEX: ('familia_id', 'timestamp')
+            },
+            itens_por_pagina=itens_por_pagina
+        ),
+        DYNAMODB_ROLLUP_TABLE_NAME: FakeTable(DYNAMODB_ROLLUP_TABLE_NAME, 'escopo', 'chave', itens_por_pagina=itens_por_pagina),
+        DYNAMODB_CACHE_TABLE_NAME: FakeTable(DYNAMODB_CACHE_TABLE_NAME, 'chave', itens_por_pagina=itens_por_pagina),
+        DYNAMODB_FAMILY_TABLE_NAME: FakeTable(DYNAMODB_FAMILY_TABLE_NAME, 'whatsapp_from', itens_por_pagina=itens_por_pagina),
+        DYNAMODB_VOCABULARY_TABLE_NAME: FakeTable(
+            DYNAMODB_VOCABULARY_TABLE_NAME, 'escopo', 'termo', itens_por_pagina=itens_por_pagina
+        ),
+    }
+    cliente = FakeClient(tabelas, nao_processados)
+    for tabela in tabelas.values():
+        tabela.meta.client = cliente
+    dynamodb_helper._tables.update(tabelas)
+    return tabelas
@@ -0,0 +1,253 @@
+import base64
+import json
+import random
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.local_parser_service import LocalParserService
+
+# Gemini behaviour profiles: median latency (s), lognormal spread, share of 503s and of hung calls
+GEMINI_PERFIS = {
+    'rapido': {'latencia': 0.05, 'desvio': 0.3, 'erros': 0.0, 'travamentos': 0.0},
+    'normal': {'latencia': 0.8, 'desvio': 0.5, 'erros': 0.01, 'travamentos': 0.0},
+    'lento': {'latencia': 3.0, 'desvio': 0.6, 'erros': 0.02, 'travamentos': 0.01},
+    'instavel': {'latencia': 1.0, 'desvio': 0.8, 'erros': 0.2, 'travamentos': 0.05}
+}
+
+INSIGHT_FALSO = (
+    "1. **Padrão Principal:** 🍽️ Alimentação concentra a maior parte dos gastos.\n"
+    "2. **Oportunidade de Economia:** 🚗 Agrupe as corridas de aplicativo.\n"
+    "3. **Recomendação Estratégica:** 📊 Defina um teto semanal por categoria."
+)
+
+TRANSCRICAO_RE = re.compile(rb'TRANSCRICAO=([^\x00]*)\x00')
+MENSAGEM_RE = re.compile(r'Mensagem: "(.*)"')
+
+
+def make_ogg(transcricao, segundos, bytes_por_segundo=2000, seed=0):
+    """Build an Ogg Opus-shaped file whose last granule position gives `segundos`.
+    
+    The payload is noise; the transcription travels in the tags page so the fake
+    Gemini can "transcribe" it back.
+    """
+    aleatorio = random.Random(seed)
+    paginas = [
+        (0x02, 0, b'OpusHead\x01\x01\x38\x01\x80\xbb\x00\x00\x00\x00\x00'),
+        (0x00, 0, b'OpusTags' + b'TRANSCRICAO=' + transcricao.encode('utf-8') + b'\x00')
+    ]
+    
+    tamanho_dados = max(1, int(segundos * bytes_por_segundo))
+    quantidade = max(1, -(-tamanho_dados // 4000))
+    for indice in range(quantidade):
+        granule = int(segundos * 48000 * (indice + 1) / quantidade)
+        tipo = 0x04 if indice == quantidade - 1 else 0x00
+        paginas.append((tipo, granule, aleatorio.randbytes(min(4000, tamanho_dados - indice * 4000))))
+    
+    arquivo = bytearray()
+    for sequencia, (tipo, granule, dados) in enumerate(paginas):
+        segmentos = [255] * (len(dados) // 255) + [len(dados) % 255]
+        arquivo += b'OggS' + struct.pack('<BBqIIIB', 0, tipo, granule, 1, sequencia, 0, len(segmentos))
+        arquivo += bytes(segmentos) + dados
+    return bytes(arquivo)
+
+
+class _Servidor:
+    """Threaded HTTP server on a free local port, started in the background"""
+    
+    def __init__(self, handler):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.dono = self
+        self.requisicoes = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+    
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def count(self, nome):
+        with self._lock:
+            self.requisicoes[nome] = self.requisicoes.get(nome, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler that stays quiet and tolerates clients that gave up"""
+    
+    def log_message(self, *args):
+        pass
+    
+    def _reply(self, status, corpo, content_type='application/json', headers=None):
+        if isinstance(corpo, (dict, list)):
+            corpo = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(corpo)))
+            for nome, valor in (headers or {}).items():
+                self.send_header(nome, valor)
+            self.end_headers()
+            self.wfile.write(corpo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class FakeGeminiServer(_Servidor):
+    """Local generateContent endpoint with a latency/error profile and plausible answers"""
+    
+    def __init__(self, perfil='normal', travamento_segundos=65, seed=None):
+        super().__init__(_GeminiHandler)
+        self.perfil = GEMINI_PERFIS[perfil] if isinstance(perfil, str) else perfil
+        self.travamento_segundos = travamento_segundos
+        self.parser = LocalParserService()
+        self.aleatorio = random.Random(seed)
+    
+    @property
+    def generate_url(self):
+        return f'{self.url}/v1beta/models/fake:generateContent'
+    
+    @property
+    def stream_url(self):
+        return f'{self.url}/v1beta/models/fake:streamGenerateContent?alt=sse'
+    
+    @property
+    def upload_url(self):
+        return f'{self.url}/upload/v1beta/files'
+    
+    def delay(self):
+        """Seconds to wait before answering, or None to answer with a 503"""
+        sorteio = self.aleatorio.random()
+        if sorteio < self.perfil['travamentos']:
+            return self.travamento_segundos
+        if sorteio < self.perfil['travamentos'] + self.perfil['erros']:
+            return None
+        return self.perfil['latencia'] * self.aleatorio.lognormvariate(0, self.perfil['desvio'])
+    
+    def answer(self, prompt, audio):
+        """Reply text for one prompt (interpretation JSON, transcription or insight)"""
+        if audio is not None:
+            encontrado = TRANSCRICAO_RE.search(audio)
+            transcricao = encontrado.group(1).decode('utf-8') if encontrado else ''
+            if not prompt.startswith('Transcreva o áudio de WhatsApp anexado'):
+                return transcricao
+            return json.dumps({**self.interpret(transcricao), 'transcricao': transcricao}, ensure_ascii=False)
+        
+        mensagem = MENSAGEM_RE.search(prompt)
+        if mensagem:
+            return json.dumps(self.interpret(mensagem.group(1)), ensure_ascii=False)
+        return INSIGHT_FALSO
+    
+    def interpret(self, texto):
+        """Interpretation a good model would give, borrowed from the local parser"""
+        interpretacao = self.parser.parse(texto)
+        if interpretacao is None:
+            normalizado = texto.lower()
+            if 'quanto' in normalizado or 'relat' in normalizado or 'gastos' in normalizado:
+                interpretacao = {'tipo': 'consulta', 'periodo': 'mes_atual', 'escopo': 'individual', 'mes_especifico': None}
+            else:
+                interpretacao = {'tipo': 'ajuda'}
+        interpretacao.pop('confianca', None)
+        return interpretacao
+
+
+class _GeminiHandler(_Handler):
+
+    def do_POST(self):
+        servidor = self.server.dono
+        corpo = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        
+        if self.path.startswith('/upload/'):
+            self._upload(servidor)
+            return
+        
+        stream = ':streamGenerateContent' in self.path
+        servidor.count('streamGenerateContent' if stream else 'generateContent')
+        espera = servidor.delay()
+        if espera is None:
+            servidor.count('erro_503')
+            self._reply(503, {'error': {'code': 503, 'message': 'The model is overloaded.'}})
+            return
+        
+        dados = json.loads(corpo)
+        partes = dados['contents'][0]['parts']
+        instrucao = ''.join(p.get('text', '') for p in dados.get('systemInstruction', {}).get('parts', []))
+        prompt = instrucao + ''.join(p.get('text', '') for p in partes)
+        audio = next((base64.b64decode(p['inlineData']['data']) for p in partes if 'inlineData' in p), None)
+        texto = servidor.answer(prompt, audio)
+        uso = {'promptTokenCount': len(corpo) // 4, 'candidatesTokenCount': len(texto) // 4}
+        
+        if stream:
+            self._stream(texto, uso, espera)
+        else:
+            time.sleep(espera)
+            self._reply(200, {'candidates': [{'content': {'parts': [{'text': texto}]}}], 'usageMetadata': uso})
+    
+    def _stream(self, texto, uso, espera):
+        """Server-sent events over chunked HTTP/1.1: the text by 3/4 of the latency, the closing usage event at the end"""
+        terco = max(1, len(texto) // 3)
+        eventos = [{'candidates': [{'content': {'parts': [{'text': texto[inicio:inicio + terco]}]}}]}
+                   for inicio in range(0, len(texto), terco)]
+        final = {'candidates': [{'content': {'parts': [{'text': '\n'}]}, 'finishReason': 'STOP'}], 'usageMetadata': uso}
+        try:
+            self.protocol_version = 'HTTP/1.1'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            time.sleep(espera * 0.75)
+            for evento in eventos:
+                self._chunk(evento)
+            # Like the real API, the closing event (finishReason, usage) trails the last text
+            time.sleep(espera * 0.25)
+            self._chunk(final)
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def _chunk(self, evento):
+        dados = f'data: {json.dumps(evento, ensure_ascii=False)}\r\n\r\n'.encode('utf-8')
+        self.wfile.write(f'{len(dados):x}\r\n'.encode('ascii') + dados + b'\r\n')
+        self.wfile.flush()
+
+
+class FakeTwilioServer(_Servidor):
+    """Serves sample OGG voice notes as Twilio media and accepts outbound messages"""
+    
+    def __init__(self, audios):
+        super().__init__(_TwilioHandler)
+        self.audios = audios
+    
+    def media_url(self, indice, media_sid):
+        return f'{self.url}/2010-04-01/Accounts/ACfake/Messages/MMfake/Media/{media_sid}?audio={indice}'
+    
+    @property
+    def messages_url(self):
+        return f'{self.url}/2010-04-01/Accounts/{{account_sid}}/Messages.json'
+
+
+class _TwilioHandler(_Handler):
+
+    def do_GET(self):
+        servidor = self.server.dono
+        servidor.count('media')
+        encontrado = re.search(r'[?&]audio=(\d+)', self.path)
+        if not encontrado or int(encontrado.group(1)) >= len(servidor.audios):
+            self._reply(404, {'message': 'media not found'})
+            return
+        self._reply(200, servidor.audios[int(encontrado.group(1))], content_type='audio/ogg')
+    
+    def do_POST(self):
+        servidor = self.server.dono
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        servidor.count('mensagens')
+        self._reply(201, {'sid': f'SM{random.getrandbits(64):016x}', 'status': 'queued'})
@@ -0,0 +1,369 @@
+"""Replay Twilio webhook traffic against lambda_handler with fake Gemini and Twilio servers.
+
+    python -m benchmarks.load_replay --requisicoes 500 --taxa 20 --concorrencia 10 --perfil-gemini normal
+    python -m benchmarks.load_replay --gravacoes webhooks.jsonl --taxa 5 --saida carga.json
+
+Each --concorrencia worker is a separate process, like a Lambda container: warm state
+(caches, circuit breaker, fake DynamoDB tables) is per worker and the first request it
+serves is a cold start. Arrivals are open-loop (Poisson or constant), so requests queue
+when every worker is busy, the way Lambda throttles at its concurrency limit.
+
+Recorded traffic is JSON lines with a form-encoded "body" (as API Gateway delivers it)
+and optionally the "intent" to group it under; MediaUrl0 is pointed at the fake Twilio.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import time
+from urllib.parse import parse_qs, urlencode
+from benchmarks.fake_servers import GEMINI_PERFIS, FakeGeminiServer, FakeTwilioServer, make_ogg
+
+TEXTOS = {
+    'despesa': [
+        'gastei 45 no almoço', 'uber 23,50', 'paguei 120 reais na farmácia', 'mercado 350',
+        'cinema 60 reais', 'gasolina 200', 'padaria 18,90', 'comprei um presente de 80',
+        'acabei de pagar a conta de luz, deu 189', 'foi uns 30 conto aquele negócio',
+        '50 no almoço, 30 de uber e 120 no mercado', 'farmácia 42; estacionamento 15'
+    ],
+    'consulta': [
+        'quanto gastei esse mês?', 'relatório da família', 'gastos da semana',
+        'quanto gastamos em agosto', 'resumo do mês passado', 'meus gastos do mês'
+    ],
+    'ajuda': ['oi', 'bom dia', 'como funciona?', 'obrigado', 'o que você faz?']
+}
+TRANSCRICOES = [
+    'gastei cinquenta reais no mercado', 'paguei trinta e cinco no uber',
+    'quanto eu gastei esse mês', 'comprei remédio na farmácia, deu oitenta e dois reais',
+    'vinte de pão e quarenta de uber'
+]
+MIX_PADRAO = 'despesa=0.5,audio=0.2,consulta=0.2,ajuda=0.1'
+
+# Upper bounds (ms) of the latency histogram buckets
+BUCKETS_MS = [100, 250, 500, 1000, 2000, 3000, 5000, 8000, 10000, 13500, 15000, 30000]
+
+
+class FakeLambdaContext:
+    """Just enough of the Lambda context for DeadlineHelper"""
+    
+    def __init__(self, timeout_segundos):
+        self.fim = time.monotonic() + timeout_segundos
+    
+    def get_remaining_time_in_millis(self):
+        return int(max(0.0, self.fim - time.monotonic()) * 1000)
+
+
+def synthesize(quantidade, mix, usuarios, twilio, audios, seed):
+    """Synthetic webhooks as (intent, API Gateway event) following the intent mix"""
+    aleatorio = random.Random(seed)
+    intents = list(mix)
+    pesos = list(mix.values())
+    
+    webhooks = []
+    for indice in range(quantidade):
+        intent = aleatorio.choices(intents, pesos)[0]
+        numero_usuario = aleatorio.randrange(usuarios)
+        params = {
+            'MessageSid': f'SM{aleatorio.getrandbits(128):032x}',
+            'From': f'whatsapp:+55119{numero_usuario:08d}',
+            'ProfileName': f'Usuario {numero_usuario:03d}',
+            'NumMedia': '0',
+            'Body': ''
+        }
+        if intent == 'audio':
+            params['NumMedia'] = '1'
+            params['MediaContentType0'] = 'audio/ogg'
+            params['MediaUrl0'] = twilio.media_url(aleatorio.randrange(audios), f'ME{aleatorio.getrandbits(128):032x}')
+        else:
+            params['Body'] = aleatorio.choice(TEXTOS[intent])
+        webhooks.append((intent, {'httpMethod': 'POST', 'body': urlencode(params)}))
+    
+    return webhooks
+
+
+def load_recordings(caminho, twilio):
+    """Recorded webhooks, with media URLs rewritten to the fake Twilio server"""
+    webhooks = []
+    with open(caminho) as arquivo:
+        for indice, linha in enumerate(arquivo):
+            if not linha.strip():
+                continue
+            gravacao = json.loads(linha)
+            params = {nome: valores[0] for nome, valores in parse_qs(gravacao['body']).items()}
+            
+            if params.get('MediaUrl0'):
+                media_sid = params['MediaUrl0'].rstrip('/').rsplit('/', 1)[-1]
+                params['MediaUrl0'] = twilio.media_url(indice % len(twilio.audios), media_sid)
+            
+            intent = gravacao.get('intent') or ('audio' if params.get('MediaUrl0') else 'desconhecido')
+            webhooks.append((intent, {'httpMethod': 'POST', 'body': urlencode(params)}))
+    return webhooks
+
+
+def _container(indice, tarefas, resultados, config):
+    """Worker process: one warm Lambda container serving requests one at a time"""
+    inicio = time.perf_counter()
+    from benchmarks.datasets import generate_expenses, load_expenses
+    from benchmarks.fake_dynamodb import install_fake_tables
+    
+    install_fake_tables()
+    if config['historico']:
+        agora = time.strftime('%Y-%m-%dT%H:%M:%S')
+        despesas = generate_expenses(
+            config['historico'], agora[:8] + '01T00:00:00', agora, config['usuarios'], familias=config['familias']
+        )
+        load_expenses(despesas)
+        if config['vocabulario']:
+            from services.vocabulary_index import VocabularyIndex
+            VocabularyIndex().rebuild(despesas)
+    
+    import index
+    if not config['logs']:
+        logging.getLogger().addHandler(logging.NullHandler())
+    resultados.put({'container': indice, 'inicializacao_ms': (time.perf_counter() - inicio) * 1000})
+    
+    frio = True
+    while True:
+        tarefa = tarefas.get()
+        if tarefa is None:
+            break
+        numero, intent, chegada, event = tarefa
+        
+        saida = io.StringIO()
+        comeco = time.monotonic()
+        erro = None
+        with contextlib.redirect_stdout(saida):
+            try:
+                resposta = index.lambda_handler(event, FakeLambdaContext(config['timeout_lambda']))
+                if resposta.get('statusCode') != 200 or 'Algo deu errado' in resposta.get('body', ''):
+                    erro = 'resposta_de_erro'
+            except Exception as error:
+                erro = type(error).__name__
+            fim = time.monotonic()
+            
+            # Async mode: run the queued jobs like the worker Lambda would, right after the ack
+            entrega = None
+            fila = index._get_services()['queue']
+            if hasattr(fila, 'drain'):
+                for job in fila.drain():
+                    index.worker_handler({'Records': [{'messageId': str(numero), 'body': json.dumps(job)}]}, None)
+                    entrega = time.monotonic()
+        
+        metricas = {}
+        for linha in saida.getvalue().splitlines():
+            if linha.startswith('{') and '"_aws"' in linha:
+                registro = json.loads(linha)
+                if registro.get('handler') == 'webhook':
+                    metricas = {nome: valor for nome, valor in registro.items() if nome.endswith('_ms')}
+        
+        resultados.put({
+            'numero': numero,
+            'intent': intent,
+            'container': indice,
+            'frio': frio,
+            'espera_ms': (comeco - chegada) * 1000,
+            'handler_ms': (fim - comeco) * 1000,
+            'latencia_ms': (fim - chegada) * 1000,
+            'entrega_ms': (entrega - chegada) * 1000 if entrega else None,
+            'erro': erro,
+            'etapas': metricas
+        })
+        frio = False
+
+
+def replay(webhooks, concorrencia, taxa, chegada, config):
+    """Dispatch webhooks at the arrival rate to a pool of container processes; returns per-request results"""
+    contexto = multiprocessing.get_context('spawn')
+    tarefas = contexto.Queue()
+    resultados = contexto.Queue()
+    containers = [
+        contexto.Process(target=_container, args=(indice, tarefas, resultados, config), daemon=True)
+        for indice in range(concorrencia)
+    ]
+    for container in containers:
+        container.start()
+    
+    inicializacoes = [resultados.get()['inicializacao_ms'] for _ in containers]
+    
+    aleatorio = random.Random(config['seed'])
+    proxima = time.monotonic()
+    for numero, (intent, event) in enumerate(webhooks):
+        espera = proxima - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+        tarefas.put((numero, intent, proxima, event))
+        proxima += aleatorio.expovariate(taxa) if chegada == 'poisson' else 1 / taxa
+    
+    registros = [resultados.get() for _ in webhooks]
+    for _ in containers:
+        tarefas.put(None)
+    for container in containers:
+        container.join()
+    
+    return registros, inicializacoes
+
+
+def summarize(registros, orcamento_segundos):
+    """Latency histograms, error rates and budget violations per intent (and overall)"""
+    grupos = {}
+    for registro in registros:
+        grupos.setdefault(registro['intent'], []).append(registro)
+    grupos['total'] = registros
+    
+    resumo = {}
+    for intent, itens in grupos.items():
+        latencias = sorted(item['latencia_ms'] for item in itens)
+        erros = sum(1 for item in itens if item['erro'])
+        violacoes = sum(1 for latencia in latencias if latencia > orcamento_segundos * 1000)
+        entregas = sorted(item['entrega_ms'] for item in itens if item['entrega_ms'] is not None)
+        
+        etapas = {}
+        for item in itens:
+            for nome, valor in item['etapas'].items():
+                etapas.setdefault(nome, []).append(valor)
+        
+        resumo[intent] = {
+            'requisicoes': len(itens),
+            'erros': erros,
+            'taxa_erro': round(erros / len(itens), 4),
+            'violacoes_orcamento': violacoes,
+            'frios': sum(1 for item in itens if item['frio']),
+            'latencia_ms': _percentiles(latencias),
+            'espera_ms': _percentiles(sorted(item['espera_ms'] for item in itens)),
+            'entrega_ms': _percentiles(entregas) if entregas else None,
+            'histograma_ms': _histogram(latencias),
+            'etapas_media_ms': {nome: round(sum(valores) / len(valores), 2) for nome, valores in sorted(etapas.items())}
+        }
+    return resumo
+
+
+def _percentiles(valores):
+    """p50/p90/p95/p99/max of a sorted list (nearest rank)"""
+    def percentil(p):
+        return round(valores[max(0, min(len(valores) - 1, round(p / 100 * len(valores)) - 1))], 2)
+    return {'p50': percentil(50), 'p90': percentil(90), 'p95': percentil(95), 'p99': percentil(99), 'max': round(valores[-1], 2)}
+
+
+def _histogram(latencias):
+    """Request counts per latency bucket ('<=100', ..., '>30000')"""
+    contagem = {f'<={limite}': 0 for limite in BUCKETS_MS}
+    contagem[f'>{BUCKETS_MS[-1]}'] = 0
+    for latencia in latencias:
+        rotulo = next((f'<={limite}' for limite in BUCKETS_MS if latencia <= limite), f'>{BUCKETS_MS[-1]}')
+        contagem[rotulo] += 1
+    return contagem
+
+
+def _parse_mix(texto):
+    mix = {}
+    for parte in texto.split(','):
+        intent, peso = parte.split('=')
+        if intent not in TEXTOS and intent != 'audio':
+            raise ValueError(f'unknown intent in mix: {intent}')
+        mix[intent] = float(peso)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requisicoes', type=int, default=200, help='synthetic webhooks to send')
+    parser.add_argument('--gravacoes', help='JSON lines of recorded webhooks to replay instead')
+    parser.add_argument('--mix', default=MIX_PADRAO, help='intent weights of synthetic traffic')
+    parser.add_argument('--taxa', type=float, default=10.0, help='arrivals per second')
+    parser.add_argument('--chegada', choices=['poisson', 'constante'], default='poisson')
+    parser.add_argument('--concorrencia', type=int, default=4, help='container processes')
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--familias', type=int, default=1, help='families the users are split into')
+    parser.add_argument('--historico', type=int, default=2000, help='expenses preloaded in each container')
+    parser.add_argument('--audios', type=int, default=8, help='distinct sample voice notes')
+    parser.add_argument('--segundos-audio', type=float, default=12.0, help='duration of the sample voice notes')
+    parser.add_argument('--perfil-gemini', choices=sorted(GEMINI_PERFIS), default='normal')
+    parser.add_argument('--async', dest='modo_async', action='store_true', help='run with ASYNC_MODE=true')
+    parser.add_argument('--streaming', action='store_true', help='run with GEMINI_STREAMING=true')
+    parser.add_argument('--vocabulario', action='store_true',
+                        help='run with VOCABULARY_INDEX=true, learned from the preloaded history')
+    parser.add_argument('--orcamento', type=float, default=15.0, help="Twilio's webhook timeout (s)")
+    parser.add_argument('--timeout-lambda', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--logs', action='store_true', help="keep the handler's log output")
+    parser.add_argument('--saida', help='write the summary and raw results as JSON to this file')
+    args = parser.parse_args(argv)
+    
+    aleatorio = random.Random(args.seed)
+    audios = [
+        make_ogg(TRANSCRICOES[indice % len(TRANSCRICOES)], args.segundos_audio * aleatorio.uniform(0.5, 1.5), seed=indice)
+        for indice in range(args.audios)
+    ]
+    gemini = FakeGeminiServer(args.perfil_gemini, seed=args.seed).start()
+    twilio = FakeTwilioServer(audios).start()
+    
+    # Containers are spawned after this, so they read these at import time
+    os.environ.update({
+        'GEMINI_URL': gemini.generate_url,
+        'GEMINI_UPLOAD_URL': gemini.upload_url,
+        'GEMINI_API_KEY': 'fake',
+        'TWILIO_ACCOUNT_SID': 'ACfake',
+        'TWILIO_AUTH_TOKEN': 'fake',
+        'TWILIO_MESSAGES_URL': twilio.messages_url,
+        'TWILIO_WHATSAPP_NUMBER': 'whatsapp:+14155238886',
+        'ASYNC_MODE': 'true' if args.modo_async else 'false',
+        'GEMINI_STREAMING': 'true' if args.streaming else 'false',
+        'VOCABULARY_INDEX': 'true' if args.vocabulario else 'false',
+        'JOB_QUEUE_BACKEND': 'memory',
+        'EVENT_LOG_SAMPLE_RATE': '0'
+    })
+    
+    if args.gravacoes:
+        webhooks = load_recordings(args.gravacoes, twilio)
+    else:
+        webhooks = synthesize(args.requisicoes, _parse_mix(args.mix), args.usuarios, twilio, args.audios, args.seed)
+    
+    config = {
+        'historico': args.historico,
+        'usuarios': args.usuarios,
+        'familias': args.familias,
+        'vocabulario': args.vocabulario,
+        'timeout_lambda': args.timeout_lambda,
+        'logs': args.logs,
+        'seed': args.seed
+    }
+    
+    print(f'Replaying {len(webhooks)} webhooks at {args.taxa}/s on {args.concorrencia} containers...', file=sys.stderr)
+    inicio = time.monotonic()
+    registros, inicializacoes = replay(webhooks, args.concorrencia, args.taxa, args.chegada, config)
+    duracao = time.monotonic() - inicio
+    
+    gemini.stop()
+    twilio.stop()
+    
+    resumo = summarize(registros, args.orcamento)
+    resultado = {
+        'parametros': vars(args),
+        'duracao_s': round(duracao, 2),
+        'vazao_por_segundo': round(len(registros) / duracao, 2),
+        'inicializacao_containers_ms': [round(valor, 1) for valor in inicializacoes],
+        'gemini': gemini.requisicoes,
+        'twilio': twilio.requisicoes,
+        'por_intent': resumo
+    }
+    
+    for intent, dados in resumo.items():
+        latencia = dados['latencia_ms']
+        print(f"{intent:<10} n={dados['requisicoes']:<5} erros={dados['taxa_erro']:6.1%} "
+              f"estouros={dados['violacoes_orcamento']:<4} p50={latencia['p50']:>9.1f}ms "
+              f"p95={latencia['p95']:>9.1f}ms p99={latencia['p99']:>9.1f}ms max={latencia['max']:>9.1f}ms")
+    print(f"gemini={gemini.requisicoes} twilio={twilio.requisicoes} vazao={resultado['vazao_por_segundo']}/s")
+    
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            json.dump({**resultado, 'requisicoes': registros}, arquivo, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""Offline benchmarks of the report hot paths against fake DynamoDB tables and a stubbed Gemini.
+
+    python -m benchmarks.run --tamanhos 1,1000,10000,100000 --saida resultados.json
+    python -m benchmarks.run --comparar base.json resultados.json --tolerancia 0.15
+    python -m benchmarks.run --backend sqlite --saida resultados-sqlite.json
+
+The comparison exits with status 1 when any case got slower (p50) or hungrier (peak memory)
+than the tolerance allows, so it can gate CI between two versions.
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tempfile
+import tracemalloc
+from datetime import datetime
+from benchmarks.datasets import family_of, generate_expenses, load_expenses
+from benchmarks.fake_dynamodb import install_fake_tables
+from repositories.sqlite_expense_repository import SqliteExpenseRepository
+from repositories.sqlite_family_repository import SqliteFamilyRepository
+from repositories.sqlite_vocabulary_repository import SqliteVocabularyRepository
+from services import insight_cache
+from services.aggregation_service import AggregationService
+from services.gemini_service import GeminiService
+from services.report_service import ReportService
+from services.vocabulary_index import VocabularyIndex
+from utils.date_helper import DateHelper
+
+TAMANHOS_PADRAO = [1, 100, 1000, 10000, 100000]
+USUARIO_CONSULTADO = 'Usuario 000'
+NUMERO_CONSULTADO = 'whatsapp:+5511900000000'
+
+CASOS = {}
+
+
+def caso(nome):
+    """Register a benchmark case: a function taking the context and returning the callable to time"""
+    def registrar(funcao):
+        CASOS[nome] = funcao
+        return funcao
+    return registrar
+
+
+class StubGeminiClient:
+    """GeminiClient stand-in answering instantly (or after a fixed latency) without the network"""
+    
+    RESPOSTA = "1. **Padrão Principal:** 🍽️ Alimentação concentra a maior parte dos gastos."
+    
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+    
+    def is_available(self):
+        return True
+    
+    def generate(self, body, timeout_maximo=None, url=None, stream_json=False):
+        if self.latencia:
+            time.sleep(self.latencia)
+        return {
+            'candidates': [{'content': {'parts': [{'text': self.RESPOSTA}]}}],
+            'usageMetadata': {'promptTokenCount': len(body) // 4, 'candidatesTokenCount': 40}
+        }
+
+
+class Contexto:
+    """Dataset of one size loaded into fresh fake tables, plus the services under test"""
+    
+    def __init__(self, tamanho, usuarios, familias, latencia_gemini, backend):
+        agora = datetime.now()
+        self.tamanho = tamanho
+        self.inicio = agora.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
+        self.fim = agora.isoformat()
+        self.periodo = DateHelper.get_month_period(agora.month)
+        self.mes = agora.month
+        
+        install_fake_tables()
+        self.despesas = generate_expenses(tamanho, self.inicio, self.fim, usuarios, familias=familias)
+        self.familia_id = family_of(0, familias)
+        repository = family_repository = vocabulary_repository = None
+        if backend == 'sqlite':
+            # A real file, so WAL and page cache behave like a self-hosted deployment
+            caminho = f'{tempfile.mkdtemp()}/despesas.db'
+            repository = SqliteExpenseRepository(caminho)
+            family_repository = SqliteFamilyRepository(caminho)
+            vocabulary_repository = SqliteVocabularyRepository(caminho)
+        self.repository = load_expenses(self.despesas, repository, family_repository)
+        
+        self.gemini_service = GeminiService(client=StubGeminiClient(latencia_gemini))
+        self.report_service = ReportService(
+            gemini_service=self.gemini_service, repository=self.repository, family_repository=family_repository
+        )
+        self.aggregation_service = AggregationService()
+        self.resumo = self.aggregation_service.aggregate(self.despesas)
+        self.vocabulary_index = VocabularyIndex(vocabulary_repository)
+        self.vocabulary_index.rebuild(self.despesas)
+
+
+@caso('search_expenses.usuario')
+def _search_expenses_user(ctx):
+    return lambda: ctx.repository.search_expenses(ctx.inicio, ctx.fim, USUARIO_CONSULTADO)
+
+
+@caso('search_expenses.familia')
+def _search_expenses_family(ctx):
+    return lambda: ctx.repository.search_expenses(ctx.inicio, ctx.fim, familia_id=ctx.familia_id)
+
+
+@caso('aggregate.memoria')
+def _aggregate(ctx):
+    return lambda: ctx.aggregation_service.aggregate(ctx.despesas)
+
+
+@caso('aggregate.stream')
+def _aggregate_stream(ctx):
+    # Report fallback when rollups are missing: stream the store's pages into the aggregation
+    return lambda: ctx.aggregation_service.aggregate(ctx.repository.iter_expenses(ctx.inicio, ctx.fim, familia_id=ctx.familia_id))
+
+
+@caso('summary')
+def _summary(ctx):
+    # Rollup rows plus recent items on DynamoDB, GROUP BY on SQLite
+    escopo = ctx.report_service._get_scope(None, ctx.familia_id)
+    return lambda: ctx.report_service._get_summary(escopo, ctx.inicio, ctx.fim, None, ctx.familia_id)
+
+
+@caso('generate_report')
+def _generate_report(ctx):
+    return lambda: ctx.report_service._generate_report(ctx.resumo, "📅 *Relatório*", True)
+
+
+@caso('build_insights_prompt')
+def _build_insights_prompt(ctx):
+    return lambda: ctx.gemini_service._build_insights_prompt(ctx.resumo, ctx.periodo, True)
+
+
+@caso('process_query.familia')
+def _process_query(ctx):
+    interpretacao = {'tipo': 'consulta', 'periodo': 'mes_especifico', 'escopo': 'familiar', 'mes_especifico': ctx.mes}
+    
+    def executar():
+        # Every run pays for the insight, like the first report after a new expense
+        insight_cache._insights.clear()
+        return ctx.report_service.process_query(
+            'relatório da família', USUARIO_CONSULTADO, interpretacao, NUMERO_CONSULTADO
+        )
+    return executar
+
+
+@caso('vocabulary.load')
+def _vocabulary_load(ctx):
+    # Cold container: one read of the counters of a description's terms
+    escopo = ctx.report_service._get_scope(USUARIO_CONSULTADO, None)
+    termos = VocabularyIndex.terms('50 na farmácia do bairro')
+    return lambda: ctx.vocabulary_index.repository.get_counts(escopo, termos)
+
+
+@caso('vocabulary.classify')
+def _vocabulary_classify(ctx):
+    # Warm container: the description is voted on by the cached vocabulary
+    return lambda: ctx.vocabulary_index.classify('50 na farmácia do bairro', USUARIO_CONSULTADO, ctx.familia_id)
+
+
+def measure(funcao, tamanho, min_execucoes, max_segundos):
+    """Time a callable (p50/p95/throughput), then measure its peak allocations in a separate run"""
+    funcao()  # warm-up
+    
+    tempos = []
+    limite = time.perf_counter() + max_segundos
+    while len(tempos) < min_execucoes or (time.perf_counter() < limite and len(tempos) < 1000):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    
+    # tracemalloc slows allocations down, so it never runs while timing
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    tempos.sort()
+    media = statistics.fmean(tempos)
+    return {
+        'execucoes': len(tempos),
+        'p50_ms': round(_percentile(tempos, 50) * 1000, 4),
+        'p95_ms': round(_percentile(tempos, 95) * 1000, 4),
+        'media_ms': round(media * 1000, 4),
+        'ops_por_segundo': round(1 / media, 2) if media else None,
+        'itens_por_segundo': round(tamanho / media, 2) if media else None,
+        'pico_memoria_kb': round(pico / 1024, 1)
+    }
+
+
+def _percentile(valores_ordenados, percentil):
+    """Nearest-rank percentile of an already sorted list"""
+    posicao = max(0, min(len(valores_ordenados) - 1, round(percentil / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[posicao]
+
+
+def run(tamanhos, casos, usuarios, familias, min_execucoes, max_segundos, latencia_gemini, backend):
+    """Run every case at every dataset size"""
+    resultados = []
+    for tamanho in tamanhos:
+        print(f'Loading {tamanho} expenses...', file=sys.stderr)
+        ctx = Contexto(tamanho, usuarios, familias, latencia_gemini, backend)
+        
+        for nome in casos:
+            metricas = measure(CASOS[nome](ctx), tamanho, min_execucoes, max_segundos)
+            resultados.append({'caso': nome, 'tamanho': tamanho, **metricas})
+            print(f"  {nome:<26} n={tamanho:<7} p50={metricas['p50_ms']:>10.3f}ms "
+                  f"p95={metricas['p95_ms']:>10.3f}ms pico={metricas['pico_memoria_kb']:>10.1f}KB", file=sys.stderr)
+    
+    return {'meta': _metadata(usuarios, familias, latencia_gemini, backend), 'resultados': resultados}
+
+
+def compare(base, atual, tolerancia):
+    """List regressions of `atual` against `base` (same case and size), beyond the tolerance"""
+    referencia = {(r['caso'], r['tamanho']): r for r in base['resultados']}
+    regressoes = []
+    
+    for resultado in atual['resultados']:
+        anterior = referencia.get((resultado['caso'], resultado['tamanho']))
+        if not anterior:
+            continue
+        
+        for metrica in ('p50_ms', 'pico_memoria_kb'):
+            if not anterior[metrica]:
+                continue
+            razao = resultado[metrica] / anterior[metrica]
+            marcador = 'REGRESSAO' if razao > 1 + tolerancia else ''
+            print(f"{resultado['caso']:<26} n={resultado['tamanho']:<7} {metrica:<16} "
+                  f"{anterior[metrica]:>12.3f} -> {resultado[metrica]:>12.3f} ({razao:5.2f}x) {marcador}")
+            if marcador:
+                regressoes.append((resultado['caso'], resultado['tamanho'], metrica, razao))
+    
+    return regressoes
+
+
+def _metadata(usuarios, familias, latencia_gemini, backend):
+    """Where and on what code a result file was produced"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    
+    return {
+        'commit': commit,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'usuarios': usuarios,
+        'familias': familias,
+        'latencia_gemini': latencia_gemini,
+        'backend': backend
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanhos', default=','.join(map(str, TAMANHOS_PADRAO)),
+                        help='comma-separated dataset sizes')
+    parser.add_argument('--casos', default=','.join(CASOS), help='comma-separated cases to run')
+    parser.add_argument('--usuarios', type=int, default=50, help='distinct users in the dataset')
+    parser.add_argument('--familias', type=int, default=1, help='families the users are split into')
+    parser.add_argument('--execucoes', type=int, default=5, help='minimum timed runs per case')
+    parser.add_argument('--max-segundos', type=float, default=2.0, help='time budget per case')
+    parser.add_argument('--latencia-gemini', type=float, default=0.0, help='simulated Gemini latency (s)')
+    parser.add_argument('--backend', choices=['dynamodb', 'sqlite'], default='dynamodb', help='expense store under test')
+    parser.add_argument('--saida', help='write results as JSON to this file')
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'ATUAL'), help='compare two result files')
+    parser.add_argument('--tolerancia', type=float, default=0.15, help='allowed slowdown before failing (0.15 = 15%%)')
+    args = parser.parse_args(argv)
+    
+    if args.comparar:
+        with open(args.comparar[0]) as base, open(args.comparar[1]) as atual:
+            regressoes = compare(json.load(base), json.load(atual), args.tolerancia)
+        print(f'{len(regressoes)} regression(s) beyond {args.tolerancia:.0%}')
+        return 1 if regressoes else 0
+    
+    # Repositories log every write at INFO; keep loading 100k items quiet
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    casos = [nome for nome in args.casos.split(',') if nome]
+    desconhecidos = set(casos) - set(CASOS)
+    if desconhecidos:
+        parser.error(f'unknown cases: {", ".join(sorted(desconhecidos))}')
+    
+    tamanhos = [int(tamanho) for tamanho in args.tamanhos.split(',')]
+    resultados = run(
+        tamanhos, casos, args.usuarios, args.familias, args.execucoes, args.max_segundos,
+        args.latencia_gemini, args.backend
+    )
+    
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
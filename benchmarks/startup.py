@@ -0,0 +1,172 @@
+"""Cold-start profile of the Lambda entry point: import-time breakdown and init duration per intent.
+
+    python -m benchmarks.startup --saida startup.json
+    python -m benchmarks.startup --comparar base.json startup.json --tolerancia 0.25
+
+Every measurement runs in a fresh interpreter, like a new Lambda container. The
+comparison exits with status 1 when a scenario got slower (p50) or hungrier (peak
+RSS) than the tolerance allows, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from benchmarks.run import compare
+
+# Services each kind of request builds before replying (see index._create_service)
+CENARIOS = {
+    'options': [],
+    'ajuda': ['parser'],
+    'despesa': ['idempotency', 'family', 'interpretation', 'expense'],
+    'consulta': ['idempotency', 'family', 'interpretation', 'report'],
+    'worker': ['report', 'sender']
+}
+
+# Dependencies whose presence after init is worth reporting
+MODULOS_PESADOS = ('boto3', 'botocore', 'requests', 'urllib3')
+
+# Runs in the fresh interpreter: import the handler module, then build the scenario's services
+MEDICAO = """
+import json, resource, sys, time
+inicio = time.perf_counter()
+import index
+importado = time.perf_counter()
+servicos = index._get_services()
+for nome in sys.argv[2:]:
+    servicos[nome]
+fim = time.perf_counter()
+print(json.dumps({
+    'import_ms': (importado - inicio) * 1000,
+    'init_ms': (fim - importado) * 1000,
+    'modulos': [m for m in json.loads(sys.argv[1]) if m in sys.modules],
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+}))
+"""
+
+IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def _environment():
+    """Child environment: boto3 needs a region to build clients, even without calling AWS"""
+    ambiente = dict(os.environ)
+    ambiente.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    return ambiente
+
+
+def measure(servicos, execucoes):
+    """Median import/init time of a scenario over `execucoes` fresh interpreters"""
+    amostras = []
+    for _ in range(execucoes):
+        saida = subprocess.run(
+            [sys.executable, '-c', MEDICAO, json.dumps(MODULOS_PESADOS), *servicos],
+            capture_output=True, text=True, check=True, env=_environment()
+        ).stdout
+        amostras.append(json.loads(saida.strip().splitlines()[-1]))
+    
+    totais = [a['import_ms'] + a['init_ms'] for a in amostras]
+    return {
+        'execucoes': execucoes,
+        'p50_ms': round(statistics.median(totais), 2),
+        'import_ms': round(statistics.median(a['import_ms'] for a in amostras), 2),
+        'init_ms': round(statistics.median(a['init_ms'] for a in amostras), 2),
+        'pico_memoria_kb': max(a['rss_kb'] for a in amostras),
+        'modulos': amostras[-1]['modulos']
+    }
+
+
+def import_breakdown(servicos, limite):
+    """Slowest modules (cumulative µs from -X importtime) when a scenario's services are built"""
+    codigo = 'import index, sys\nservicos = index._get_services()\nfor nome in sys.argv[1:]:\n    servicos[nome]'
+    saida = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo, *servicos],
+        capture_output=True, text=True, check=True, env=_environment()
+    ).stderr
+    
+    # Top-level imports from index on (earlier ones are the interpreter's own startup);
+    # their cumulative times add up to the whole cold start
+    raizes = []
+    for linha in saida.splitlines():
+        encontrado = IMPORTTIME_RE.match(linha)
+        if not encontrado or len(encontrado.group(3)) > 1:
+            continue
+        proprio, acumulado, _, nome = encontrado.groups()
+        if nome == 'index' or raizes:
+            raizes.append({'modulo': nome, 'proprio_us': int(proprio), 'acumulado_us': int(acumulado)})
+    
+    raizes.sort(key=lambda m: m['acumulado_us'], reverse=True)
+    return raizes[:limite]
+
+
+def run(cenarios, execucoes, limite):
+    """Profile every scenario"""
+    resultados = []
+    for nome in cenarios:
+        metricas = measure(CENARIOS[nome], execucoes)
+        resultados.append({'caso': f'cold_start.{nome}', 'tamanho': 0, **metricas})
+        print(f"  {nome:<10} p50={metricas['p50_ms']:>8.1f}ms (import {metricas['import_ms']:.1f}ms, "
+              f"init {metricas['init_ms']:.1f}ms) rss={metricas['pico_memoria_kb']}KB "
+              f"modulos={','.join(metricas['modulos']) or '-'}", file=sys.stderr)
+        
+        if limite:
+            for modulo in import_breakdown(CENARIOS[nome], limite):
+                print(f"      {modulo['acumulado_us'] / 1000:>8.1f}ms  {modulo['modulo']}", file=sys.stderr)
+    
+    return {'meta': _metadata(execucoes), 'resultados': resultados}
+
+
+def _metadata(execucoes):
+    """Where and on what code a result file was produced"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    
+    return {
+        'commit': commit,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'execucoes': execucoes
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cenarios', default=','.join(CENARIOS), help='comma-separated scenarios to profile')
+    parser.add_argument('--execucoes', type=int, default=5, help='fresh interpreters per scenario')
+    parser.add_argument('--top', type=int, default=8, help='slowest top-level imports listed per scenario (0 = none)')
+    parser.add_argument('--saida', help='write results as JSON to this file')
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'ATUAL'), help='compare two result files')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='allowed slowdown before failing (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+    
+    if args.comparar:
+        with open(args.comparar[0]) as base, open(args.comparar[1]) as atual:
+            regressoes = compare(json.load(base), json.load(atual), args.tolerancia)
+        print(f'{len(regressoes)} regression(s) beyond {args.tolerancia:.0%}')
+        return 1 if regressoes else 0
+    
+    cenarios = [nome for nome in args.cenarios.split(',') if nome]
+    desconhecidos = set(cenarios) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f'unknown scenarios: {", ".join(sorted(desconhecidos))}')
+    
+    resultados = run(cenarios, args.execucoes, args.top)
+    
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,11 +2,144 @@ import os
 
 # Gemini API Configuration
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
-GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent"
+GEMINI_URL = os.environ.get('GEMINI_URL', "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent")
 
 # Twilio Configuration
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 
 # DynamoDB Configuration
-DYNAMODB_TABLE_NAME = 'despesas-familia'
\ No newline at end of file
+DYNAMODB_TABLE_NAME = 'despesas-familia'
+# GSI on mes_referencia (YYYY-MM) + timestamp, used for family and date-range lookups
+DYNAMODB_PERIOD_INDEX = os.environ.get('DYNAMODB_PERIOD_INDEX', 'mes_referencia-timestamp-index')
+# Pre-aggregated counters (escopo + chave), kept up to date on every saved expense
+DYNAMODB_ROLLUP_TABLE_NAME = os.environ.get('DYNAMODB_ROLLUP_TABLE_NAME', 'despesas-familia-rollups')
+# Seconds a container trusts the rollup version it read; a rebuild waits this long around each switch
+ROLLUP_VERSION_CACHE_TTL = int(os.environ.get('ROLLUP_VERSION_CACHE_TTL', '60'))
+# Shared cache (Partition Key 'chave', TTL attribute 'expira_em')
+DYNAMODB_CACHE_TABLE_NAME = os.environ.get('DYNAMODB_CACHE_TABLE_NAME', 'despesas-familia-cache')
+# GSI on familia_id + timestamp: a family report reads only its own partition
+DYNAMODB_FAMILY_INDEX = os.environ.get('DYNAMODB_FAMILY_INDEX', 'familia_id-timestamp-index')
+# Family members (Partition Key 'whatsapp_from', attribute 'familia_id')
+DYNAMODB_FAMILY_TABLE_NAME = os.environ.get('DYNAMODB_FAMILY_TABLE_NAME', 'despesas-familia-membros')
+# Learned vocabulary (Partition Key 'escopo', Sort Key 'termo', one 'c#<categoria>' counter per attribute)
+DYNAMODB_VOCABULARY_TABLE_NAME = os.environ.get('DYNAMODB_VOCABULARY_TABLE_NAME', 'despesas-familia-vocabulario')
+# BatchWriteItem/BatchGetItem calls per chunk while DynamoDB hands back unprocessed items
+DYNAMODB_BATCH_MAX_ATTEMPTS = int(os.environ.get('DYNAMODB_BATCH_MAX_ATTEMPTS', '5'))
+# Base of the exponential backoff (with jitter) between those calls, in seconds
+DYNAMODB_BATCH_BACKOFF_BASE = float(os.environ.get('DYNAMODB_BATCH_BACKOFF_BASE', '0.05'))
+
+# Storage Configuration
+# Expense store: dynamodb (default) | sqlite (self-hosted deployments, local benchmarks)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'dynamodb')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', '/tmp/despesas-familia.db')
+# Rows written per SQLite transaction when saving in bulk
+SQLITE_BATCH_SIZE = int(os.environ.get('SQLITE_BATCH_SIZE', '500'))
+
+# Family Configuration
+# Family of numbers not registered in any family (single-family deployments need no setup)
+DEFAULT_FAMILY_ID = 'geral'
+# Seconds a number -> family lookup is reused by a warm container
+FAMILY_CACHE_TTL = int(os.environ.get('FAMILY_CACHE_TTL', '300'))
+
+# Local Parser Configuration
+# Local interpretations at or above this confidence skip the Gemini call
+LOCAL_PARSER_MIN_CONFIDENCE = float(os.environ.get('LOCAL_PARSER_MIN_CONFIDENCE', '0.75'))
+# Fraction of local hits also sent to Gemini to measure local accuracy
+LOCAL_PARSER_SHADOW_RATE = float(os.environ.get('LOCAL_PARSER_SHADOW_RATE', '0.0'))
+
+# Vocabulary Index Configuration
+# Learn each user's and family's description -> category pairs and categorize repeat descriptions locally
+VOCABULARY_INDEX = os.environ.get('VOCABULARY_INDEX', 'false').lower() == 'true'
+# Past expenses behind a learned category before it is trusted
+VOCABULARY_MIN_COUNT = int(os.environ.get('VOCABULARY_MIN_COUNT', '2'))
+# Share of the weighted votes the winning category needs; below it the message still goes to Gemini
+VOCABULARY_MIN_SHARE = float(os.environ.get('VOCABULARY_MIN_SHARE', '0.8'))
+# Scopes whose read terms a warm container keeps, and for how many seconds before reading them again
+VOCABULARY_CACHE_SIZE = int(os.environ.get('VOCABULARY_CACHE_SIZE', '256'))
+VOCABULARY_CACHE_TTL = int(os.environ.get('VOCABULARY_CACHE_TTL', '600'))
+
+# Interpretation Cache Configuration
+INTERPRETATION_CACHE_SIZE = int(os.environ.get('INTERPRETATION_CACHE_SIZE', '512'))
+INTERPRETATION_CACHE_TTL = int(os.environ.get('INTERPRETATION_CACHE_TTL', str(7 * 24 * 3600)))
+# Also share interpretations between containers through the DynamoDB cache table
+INTERPRETATION_CACHE_SHARED = os.environ.get('INTERPRETATION_CACHE_SHARED', 'false').lower() == 'true'
+
+# Insight Cache Configuration
+INSIGHT_CACHE_SIZE = int(os.environ.get('INSIGHT_CACHE_SIZE', '256'))
+INSIGHT_CACHE_TTL = int(os.environ.get('INSIGHT_CACHE_TTL', str(24 * 3600)))
+INSIGHT_CACHE_SHARED = os.environ.get('INSIGHT_CACHE_SHARED', 'false').lower() == 'true'
+
+# Report Precompute Configuration
+# Serve reports built by jobs/precompute_reports (plus newer expenses) from the cache table
+PRECOMPUTED_REPORTS = os.environ.get('PRECOMPUTED_REPORTS', 'false').lower() == 'true'
+# A little longer than the weekly schedule, so one missed run still leaves a base to serve
+PRECOMPUTED_REPORT_TTL = int(os.environ.get('PRECOMPUTED_REPORT_TTL', str(8 * 24 * 3600)))
+# Expenses are keyed by receipt time: reports re-read this much before the precomputed cut (a Lambda's
+# longest run) so slow or retried saves that land later are still counted
+PRECOMPUTED_OVERLAP_SECONDS = int(os.environ.get('PRECOMPUTED_OVERLAP_SECONDS', '900'))
+# Reports built at the same time by the job (each may call Gemini once)
+PRECOMPUTE_CONCURRENCY = int(os.environ.get('PRECOMPUTE_CONCURRENCY', '8'))
+
+# Audio Configuration
+# Transcribe and interpret voice notes in a single Gemini request
+AUDIO_ONE_SHOT = os.environ.get('AUDIO_ONE_SHOT', 'true').lower() == 'true'
+GEMINI_UPLOAD_URL = os.environ.get('GEMINI_UPLOAD_URL', "https://generativelanguage.googleapis.com/upload/v1beta/files")
+# Hard cap on downloaded voice notes
+AUDIO_MAX_BYTES = int(os.environ.get('AUDIO_MAX_BYTES', str(12 * 1024 * 1024)))
+AUDIO_MAX_SECONDS = int(os.environ.get('AUDIO_MAX_SECONDS', '300'))
+# Above this size audio goes through Gemini's file upload API instead of inline base64
+AUDIO_INLINE_MAX_BYTES = int(os.environ.get('AUDIO_INLINE_MAX_BYTES', str(4 * 1024 * 1024)))
+AUDIO_CHUNK_BYTES = 64 * 1024
+# Pieces of an upload whose size is unknown (multiples of 256 KiB, as the resumable protocol requires)
+AUDIO_UPLOAD_PART_BYTES = 2 * 1024 * 1024
+
+# Transcription Cache Configuration
+TRANSCRIPTION_CACHE_SIZE = int(os.environ.get('TRANSCRIPTION_CACHE_SIZE', '256'))
+TRANSCRIPTION_CACHE_TTL = int(os.environ.get('TRANSCRIPTION_CACHE_TTL', str(30 * 24 * 3600)))
+# Persist transcriptions in the DynamoDB cache table (Twilio retries often land on other containers)
+TRANSCRIPTION_CACHE_SHARED = os.environ.get('TRANSCRIPTION_CACHE_SHARED', 'true').lower() == 'true'
+
+# Idempotency Configuration (records live in the cache table)
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', str(24 * 3600)))
+# An in-progress record older than this is considered abandoned and may be retried
+IDEMPOTENCY_STALE_SECONDS = int(os.environ.get('IDEMPOTENCY_STALE_SECONDS', '120'))
+
+# Async Configuration
+# Reply to slow intents with an immediate ack and deliver the result from a worker
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'false').lower() == 'true'
+ASYNC_INTENTS = os.environ.get('ASYNC_INTENTS', 'consulta').split(',')
+JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND', 'sqs')  # sqs | memory
+SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
+MESSAGE_SENDER_BACKEND = os.environ.get('MESSAGE_SENDER_BACKEND', 'twilio')  # twilio | memory
+TWILIO_WHATSAPP_NUMBER = os.environ.get('TWILIO_WHATSAPP_NUMBER')  # e.g. whatsapp:+14155238886
+TWILIO_MESSAGES_URL = os.environ.get('TWILIO_MESSAGES_URL', "https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json")
+
+# Gemini Prompt Configuration
+# Read interpretations with streamGenerateContent and stop at the end of the JSON object
+GEMINI_STREAMING = os.environ.get('GEMINI_STREAMING', 'false').lower() == 'true'
+# Estimated input tokens for the insights data (totals, categories, people, then as many recent expenses as fit)
+INSIGHT_PROMPT_MAX_TOKENS = int(os.environ.get('INSIGHT_PROMPT_MAX_TOKENS', '350'))
+
+# Gemini Resilience Configuration
+GEMINI_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT', '30'))
+GEMINI_AUDIO_TIMEOUT = float(os.environ.get('GEMINI_AUDIO_TIMEOUT', '60'))
+GEMINI_MAX_ATTEMPTS = int(os.environ.get('GEMINI_MAX_ATTEMPTS', '3'))
+GEMINI_BACKOFF_BASE = float(os.environ.get('GEMINI_BACKOFF_BASE', '0.3'))
+# Consecutive failures that open the circuit, and how long it stays open
+GEMINI_BREAKER_THRESHOLD = int(os.environ.get('GEMINI_BREAKER_THRESHOLD', '5'))
+GEMINI_BREAKER_COOLDOWN = float(os.environ.get('GEMINI_BREAKER_COOLDOWN', '30'))
+# Twilio gives up on a webhook after 15 s; keep the synchronous path inside that
+WEBHOOK_BUDGET_SECONDS = float(os.environ.get('WEBHOOK_BUDGET_SECONDS', '13.5'))
+# Time reserved after the last external call to render and return the response
+DEADLINE_SAFETY_MARGIN = float(os.environ.get('DEADLINE_SAFETY_MARGIN', '0.5'))
+# Threads shared by independent I/O calls of one request (DynamoDB reads, downloads); 0 runs them in sequence
+IO_POOL_WORKERS = int(os.environ.get('IO_POOL_WORKERS', '8'))
+# Minimum local confidence accepted when Gemini is unavailable
+LOCAL_PARSER_DEGRADED_MIN_CONFIDENCE = float(os.environ.get('LOCAL_PARSER_DEGRADED_MIN_CONFIDENCE', '0.3'))
+
+# Observability Configuration
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'WhatsappDespesas')
+# Fraction of requests whose full event is logged
+EVENT_LOG_SAMPLE_RATE = float(os.environ.get('EVENT_LOG_SAMPLE_RATE', '0.01'))
@@ -1,21 +1,105 @@
 import json
 import logging
+import random
+import time
 from urllib.parse import parse_qs
 from datetime import datetime
 
-from services.audio_service import AudioService
-from services.gemini_service import GeminiService
-from services.expense_service import ExpenseService
-from services.report_service import ReportService
+_inicio_import = time.perf_counter()
+
+from config.settings import (
+    ASYNC_MODE, ASYNC_INTENTS, WEBHOOK_BUDGET_SECONDS, EVENT_LOG_SAMPLE_RATE, VOCABULARY_INDEX, LOCAL_PARSER_MIN_CONFIDENCE
+)
+from utils.concurrency_helper import ConcurrencyHelper
+from utils.deadline_helper import DeadlineHelper
+from utils.metrics_helper import MetricsHelper
 from utils.response_helper import ResponseHelper
+from utils.tracing_helper import TracingHelper
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+
+class _Services(dict):
+    """Service singletons built (and their modules imported) on first use.
+    
+    boto3 and requests take most of a cold start; an OPTIONS request or a greeting
+    never loads them, and each intent only pays for the services it touches.
+    """
+    
+    def __missing__(self, nome):
+        servico = self[nome] = _create_service(self, nome)
+        return servico
+
+
+def _create_service(services, nome):
+    """Import and build one service"""
+    if nome == 'gemini':
+        from services.gemini_service import GeminiService
+        return GeminiService()
+    if nome == 'parser':
+        from services.local_parser_service import LocalParserService
+        return LocalParserService()
+    if nome == 'interpretation':
+        # Gemini and audio are imported by the service itself, only when a message needs them
+        from services.interpretation_service import InterpretationService
+        return InterpretationService(local_parser=services['parser'], vocabulary_index=services['vocabulary'])
+    if nome == 'family':
+        from repositories.family_repository import create_family_repository
+        return create_family_repository()
+    if nome == 'expense':
+        from services.expense_service import ExpenseService
+        return ExpenseService(family_repository=services['family'], vocabulary_index=services['vocabulary'])
+    if nome == 'report':
+        from services.report_service import ReportService
+        return ReportService(
+            gemini_service=services['gemini'], repository=services['expense'].repository,
+            family_repository=services['family']
+        )
+    if nome == 'vocabulary':
+        if not VOCABULARY_INDEX:
+            return None
+        from services.vocabulary_index import VocabularyIndex
+        return VocabularyIndex()
+    if nome == 'idempotency':
+        from repositories.idempotency_repository import IdempotencyRepository
+        return IdempotencyRepository()
+    if nome == 'queue':
+        from services.job_queue import create_job_queue
+        return create_job_queue()
+    if nome == 'sender':
+        from services.message_sender import create_message_sender
+        return create_message_sender()
+    raise KeyError(nome)
+
+
+# Services live at module scope so warm containers reuse them (and their
+# DynamoDB table handles / pooled HTTP connections) across invocations
+_services = _Services()
+
+# Module import time, reported once by the first invocation of the container
+_init_ms = (time.perf_counter() - _inicio_import) * 1000
+
+
+def _get_services():
+    """Service singletons, created lazily by name"""
+    return _services
+
+
+def _record_cold_start():
+    """Add the module init time to the first traced request of this container"""
+    global _init_ms
+    if _init_ms is not None:
+        TracingHelper.add_metric('init_ms', _init_ms)
+        _init_ms = None
+
+
 def lambda_handler(event, context):
     """Main Lambda handler function"""
-    logger.info(f'Event received: {json.dumps(event)}')
+    # Full event dumps are sampled: serializing every event is not free
+    if random.random() < EVENT_LOG_SAMPLE_RATE:
+        logger.info(f'Event received: {json.dumps(event)}')
     
     # CORS headers for all responses
     headers = ResponseHelper.get_cors_headers()
@@ -24,48 +108,239 @@ def lambda_handler(event, context):
     if event.get('httpMethod') == 'OPTIONS':
         return ResponseHelper.create_options_response()
     
+    # External calls must finish before Twilio gives up on the webhook
+    DeadlineHelper.start(context, WEBHOOK_BUDGET_SECONDS)
+    TracingHelper.start_request(handler='webhook')
+    _record_cold_start()
+    
     try:
+        services = _get_services()
+        
         # Parse message from Twilio or test event
-        mensagem = _parse_message(event)
+        with TracingHelper.span('parse'):
+            mensagem = _parse_message(event)
+        message_sid = mensagem.get('messageSid')
         
-        # Handle audio messages
-        if _is_audio_message(mensagem):
-            audio_service = AudioService()
-            texto_convertido = audio_service.convert_to_text(mensagem['mediaUrl'])
-            
-            if not texto_convertido:
-                return ResponseHelper.create_twiml_response(
-                    "🎤 Desculpe, não consegui entender o áudio. Tente enviar uma mensagem de texto ou grave novamente com mais clareza."
-                )
-            
-            mensagem['texto'] = texto_convertido
+        # A greeting needs no claim (replying twice is harmless), family, vocabulary or Gemini
+        if _is_help_message(services, mensagem):
+            TracingHelper.set_tag('intent', 'ajuda')
+            with TracingHelper.span('resposta'):
+                return ResponseHelper.create_twiml_response(_generate_help_message())
         
-        texto_mensagem = mensagem.get('texto', '').strip()
+        # Claiming the MessageSid, the sender's family and the voice note do not depend on each other
+        reivindicacao = {}
+        try:
+            leituras = ConcurrencyHelper.run_parallel(_prefetch_tasks(services, mensagem, reivindicacao))
+        except Exception:
+            # A failed read (voice note out of time) must not leave the message claimed until it goes stale
+            is_new, registro = reivindicacao.get('resultado', (False, None))
+            if is_new and registro:
+                services['idempotency'].release(message_sid)
+            raise
         
-        if not texto_mensagem:
-            return ResponseHelper.create_twiml_response(
-                "❌ Não recebi nenhuma mensagem de texto ou áudio válido. Tente novamente!"
-            )
+        # Twilio retries slow webhooks: replay the stored reply instead of reprocessing
+        if message_sid:
+            is_new, registro = leituras['claim']
+            if not is_new:
+                TracingHelper.set_tag('intent', 'duplicada')
+                return _replay_response(registro)
+            if registro:
+                mensagem['recebidoEm'] = registro['recebido_em']
         
-        # Use Gemini to interpret the message
-        gemini_service = GeminiService()
-        interpretacao = gemini_service.interpret_message(texto_mensagem)
+        try:
+            resposta = _process_message(services, mensagem, leituras.get('audio'))
+        except Exception:
+            if message_sid:
+                services['idempotency'].release(message_sid)
+            raise
         
-        # Process based on interpretation
-        if interpretacao['tipo'] == 'despesa':
-            expense_service = ExpenseService()
-            resposta = expense_service.process_expense(mensagem, interpretacao)
-        elif interpretacao['tipo'] == 'consulta':
-            report_service = ReportService()
-            resposta = report_service.process_query(texto_mensagem, mensagem.get('profileName', ''), interpretacao)
-        else:
-            resposta = _generate_help_message()
+        if message_sid:
+            services['idempotency'].complete(message_sid, resposta)
         
-        return ResponseHelper.create_twiml_response(resposta)
+        with TracingHelper.span('resposta'):
+            return ResponseHelper.create_twiml_response(resposta)
     
     except Exception as error:
         logger.error(f'Error: {str(error)}', exc_info=True)
+        TracingHelper.set_tag('erro', type(error).__name__)
         return ResponseHelper.create_twiml_response("❌ Ops! Algo deu errado. Tente novamente em alguns segundos.")
+    
+    finally:
+        TracingHelper.flush()
+        DeadlineHelper.clear()
+
+
+def _prefetch_tasks(services, mensagem, reivindicacao):
+    """Reads every webhook needs before processing, keyed for ConcurrencyHelper.run_parallel.
+    
+    The claim goes first, so it runs on the calling thread and has finished before
+    the other reads are awaited; its result is also kept in `reivindicacao`, so the
+    caller can release the claim when another read fails.
+    """
+    tarefas = {}
+    if mensagem.get('messageSid'):
+        def reivindicar():
+            reivindicacao['resultado'] = _start_processing(services, mensagem['messageSid'])
+            return reivindicacao['resultado']
+        tarefas['claim'] = reivindicar
+    if mensagem.get('from'):
+        # Warms the family cache read by expenses and reports
+        tarefas['familia'] = lambda: _get_family_id(services, mensagem['from'])
+    if _is_audio_message(mensagem):
+        # Discarded if the claim shows a duplicate webhook
+        tarefas['audio'] = lambda: services['interpretation'].fetch_audio(mensagem['mediaUrl'])
+    return tarefas
+
+
+def _is_help_message(services, mensagem):
+    """Whether a text message is a greeting/help request the local parser is sure about"""
+    if _is_audio_message(mensagem):
+        return False
+    with TracingHelper.span('interpretacao'):
+        local = services['parser'].parse(mensagem.get('texto', ''))
+    if not local or local['tipo'] != 'ajuda' or local['confianca'] < LOCAL_PARSER_MIN_CONFIDENCE:
+        return False
+    
+    MetricsHelper.increment('interpretacao.total')
+    MetricsHelper.increment('interpretacao.local')
+    return True
+
+
+def _get_family_id(services, whatsapp_from):
+    """Sender's family; a failed lookup is retried (and surfaced) where the family is used"""
+    try:
+        return services['family'].get_family_id(whatsapp_from)
+    except Exception as error:
+        logger.error(f'Family lookup failed: {str(error)}')
+        return None
+
+
+def _process_message(services, mensagem, audio=None):
+    """Run transcription, interpretation and the matching action; returns the reply text"""
+    interpretacao = None
+    
+    # Sender whose learned vocabulary may categorize the message (family lookup warmed by the prefetch)
+    remetente = {'usuario': mensagem.get('profileName')}
+    if VOCABULARY_INDEX and mensagem.get('from'):
+        remetente['familia_id'] = _get_family_id(services, mensagem['from'])
+    
+    # Handle audio messages (transcription and interpretation in one Gemini call)
+    if _is_audio_message(mensagem):
+        TracingHelper.set_tag('midia', 'audio')
+        texto_convertido, interpretacao = services['interpretation'].interpret_audio(
+            mensagem['mediaUrl'], audio, **remetente
+        )
+        
+        if not texto_convertido:
+            return "🎤 Desculpe, não consegui entender o áudio. Tente enviar uma mensagem de texto ou grave novamente com mais clareza."
+        
+        mensagem['texto'] = texto_convertido
+    
+    texto_mensagem = mensagem.get('texto', '').strip()
+    
+    if not texto_mensagem:
+        return "❌ Não recebi nenhuma mensagem de texto ou áudio válido. Tente novamente!"
+    
+    # Interpret locally when possible, otherwise with Gemini
+    if interpretacao is None:
+        with TracingHelper.span('interpretacao'):
+            interpretacao = services['interpretation'].interpret(texto_mensagem, **remetente)
+    
+    TracingHelper.set_tag('intent', interpretacao['tipo'])
+    
+    # Slow intents: acknowledge now, the worker sends the result via the Twilio API
+    if ASYNC_MODE and interpretacao['tipo'] in ASYNC_INTENTS and mensagem.get('from'):
+        return _enqueue_job(services, mensagem, texto_mensagem, interpretacao)
+    
+    # Process based on interpretation
+    if interpretacao['tipo'] == 'despesa':
+        resposta = services['expense'].process_expense(mensagem, interpretacao)
+    elif interpretacao['tipo'] == 'consulta':
+        resposta = services['report'].process_query(
+            texto_mensagem, mensagem.get('profileName', ''), interpretacao, mensagem.get('from')
+        )
+    else:
+        resposta = _generate_help_message()
+    
+    return resposta
+
+
+def worker_handler(event, context):
+    """Worker Lambda: run deferred jobs from the queue and send the replies"""
+    DeadlineHelper.start(context)
+    TracingHelper.start_request(handler='worker')
+    _record_cold_start()
+    
+    try:
+        services = _get_services()
+        
+        # SQS event, or a single job when invoked directly
+        registros = event.get('Records') or [{'messageId': None, 'body': json.dumps(event)}]
+        falhas = []
+        
+        for registro in registros:
+            try:
+                job = json.loads(registro['body'])
+                resposta = _run_job(services, job)
+                TracingHelper.set_tag('intent', job['tipo'])
+                with TracingHelper.span('envio'):
+                    services['sender'].send(job['destino'], resposta)
+            except Exception as error:
+                logger.error(f'Error running job: {str(error)}', exc_info=True)
+                if registro.get('messageId'):
+                    falhas.append({'itemIdentifier': registro['messageId']})
+                else:
+                    raise
+    
+    finally:
+        TracingHelper.flush()
+        DeadlineHelper.clear()
+    
+    # Partial batch response: SQS only redelivers the failed messages
+    return {'batchItemFailures': falhas}
+
+
+def _run_job(services, job):
+    """Execute one deferred job and return the reply text"""
+    if job['tipo'] == 'consulta':
+        return services['report'].process_query(
+            job['texto'], job.get('profileName', ''), job['interpretacao'], job.get('destino')
+        )
+    if job['tipo'] == 'despesa':
+        return services['expense'].process_expense(job['mensagem'], job['interpretacao'])
+    raise ValueError(f"Unknown job type: {job['tipo']}")
+
+
+def _enqueue_job(services, mensagem, texto_mensagem, interpretacao):
+    """Queue a slow intent and return the immediate acknowledgement"""
+    services['queue'].enqueue({
+        'tipo': interpretacao['tipo'],
+        'texto': texto_mensagem,
+        'profileName': mensagem.get('profileName', ''),
+        'destino': mensagem['from'],
+        'interpretacao': interpretacao,
+        'mensagem': mensagem
+    })
+    
+    if interpretacao['tipo'] == 'consulta':
+        return "📊 Preparando seu relatório... já te envio em instantes!"
+    return "⏳ Recebi! Já te envio a confirmação em instantes."
+
+
+def _start_processing(services, message_sid):
+    """Claim a MessageSid; if the idempotency store is unavailable, process anyway"""
+    try:
+        return services['idempotency'].start(message_sid)
+    except Exception as error:
+        logger.error(f'Idempotency check failed, processing anyway: {str(error)}')
+        return True, None
+
+
+def _replay_response(registro):
+    """Reply to a duplicate webhook with the stored response (or a short wait notice)"""
+    if registro.get('status') == 'concluido' and registro.get('resposta'):
+        return ResponseHelper.create_twiml_response(registro['resposta'])
+    return ResponseHelper.create_twiml_response("⏳ Ainda estou processando sua mensagem anterior, só um instante!")
 
 
 def _parse_message(event):
@@ -76,6 +351,7 @@ def _parse_message(event):
             'texto': params.get('Body', [''])[0],
             'from': params.get('From', [''])[0],
             'profileName': params.get('ProfileName', [''])[0],
+            'messageSid': params.get('MessageSid', [''])[0],
             'mediaUrl': params.get('MediaUrl0', [''])[0] if params.get('MediaUrl0') else None,
             'mediaContentType': params.get('MediaContentType0', [''])[0] if params.get('MediaContentType0') else None,
             'numMedia': int(params.get('NumMedia', ['0'])[0])
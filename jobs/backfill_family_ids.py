@@ -0,0 +1,23 @@
+import logging
+from repositories.expense_repository import create_expense_repository
+from repositories.family_repository import create_family_repository
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    """Backfill job: move expenses to the current familia_id of their number for the family index"""
+    repository = create_expense_repository()
+    atualizados = repository.backfill_family_ids(create_family_repository())
+    
+    resultado = {'atualizados': atualizados}
+    # Family rollups still count the moved expenses under their old family
+    if atualizados and not repository.native_aggregation:
+        resultado['proximo_passo'] = 'python -m jobs.rebuild_rollups'
+        logger.warning(f'{atualizados} expenses changed family: rebuild the rollups with python -m jobs.rebuild_rollups')
+    return resultado
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    print(handler({}, None))
@@ -0,0 +1,15 @@
+import logging
+from repositories.expense_repository import DynamoDBExpenseRepository
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    """One-off job: tag legacy expenses with mes_referencia for the period index"""
+    atualizados = DynamoDBExpenseRepository().backfill_period_keys()
+    return {'atualizados': atualizados}
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    print(handler({}, None))
@@ -0,0 +1,30 @@
+import argparse
+import logging
+from repositories.family_repository import create_family_repository
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    """Admin job: {'acao': 'adicionar'|'remover'|'listar', 'whatsapp_from': ..., 'familia_id': ...}"""
+    repository = create_family_repository()
+    acao = event.get('acao', 'listar')
+    
+    if acao == 'adicionar':
+        repository.add_member(event['whatsapp_from'], event['familia_id'])
+    elif acao == 'remover':
+        repository.remove_member(event['whatsapp_from'])
+    elif acao != 'listar':
+        raise ValueError(f'Unknown action: {acao}')
+    
+    return {'membros': dict(repository.iter_members())}
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    parser = argparse.ArgumentParser(description='Manage which WhatsApp numbers belong to which family')
+    parser.add_argument('acao', choices=['adicionar', 'remover', 'listar'])
+    parser.add_argument('whatsapp_from', nargs='?', help="e.g. 'whatsapp:+5511999999999'")
+    parser.add_argument('familia_id', nargs='?')
+    args = parser.parse_args()
+    print(handler(vars(args), None))
@@ -0,0 +1,59 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from config.settings import PRECOMPUTE_CONCURRENCY
+from services.precomputed_report_cache import PrecomputedReportCache
+from services.report_service import ReportService
+from utils.deadline_helper import DeadlineHelper
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Time a report may take (period read plus one Gemini call); later ones are left for the next run
+TEMPO_MINIMO_SEGUNDOS = 30
+
+def handler(event, context):
+    """Scheduled job: precompute current week/month reports and insights of every active user and family"""
+    DeadlineHelper.start(context)
+    servico = ReportService(precomputed_cache=PrecomputedReportCache())
+    agora = datetime.now()
+    periodos = (event or {}).get('periodos') or list(ReportService.PERIODOS_PRECALCULADOS)
+    
+    # The month contains the week except in its first days, so read from whichever starts earlier
+    meia_noite = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio_data = min(meia_noite.replace(day=1), meia_noite - timedelta(days=agora.weekday())).isoformat()
+    
+    usuarios, familias = set(), set()
+    for usuario, familia_id in servico.repository.iter_active_members(inicio_data, agora.isoformat()):
+        usuarios.add(usuario)
+        familias.add(familia_id)
+    
+    tarefas = [(usuario, None, periodo) for usuario in sorted(usuarios) for periodo in periodos]
+    tarefas += [(None, familia_id, periodo) for familia_id in sorted(familias) for periodo in periodos]
+    logger.info(f'Precomputing {len(tarefas)} reports: {len(usuarios)} users, {len(familias)} families')
+    
+    contagem = {'relatorios': 0, 'sem_dados': 0, 'erros': 0, 'pulados': 0}
+    
+    def executar(tarefa):
+        restante = DeadlineHelper.remaining()
+        if restante is not None and restante < TEMPO_MINIMO_SEGUNDOS:
+            return 'pulados'
+        usuario, familia_id, periodo = tarefa
+        try:
+            return 'relatorios' if servico.precompute(usuario, familia_id, periodo, agora) else 'sem_dados'
+        except Exception as error:
+            logger.error(f'Error precomputing {periodo} report of {usuario or familia_id}: {str(error)}')
+            return 'erros'
+    
+    with ThreadPoolExecutor(max_workers=PRECOMPUTE_CONCURRENCY) as executor:
+        for resultado in executor.map(executar, tarefas):
+            contagem[resultado] += 1
+    
+    DeadlineHelper.clear()
+    logger.info(f'Precompute finished: {contagem}')
+    return contagem
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    print(handler({}, None))
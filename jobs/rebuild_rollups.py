@@ -0,0 +1,18 @@
+import logging
+from config.settings import DEFAULT_FAMILY_ID
+from repositories.expense_repository import DynamoDBExpenseRepository
+from repositories.rollup_repository import RollupRepository
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    """Rebuild/backfill job: recompute every rollup row from raw expenses into a new version and switch to it"""
+    despesas = DynamoDBExpenseRepository().iter_all_expenses()
+    linhas = RollupRepository().rebuild(despesas, DEFAULT_FAMILY_ID)
+    return {'linhas': linhas}
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    print(handler({}, None))
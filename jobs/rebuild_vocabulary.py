@@ -0,0 +1,16 @@
+import logging
+from repositories.expense_repository import create_expense_repository
+from services.vocabulary_index import VocabularyIndex
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    """Rebuild/backfill job: recompute every user's and family's vocabulary from saved expenses"""
+    escopos = VocabularyIndex().rebuild(create_expense_repository().iter_all_expenses())
+    return {'escopos': escopos}
+
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    print(handler({}, None))
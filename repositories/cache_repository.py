@@ -0,0 +1,43 @@
+import json
+import logging
+import time
+from config.settings import DYNAMODB_CACHE_TABLE_NAME
+from utils.dynamodb_helper import DynamoDBHelper
+
+logger = logging.getLogger()
+
+class CacheRepository:
+    """Repository for the shared key/value cache table (DynamoDB TTL on 'expira_em')"""
+    
+    def __init__(self):
+        self.table = DynamoDBHelper.get_table(DYNAMODB_CACHE_TABLE_NAME)
+    
+    def get(self, chave):
+        """Get a cached JSON value, ignoring entries past their TTL"""
+        try:
+            response = self.table.get_item(Key={'chave': chave})
+            item = response.get('Item')
+            if not item or int(item.get('expira_em', 0)) <= time.time():
+                return None
+            return json.loads(item['valor'])
+        except Exception as error:
+            logger.error(f'Error reading cache: {str(error)}')
+            return None
+    
+    def put(self, chave, valor, ttl_segundos):
+        """Store a JSON-serializable value with a TTL"""
+        try:
+            self.table.put_item(Item={
+                'chave': chave,
+                'valor': json.dumps(valor, ensure_ascii=False, default=str),
+                'expira_em': int(time.time() + ttl_segundos)
+            })
+        except Exception as error:
+            logger.error(f'Error writing cache: {str(error)}')
+    
+    def delete(self, chave):
+        """Remove a cached value"""
+        try:
+            self.table.delete_item(Key={'chave': chave})
+        except Exception as error:
+            logger.error(f'Error deleting cache entry: {str(error)}')
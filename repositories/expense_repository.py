@@ -1,46 +1,376 @@
 import logging
-import boto3
-from config.settings import DYNAMODB_TABLE_NAME
+import random
+import time
+from boto3.dynamodb.conditions import Key, Attr
+from config.settings import (
+    DYNAMODB_TABLE_NAME, DYNAMODB_PERIOD_INDEX, DYNAMODB_FAMILY_INDEX, DEFAULT_FAMILY_ID, STORAGE_BACKEND,
+    DYNAMODB_BATCH_MAX_ATTEMPTS, DYNAMODB_BATCH_BACKOFF_BASE
+)
+from utils.date_helper import DateHelper
+from utils.dynamodb_helper import DynamoDBHelper
 
 logger = logging.getLogger()
 
+# DynamoDB API limits per BatchWriteItem / BatchGetItem call
+LOTE_ESCRITA = 25
+LOTE_LEITURA = 100
+
+# TransactWriteItems takes 100 actions: one put and up to 12 rollup updates (two versions during a rebuild) each
+DESPESAS_POR_TRANSACAO = 7
+
 class ExpenseRepository:
+    """Storage interface for expenses; the backend is selected by STORAGE_BACKEND"""
+    
+    # Backends that aggregate in the store itself (SQL GROUP BY) need no rollup table
+    native_aggregation = False
+    
+    def save_expense(self, dados):
+        """Save one expense; returns None if this exact expense was already saved (retry)"""
+        raise NotImplementedError
+    
+    def save_expenses(self, itens, rollup_repository=None):
+        """Save several expenses; returns the ones that were not already saved.
+        
+        With a rollup_repository, the rollup increments are written atomically with the expenses.
+        """
+        return [dados for dados in itens if self.save_expense(dados) is not None]
+    
+    def search_expenses(self, inicio_data, fim_data, usuario=None, familia_id=None):
+        """Search expenses in a period"""
+        try:
+            return list(self.iter_expenses(inicio_data, fim_data, usuario, familia_id))
+        except Exception as error:
+            logger.error(f'Error searching expenses: {str(error)}')
+            return []
+    
+    def iter_expenses(self, inicio_data, fim_data, usuario=None, familia_id=None):
+        """Lazily yield expenses in a period (one user, or one family)"""
+        raise NotImplementedError
+    
+    def get_recent_expenses(self, inicio_data, fim_data, usuario=None, limite=10, familia_id=None):
+        """Return the latest expenses of a period in chronological order"""
+        raise NotImplementedError
+    
+    def iter_all_expenses(self):
+        """Yield every stored expense (maintenance jobs only)"""
+        raise NotImplementedError
+    
+    def backfill_family_ids(self, family_repository):
+        """Tag stored expenses with the family of their whatsapp_from; returns how many changed"""
+        raise NotImplementedError
+    
+    def iter_active_members(self, inicio_data, fim_data):
+        """Distinct (user_id, familia_id) pairs with expenses in a period (scheduled jobs only)"""
+        raise NotImplementedError
+    
+    def summarize(self, inicio_data, fim_data, usuario=None, ultimos=10, familia_id=None):
+        """Period summary computed by the store, or None when the backend cannot aggregate"""
+        return None
+
+
+class DynamoDBExpenseRepository(ExpenseRepository):
     """Repository to handle DynamoDB operations for expenses"""
     
     def __init__(self):
-        self.dynamodb = boto3.resource('dynamodb')
-        self.table = self.dynamodb.Table(DYNAMODB_TABLE_NAME)
+        self.table = DynamoDBHelper.get_table(DYNAMODB_TABLE_NAME)
     
     def save_expense(self, dados):
-        """Save expense to DynamoDB"""
+        """Save expense to DynamoDB; returns None if this exact expense was already saved (retry)"""
         try:
-            logger.info(f'Saving to DynamoDB: {dados}')
-            resultado = self.table.put_item(Item=dados)
+            item = self._prepare(dados)
+            
+            logger.info(f'Saving to DynamoDB: {item}')
+            resultado = self.table.put_item(
+                Item=item,
+                ConditionExpression='attribute_not_exists(#timestamp)',
+                ExpressionAttributeNames={'#timestamp': 'timestamp'}
+            )
             logger.info(f'Expense saved successfully: {resultado}')
             return resultado
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            logger.info(f"Expense already saved, skipping retry: {dados['user_id']} {dados['timestamp']}")
+            return None
         except Exception as error:
             logger.error(f'Error saving expense: {str(error)}')
             raise
     
-    def search_expenses(self, inicio_data, fim_data, usuario=None):
-        """Search expenses in DynamoDB"""
-        try:
-            filter_expression = "attribute_exists(#timestamp) AND #timestamp BETWEEN :inicio AND :fim"
-            expression_attribute_names = {'#timestamp': 'timestamp'}
-            expression_attribute_values = {':inicio': inicio_data, ':fim': fim_data}
-            
-            if usuario:
-                filter_expression += " AND #user_id = :usuario"
-                expression_attribute_names['#user_id'] = 'user_id'
-                expression_attribute_values[':usuario'] = usuario
-            
-            response = self.table.scan(
-                FilterExpression=filter_expression,
-                ExpressionAttributeNames=expression_attribute_names,
-                ExpressionAttributeValues=expression_attribute_values
+    def save_expenses(self, itens, rollup_repository=None):
+        """Save expenses; returns the ones that were not already saved.
+        
+        With a rollup_repository, every DESPESAS_POR_TRANSACAO expenses and their rollup
+        increments go in one TransactWriteItems, so a failure (and the webhook retry that
+        follows) never leaves the rollups behind the expenses.
+        """
+        itens = list({(item['user_id'], item['timestamp']): item for item in map(self._prepare, itens)}.values())
+        if rollup_repository is None:
+            return self._save_batch(itens)
+        
+        salvas = []
+        for inicio in range(0, len(itens), DESPESAS_POR_TRANSACAO):
+            salvas += self._save_transaction(itens[inicio:inicio + DESPESAS_POR_TRANSACAO], rollup_repository)
+        return salvas
+    
+    def _save_batch(self, itens):
+        """Save prepared expenses with BatchWriteItem (25 per call); returns the ones that were not already saved.
+        
+        BatchWriteItem has no conditions, so retries are detected with one BatchGetItem per
+        100 keys first. A single expense keeps the conditional put (one round trip).
+        """
+        if len(itens) <= 1:
+            return [item for item in itens if self.save_expense(item) is not None]
+        
+        existentes = self._existing_keys([(item['user_id'], item['timestamp']) for item in itens])
+        novos = [item for item in itens if (item['user_id'], item['timestamp']) not in existentes]
+        if len(novos) < len(itens):
+            logger.info(f'{len(itens) - len(novos)} expenses already saved, skipping retry')
+        
+        for inicio in range(0, len(novos), LOTE_ESCRITA):
+            lote = novos[inicio:inicio + LOTE_ESCRITA]
+            self._batch_call(
+                'batch_write_item', 'UnprocessedItems',
+                {self.table.name: [{'PutRequest': {'Item': item}} for item in lote]}
             )
+        
+        logger.info(f'Expenses saved in batch: {len(novos)}')
+        return novos
+    
+    def _save_transaction(self, lote, rollup_repository):
+        """Save prepared expenses and their rollup increments in one transaction; returns the new ones"""
+        cliente = self.table.meta.client
+        for tentativa in range(DYNAMODB_BATCH_MAX_ATTEMPTS):
+            if tentativa:
+                time.sleep(random.uniform(0, DYNAMODB_BATCH_BACKOFF_BASE * 2 ** tentativa))
+            
+            carimbo, atualizacoes = rollup_repository.write_actions(lote)
+            if carimbo is None:
+                # No rollups built yet: reports aggregate raw expenses and the first rebuild counts these
+                return self._save_batch(lote)
             
-            return response.get('Items', [])
+            try:
+                cliente.transact_write_items(TransactItems=[
+                    {'Put': {
+                        'TableName': self.table.name,
+                        'Item': {**item, 'rollup_versao': carimbo},
+                        'ConditionExpression': 'attribute_not_exists(#timestamp)',
+                        'ExpressionAttributeNames': {'#timestamp': 'timestamp'}
+                    }}
+                    for item in lote
+                ] + atualizacoes)
+                return lote
+            except cliente.exceptions.TransactionCanceledException as error:
+                codigos = [motivo.get('Code') for motivo in error.response.get('CancellationReasons', [])]
+                repetidas = {indice for indice, codigo in enumerate(codigos[:len(lote)]) if codigo == 'ConditionalCheckFailed'}
+                if repetidas:
+                    # Webhook retry: an earlier attempt saved these expenses together with their rollups
+                    logger.info(f'{len(repetidas)} expenses already saved, skipping retry')
+                    lote = [item for indice, item in enumerate(lote) if indice not in repetidas]
+                    if not lote:
+                        return []
+                elif 'TransactionConflict' not in codigos:
+                    raise
+                logger.warning(f'transact_write_items cancelled (attempt {tentativa + 1}): {codigos}')
+        
+        raise RuntimeError(f'transact_write_items kept being cancelled after {DYNAMODB_BATCH_MAX_ATTEMPTS} attempts')
+    
+    def iter_expenses(self, inicio_data, fim_data, usuario=None, familia_id=None):
+        """Lazily yield expenses in a period, following every result page"""
+        if usuario:
+            # Individual report: one partition, timestamp range on the sort key
+            yield from self._paginate(
+                KeyConditionExpression=Key('user_id').eq(usuario) & Key('timestamp').between(inicio_data, fim_data)
+            )
+            return
+        
+        if familia_id:
+            # Family report: only this family's partition of the family index
+            yield from self._paginate(
+                IndexName=DYNAMODB_FAMILY_INDEX,
+                KeyConditionExpression=Key('familia_id').eq(familia_id) & Key('timestamp').between(inicio_data, fim_data)
+            )
+            return
+        
+        # Every family: one query per month bucket on the period index
+        for mes in DateHelper.get_month_keys(inicio_data, fim_data):
+            yield from self._paginate(
+                IndexName=DYNAMODB_PERIOD_INDEX,
+                KeyConditionExpression=Key('mes_referencia').eq(mes) & Key('timestamp').between(inicio_data, fim_data)
+            )
+    
+    def get_recent_expenses(self, inicio_data, fim_data, usuario=None, limite=10, familia_id=None):
+        """Return the latest expenses of a period in chronological order"""
+        try:
+            if usuario or familia_id:
+                query_kwargs = {
+                    'KeyConditionExpression': Key('user_id').eq(usuario) & Key('timestamp').between(inicio_data, fim_data)
+                } if usuario else {
+                    'IndexName': DYNAMODB_FAMILY_INDEX,
+                    'KeyConditionExpression': Key('familia_id').eq(familia_id) & Key('timestamp').between(inicio_data, fim_data)
+                }
+                response = self.table.query(ScanIndexForward=False, Limit=limite, **query_kwargs)
+                return list(reversed(response.get('Items', [])))
+            
+            recentes = []
+            for mes in reversed(DateHelper.get_month_keys(inicio_data, fim_data)):
+                response = self.table.query(
+                    IndexName=DYNAMODB_PERIOD_INDEX,
+                    KeyConditionExpression=Key('mes_referencia').eq(mes) & Key('timestamp').between(inicio_data, fim_data),
+                    ScanIndexForward=False,
+                    Limit=limite - len(recentes)
+                )
+                recentes.extend(response.get('Items', []))
+                if len(recentes) >= limite:
+                    break
+            return list(reversed(recentes))
         except Exception as error:
-            logger.error(f'Error searching expenses: {str(error)}')
-            return []
\ No newline at end of file
+            logger.error(f'Error searching recent expenses: {str(error)}')
+            return []
+    
+    def iter_all_expenses(self):
+        """Yield every stored expense (maintenance jobs only)"""
+        scan_kwargs = {}
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            yield from response.get('Items', [])
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    def backfill_period_keys(self):
+        """Add mes_referencia to legacy items so they show up in the period index"""
+        atualizados = 0
+        scan_kwargs = {
+            'FilterExpression': Attr('mes_referencia').not_exists(),
+            'ProjectionExpression': '#user_id, #timestamp',
+            'ExpressionAttributeNames': {'#user_id': 'user_id', '#timestamp': 'timestamp'}
+        }
+        
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            for item in response.get('Items', []):
+                self.table.update_item(
+                    Key={'user_id': item['user_id'], 'timestamp': item['timestamp']},
+                    UpdateExpression='SET mes_referencia = :mes',
+                    ExpressionAttributeValues={':mes': DateHelper.get_month_key(item['timestamp'])}
+                )
+                atualizados += 1
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        
+        logger.info(f'Period keys backfilled: {atualizados} items')
+        return atualizados
+    
+    def backfill_family_ids(self, family_repository):
+        """Move every registered number's expenses to its family and tag legacy items without one.
+        
+        Items carry no index on whatsapp_from, so their user partitions are found with one
+        scan reading only the attributes needed here; each move is a conditional update
+        that only touches an item whose familia_id is missing or differs.
+        """
+        membros = dict(family_repository.iter_members())
+        atualizados = 0
+        scan_kwargs = {
+            'ProjectionExpression': '#user_id, #timestamp, whatsapp_from, familia_id',
+            'ExpressionAttributeNames': {'#user_id': 'user_id', '#timestamp': 'timestamp'}
+        }
+        
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            for item in response.get('Items', []):
+                familia_id = membros.get(item.get('whatsapp_from'))
+                if familia_id is None:
+                    # Unregistered number: only legacy items need a family
+                    if 'familia_id' in item:
+                        continue
+                    familia_id = DEFAULT_FAMILY_ID
+                if item.get('familia_id') == familia_id:
+                    continue
+                
+                try:
+                    self.table.update_item(
+                        Key={'user_id': item['user_id'], 'timestamp': item['timestamp']},
+                        UpdateExpression='SET familia_id = :familia',
+                        ConditionExpression='attribute_not_exists(familia_id) OR familia_id <> :familia',
+                        ExpressionAttributeValues={':familia': familia_id}
+                    )
+                    atualizados += 1
+                except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+                    pass
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        
+        logger.info(f'Family ids backfilled: {atualizados} items')
+        return atualizados
+    
+    def iter_active_members(self, inicio_data, fim_data):
+        """Distinct (user_id, familia_id) pairs, reading only those two attributes of the period index"""
+        vistos = set()
+        for mes in DateHelper.get_month_keys(inicio_data, fim_data):
+            for item in self._paginate(
+                IndexName=DYNAMODB_PERIOD_INDEX,
+                KeyConditionExpression=Key('mes_referencia').eq(mes) & Key('timestamp').between(inicio_data, fim_data),
+                ProjectionExpression='user_id, familia_id'
+            ):
+                membro = (item['user_id'], item.get('familia_id', DEFAULT_FAMILY_ID))
+                if membro not in vistos:
+                    vistos.add(membro)
+                    yield membro
+    
+    def _prepare(self, dados):
+        """Item as stored: the expense plus the keys of the period and family indexes"""
+        item = dict(dados)
+        item.setdefault('mes_referencia', DateHelper.get_month_key(item['timestamp']))
+        item.setdefault('familia_id', DEFAULT_FAMILY_ID)
+        return item
+    
+    def _existing_keys(self, chaves):
+        """Which (user_id, timestamp) keys are already stored, 100 keys per BatchGetItem"""
+        existentes = set()
+        for inicio in range(0, len(chaves), LOTE_LEITURA):
+            lote = chaves[inicio:inicio + LOTE_LEITURA]
+            pedido = {self.table.name: {
+                'Keys': [{'user_id': usuario, 'timestamp': timestamp} for usuario, timestamp in lote],
+                'ProjectionExpression': '#user_id, #timestamp',
+                'ExpressionAttributeNames': {'#user_id': 'user_id', '#timestamp': 'timestamp'}
+            }}
+            for respostas in self._batch_call('batch_get_item', 'UnprocessedKeys', pedido):
+                existentes.update((item['user_id'], item['timestamp']) for item in respostas.get(self.table.name, []))
+        return existentes
+    
+    def _batch_call(self, operacao, campo_pendentes, pedido):
+        """Run a batch call until DynamoDB processed every request; returns each call's Responses"""
+        respostas = []
+        for tentativa in range(DYNAMODB_BATCH_MAX_ATTEMPTS):
+            if tentativa:
+                time.sleep(random.uniform(0, DYNAMODB_BATCH_BACKOFF_BASE * 2 ** tentativa))
+            
+            response = getattr(self.table.meta.client, operacao)(RequestItems=pedido)
+            respostas.append(response.get('Responses', {}))
+            pedido = response.get(campo_pendentes)
+            if not pedido:
+                return respostas
+            logger.warning(f'{operacao}: requests unprocessed (attempt {tentativa + 1}), retrying')
+        
+        raise RuntimeError(f'{operacao} left requests unprocessed after {DYNAMODB_BATCH_MAX_ATTEMPTS} attempts')
+    
+    def _paginate(self, **query_kwargs):
+        """Run a query and yield items from every page"""
+        while True:
+            response = self.table.query(**query_kwargs)
+            yield from response.get('Items', [])
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def create_expense_repository():
+    """Build the expense store selected by STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'sqlite':
+        from repositories.sqlite_expense_repository import SqliteExpenseRepository
+        return SqliteExpenseRepository()
+    return DynamoDBExpenseRepository()
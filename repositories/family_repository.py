@@ -0,0 +1,88 @@
+import logging
+from datetime import datetime
+from config.settings import DYNAMODB_FAMILY_TABLE_NAME, DEFAULT_FAMILY_ID, FAMILY_CACHE_TTL, STORAGE_BACKEND
+from utils.dynamodb_helper import DynamoDBHelper
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger()
+
+# Module scope: number -> family lookups survive across warm invocations
+_familias = LRUCache('familia', 1024, FAMILY_CACHE_TTL)
+
+class FamilyRepository:
+    """Maps WhatsApp numbers (whatsapp_from) to a family id; the backend follows STORAGE_BACKEND"""
+    
+    def get_family_id(self, whatsapp_from):
+        """Family of a number, DEFAULT_FAMILY_ID when it is not registered in any"""
+        if not whatsapp_from:
+            return DEFAULT_FAMILY_ID
+        
+        familia_id = _familias.get(whatsapp_from)
+        if familia_id is None:
+            familia_id = self._lookup(whatsapp_from) or DEFAULT_FAMILY_ID
+            _familias.set(whatsapp_from, familia_id)
+        return familia_id
+    
+    def add_member(self, whatsapp_from, familia_id):
+        """Register a number in a family (moving it if it was in another one)"""
+        self._put(whatsapp_from, familia_id)
+        _familias.set(whatsapp_from, familia_id)
+        logger.info(f'Family member saved: {whatsapp_from} -> {familia_id}')
+    
+    def remove_member(self, whatsapp_from):
+        """Unregister a number (its new expenses go to DEFAULT_FAMILY_ID)"""
+        self._delete(whatsapp_from)
+        _familias.delete(whatsapp_from)
+    
+    def iter_members(self):
+        """Yield (whatsapp_from, familia_id) for every registered number"""
+        raise NotImplementedError
+    
+    def _lookup(self, whatsapp_from):
+        raise NotImplementedError
+    
+    def _put(self, whatsapp_from, familia_id):
+        raise NotImplementedError
+    
+    def _delete(self, whatsapp_from):
+        raise NotImplementedError
+
+
+class DynamoDBFamilyRepository(FamilyRepository):
+    """Family members in DynamoDB (Partition Key 'whatsapp_from')"""
+    
+    def __init__(self):
+        self.table = DynamoDBHelper.get_table(DYNAMODB_FAMILY_TABLE_NAME)
+    
+    def iter_members(self):
+        scan_kwargs = {}
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            for item in response.get('Items', []):
+                yield item['whatsapp_from'], item['familia_id']
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    def _lookup(self, whatsapp_from):
+        item = self.table.get_item(Key={'whatsapp_from': whatsapp_from}).get('Item')
+        return item['familia_id'] if item else None
+    
+    def _put(self, whatsapp_from, familia_id):
+        self.table.put_item(Item={
+            'whatsapp_from': whatsapp_from,
+            'familia_id': familia_id,
+            'atualizado_em': datetime.now().isoformat()
+        })
+    
+    def _delete(self, whatsapp_from):
+        self.table.delete_item(Key={'whatsapp_from': whatsapp_from})
+
+
+def create_family_repository():
+    """Build the family store matching STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'sqlite':
+        from repositories.sqlite_family_repository import SqliteFamilyRepository
+        return SqliteFamilyRepository()
+    return DynamoDBFamilyRepository()
@@ -0,0 +1,80 @@
+import logging
+import time
+from datetime import datetime
+from config.settings import DYNAMODB_CACHE_TABLE_NAME, IDEMPOTENCY_TTL, IDEMPOTENCY_STALE_SECONDS
+from utils.dynamodb_helper import DynamoDBHelper
+
+logger = logging.getLogger()
+
+class IdempotencyRepository:
+    """Repository that records processed Twilio MessageSids with conditional writes"""
+    
+    def __init__(self):
+        self.table = DynamoDBHelper.get_table(DYNAMODB_CACHE_TABLE_NAME)
+    
+    def start(self, message_sid):
+        """Claim a message for processing.
+        
+        Returns (is_new, registro). registro['recebido_em'] is the time of the
+        first attempt, kept when a released or abandoned claim is taken over, so
+        retries rebuild the same expense keys.
+        """
+        agora = time.time()
+        try:
+            response = self.table.update_item(
+                Key={'chave': self._key(message_sid)},
+                UpdateExpression=(
+                    'SET #status = :processando, recebido_em = if_not_exists(recebido_em, :recebido_em), '
+                    'iniciado_em = :iniciado_em, expira_em = :expira_em'
+                ),
+                ConditionExpression=(
+                    'attribute_not_exists(chave) OR #status = :liberado '
+                    'OR (#status = :processando AND iniciado_em < :abandonado)'
+                ),
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':processando': 'processando',
+                    ':liberado': 'liberado',
+                    ':recebido_em': datetime.now().isoformat(),
+                    ':iniciado_em': int(agora),
+                    ':expira_em': int(agora + IDEMPOTENCY_TTL),
+                    ':abandonado': int(agora - IDEMPOTENCY_STALE_SECONDS)
+                },
+                ReturnValues='ALL_NEW'
+            )
+            return True, response['Attributes']
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            existente = self.table.get_item(Key={'chave': self._key(message_sid)}, ConsistentRead=True).get('Item') or {}
+            logger.info(f"Duplicate webhook for {message_sid}: {existente.get('status')}")
+            return False, existente
+    
+    def complete(self, message_sid, resposta):
+        """Store the reply so retries can replay it"""
+        try:
+            self.table.update_item(
+                Key={'chave': self._key(message_sid)},
+                UpdateExpression='SET #status = :concluido, resposta = :resposta',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':concluido': 'concluido', ':resposta': resposta}
+            )
+        except Exception as error:
+            logger.error(f'Error completing idempotency record: {str(error)}')
+    
+    def release(self, message_sid):
+        """Mark a failed attempt retryable, keeping its recebido_em: a Twilio retry runs the pipeline
+        again with the same expense keys, so expenses the failed attempt already saved are not duplicated"""
+        try:
+            self.table.update_item(
+                Key={'chave': self._key(message_sid)},
+                UpdateExpression='SET #status = :liberado',
+                ConditionExpression='#status = :processando',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':liberado': 'liberado', ':processando': 'processando'}
+            )
+        except Exception as error:
+            logger.error(f'Error releasing idempotency record: {str(error)}')
+    
+    @staticmethod
+    def _key(message_sid):
+        """Cache-table key of a message"""
+        return f"mensagem#{message_sid}"
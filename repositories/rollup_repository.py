@@ -0,0 +1,227 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Key
+from config.settings import DYNAMODB_ROLLUP_TABLE_NAME, ROLLUP_VERSION_CACHE_TTL
+from utils.date_helper import DateHelper
+from utils.dynamodb_helper import DynamoDBHelper
+from utils.lru_cache import LRUCache
+from utils.money_helper import MoneyHelper
+
+logger = logging.getLogger()
+
+# Module scope: the rollup versions a warm container reads from and writes to
+_versoes = LRUCache('rollup_versao', 1, ROLLUP_VERSION_CACHE_TTL)
+
+# Item holding the active version ('ativa') and the one a rebuild is filling ('proxima')
+CHAVE_VERSAO = {'escopo': '#meta', 'chave': 'versao'}
+
+# Extra seconds a rebuild waits, on top of ROLLUP_VERSION_CACHE_TTL, for requests already in flight
+MARGEM_TROCA = 30
+
+class RollupRepository:
+    """Repository for pre-aggregated expense totals (cents) per scope, day/month and category/user.
+    
+    Rows carry their version in the sort key ('v3#M#2025-08#C#alimentacao'). Reports
+    read the active version, or raw expenses while no rebuild has made one active;
+    each expense is added to the version(s) being written in the same transaction
+    that saves it (see write_actions).
+    """
+    
+    def __init__(self):
+        self.table = DynamoDBHelper.get_table(DYNAMODB_ROLLUP_TABLE_NAME)
+    
+    @staticmethod
+    def user_scope(usuario):
+        """Partition key for an individual's rollups"""
+        return f"user#{usuario}"
+    
+    @staticmethod
+    def family_scope(familia_id):
+        """Partition key for a family's rollups"""
+        return f"familia#{familia_id}"
+    
+    def versions(self):
+        """{'ativa': n or None, 'proxima': n or None}, reused for ROLLUP_VERSION_CACHE_TTL"""
+        versoes = _versoes.get('versao')
+        if versoes is None:
+            item = self.table.get_item(Key=CHAVE_VERSAO, ConsistentRead=True).get('Item', {})
+            versoes = {nome: int(item[nome]) if nome in item else None for nome in ('ativa', 'proxima')}
+            _versoes.set('versao', versoes)
+        return versoes
+    
+    def write_actions(self, despesas):
+        """(carimbo, TransactWriteItems updates) adding saved expenses to every version being written.
+        
+        `carimbo` is the newest of those versions, stored on each expense so a rebuild
+        does not count it again; it is None (and there is nothing to write) until the
+        first rebuild has run. Rows shared by several expenses get a single update.
+        """
+        versoes = self.versions()
+        escritas = [versao for versao in (versoes['ativa'], versoes['proxima']) if versao is not None]
+        if not escritas:
+            return None, []
+        
+        contadores = {}
+        for despesa in despesas:
+            centavos = MoneyHelper.item_cents(despesa)
+            for escopo, chave in self._rollup_keys(despesa, despesa['familia_id']):
+                for versao in escritas:
+                    linha = (escopo, self._versioned(versao, chave))
+                    total, quantidade = contadores.get(linha, (0, 0))
+                    contadores[linha] = (total + centavos, quantidade + 1)
+        
+        return max(escritas), [
+            {'Update': {'TableName': self.table.name, **self._add_request(escopo, chave, total, quantidade)}}
+            for (escopo, chave), (total, quantidade) in contadores.items()
+        ]
+    
+    def get_summary(self, escopo, inicio_data, fim_data):
+        """Read totals for a period from rollup rows instead of raw expenses; None before the first rebuild"""
+        versao = self.versions()['ativa']
+        if versao is None:
+            return None
+        
+        resumo = {'total_centavos': 0, 'count': 0, 'por_categoria': {}, 'por_usuario': {}, 'recentes': []}
+        for item in self._query_rows(escopo, versao, inicio_data, fim_data):
+            _, _, _, tipo, nome = item['chave'].split('#', 4)
+            total = int(item.get('total_centavos', 0))
+            quantidade = int(item.get('quantidade', 0))
+            
+            if tipo == 'C':
+                categoria = resumo['por_categoria'].setdefault(nome, {'total_centavos': 0, 'count': 0})
+                categoria['total_centavos'] += total
+                categoria['count'] += quantidade
+                resumo['total_centavos'] += total
+                resumo['count'] += quantidade
+            elif tipo == 'U':
+                resumo['por_usuario'][nome] = resumo['por_usuario'].get(nome, 0) + total
+        
+        return resumo
+    
+    def rebuild(self, despesas, familia_padrao, espera=ROLLUP_VERSION_CACHE_TTL + MARGEM_TROCA):
+        """Recompute every rollup row from a lazy stream of raw expenses into a new version, then switch to it.
+        
+        Saves keep landing while the job runs. The new version is announced first and,
+        `espera` seconds later, every container adds new expenses to it too and stamps
+        them, so the stream (read only then) skips stamped expenses instead of counting
+        them twice. Untagged expenses go to familia_padrao. The previous version is
+        deleted once no container reads it any more.
+        """
+        atual = self.table.get_item(Key=CHAVE_VERSAO, ConsistentRead=True).get('Item', {})
+        versao = max(int(atual.get('ativa', 0)), int(atual.get('proxima', 0))) + 1
+        self.table.update_item(
+            Key=CHAVE_VERSAO, UpdateExpression='SET proxima = :versao', ExpressionAttributeValues={':versao': versao}
+        )
+        _versoes.clear()
+        time.sleep(espera)
+        
+        contadores = {}
+        for despesa in despesas:
+            if int(despesa.get('rollup_versao', 0)) >= versao:
+                continue
+            centavos = MoneyHelper.item_cents(despesa)
+            for escopo, chave in self._rollup_keys(despesa, despesa.get('familia_id') or familia_padrao):
+                linha = (escopo, self._versioned(versao, chave))
+                total, quantidade = contadores.get(linha, (0, 0))
+                contadores[linha] = (total + centavos, quantidade + 1)
+        
+        # ADD, not put: live saves may already have created some of these rows
+        for (escopo, chave), (total, quantidade) in contadores.items():
+            self.table.update_item(**self._add_request(escopo, chave, total, quantidade))
+        
+        # A newer rebuild that started meanwhile wins
+        self.table.update_item(
+            Key=CHAVE_VERSAO,
+            UpdateExpression='SET ativa = :versao REMOVE proxima',
+            ConditionExpression='proxima = :versao',
+            ExpressionAttributeValues={':versao': versao}
+        )
+        _versoes.clear()
+        logger.info(f'Rollups rebuilt: version {versao}, {len(contadores)} rows')
+        
+        time.sleep(espera)
+        self._delete_other_versions(versao)
+        return len(contadores)
+    
+    def _add_request(self, escopo, chave, total, quantidade):
+        """update_item arguments adding to one rollup row"""
+        return {
+            'Key': {'escopo': escopo, 'chave': chave},
+            'UpdateExpression': 'ADD #total :valor, #quantidade :quantidade',
+            'ExpressionAttributeNames': {'#total': 'total_centavos', '#quantidade': 'quantidade'},
+            'ExpressionAttributeValues': {':valor': total, ':quantidade': quantidade}
+        }
+    
+    @staticmethod
+    def _versioned(versao, chave):
+        """Sort key of a row in a given version"""
+        return f"v{versao}#{chave}"
+    
+    def _rollup_keys(self, dados, familia_id):
+        """Rollup rows touched by one expense (unversioned sort keys)"""
+        dia = dados['timestamp'][:10]
+        mes = DateHelper.get_month_key(dados['timestamp'])
+        categoria = dados.get('categoria', 'outros')
+        usuario = dados.get('user_id', 'desconhecido')
+        escopo_usuario = self.user_scope(usuario)
+        escopo_familia = self.family_scope(familia_id)
+        
+        return [
+            (escopo_usuario, f"M#{mes}#C#{categoria}"),
+            (escopo_usuario, f"D#{dia}#C#{categoria}"),
+            (escopo_familia, f"M#{mes}#C#{categoria}"),
+            (escopo_familia, f"M#{mes}#U#{usuario}"),
+            (escopo_familia, f"D#{dia}#C#{categoria}"),
+            (escopo_familia, f"D#{dia}#U#{usuario}"),
+        ]
+    
+    def _query_rows(self, escopo, versao, inicio_data, fim_data):
+        """Yield a version's rollup rows covering a period, using month rows for whole-month periods"""
+        if self._covers_whole_months(inicio_data, fim_data):
+            for mes in DateHelper.get_month_keys(inicio_data, fim_data):
+                yield from self._paginate(
+                    KeyConditionExpression=Key('escopo').eq(escopo) & Key('chave').begins_with(
+                        self._versioned(versao, f"M#{mes}#")
+                    )
+                )
+        else:
+            yield from self._paginate(
+                KeyConditionExpression=Key('escopo').eq(escopo) & Key('chave').between(
+                    self._versioned(versao, f"D#{inicio_data[:10]}#"), self._versioned(versao, f"D#{fim_data[:10]}#~")
+                )
+            )
+    
+    def _covers_whole_months(self, inicio_data, fim_data):
+        """Whether a period starts on a month boundary and runs to its end (or to today)"""
+        if inicio_data[8:19] != '01T00:00:00':
+            return False
+        if DateHelper.get_month_key(fim_data) >= datetime.now().strftime('%Y-%m'):
+            return True
+        fim = datetime.fromisoformat(fim_data)
+        return (fim + timedelta(seconds=1)).day == 1
+    
+    def _paginate(self, **query_kwargs):
+        """Run a query and yield items from every page"""
+        while True:
+            response = self.table.query(**query_kwargs)
+            yield from response.get('Items', [])
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    def _delete_other_versions(self, versao):
+        """Delete the rows of every version but the active one after a rebuild"""
+        prefixo = self._versioned(versao, '')
+        scan_kwargs = {'ProjectionExpression': 'escopo, chave'}
+        with self.table.batch_writer() as batch:
+            while True:
+                response = self.table.scan(**scan_kwargs)
+                for item in response.get('Items', []):
+                    if item['escopo'] != CHAVE_VERSAO['escopo'] and not item['chave'].startswith(prefixo):
+                        batch.delete_item(Key={'escopo': item['escopo'], 'chave': item['chave']})
+                
+                if 'LastEvaluatedKey' not in response:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
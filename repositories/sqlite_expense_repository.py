@@ -0,0 +1,189 @@
+import logging
+from config.settings import SQLITE_PATH, SQLITE_BATCH_SIZE, DEFAULT_FAMILY_ID
+from repositories.expense_repository import ExpenseRepository
+from utils.date_helper import DateHelper
+from utils.money_helper import MoneyHelper
+from utils.sqlite_helper import SqliteHelper
+
+logger = logging.getLogger()
+
+COLUNAS = ('user_id', 'timestamp', 'familia_id', 'mes_referencia', 'valor_centavos', 'categoria',
+           'descricao', 'whatsapp_from', 'data_criacao')
+
+TABELA_SQL = """
+CREATE TABLE IF NOT EXISTS despesas (
+    user_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    familia_id TEXT NOT NULL,
+    mes_referencia TEXT NOT NULL,
+    valor_centavos INTEGER NOT NULL,
+    categoria TEXT NOT NULL,
+    descricao TEXT,
+    whatsapp_from TEXT,
+    data_criacao TEXT,
+    PRIMARY KEY (user_id, timestamp)
+) WITHOUT ROWID
+"""
+
+# Family reports: covers every column the GROUP BY reads, so the table is never touched
+INDICE_SQL = """
+CREATE INDEX IF NOT EXISTS despesas_familia_timestamp
+    ON despesas (familia_id, timestamp, categoria, user_id, valor_centavos)
+"""
+
+# Reports across every family (no user or family given), like the DynamoDB period index
+PERIODO_INDICE_SQL = """
+CREATE INDEX IF NOT EXISTS despesas_timestamp
+    ON despesas (timestamp, categoria, user_id, valor_centavos)
+"""
+
+INSERT_SQL = f"INSERT OR IGNORE INTO despesas ({', '.join(COLUNAS)}) VALUES ({', '.join('?' * len(COLUNAS))})"
+SELECT_SQL = f"SELECT {', '.join(COLUNAS)} FROM despesas"
+
+class SqliteExpenseRepository(ExpenseRepository):
+    """Embedded SQLite store: (user_id, timestamp) primary key, (familia_id, timestamp) and timestamp indexes"""
+    
+    native_aggregation = True
+    
+    def __init__(self, caminho=SQLITE_PATH, tamanho_lote=SQLITE_BATCH_SIZE):
+        self.caminho = caminho
+        self.tamanho_lote = tamanho_lote
+        self.conexao.execute(TABELA_SQL)
+        self.conexao.execute(INDICE_SQL)
+        self.conexao.execute(PERIODO_INDICE_SQL)
+    
+    @property
+    def conexao(self):
+        """The calling thread's connection (reads may run on worker threads)"""
+        return SqliteHelper.get_connection(self.caminho)
+    
+    def save_expense(self, dados):
+        """Save expense; returns None if this exact expense was already saved (retry)"""
+        salvas = self.save_expenses([dados])
+        return salvas[0] if salvas else None
+    
+    def save_expenses(self, itens, rollup_repository=None):
+        """Insert expenses in batches of tamanho_lote rows per transaction; returns the new ones"""
+        salvas = []
+        itens = list(itens)
+        
+        for inicio in range(0, len(itens), self.tamanho_lote):
+            lote = itens[inicio:inicio + self.tamanho_lote]
+            try:
+                self.conexao.execute('BEGIN IMMEDIATE')
+                for dados in lote:
+                    cursor = self.conexao.execute(INSERT_SQL, self._row(dados))
+                    if cursor.rowcount:
+                        salvas.append(dados)
+                    else:
+                        logger.info(f"Expense already saved, skipping retry: {dados['user_id']} {dados['timestamp']}")
+                self.conexao.execute('COMMIT')
+            except Exception as error:
+                # BEGIN itself may have failed (database locked): nothing to roll back then
+                if self.conexao.in_transaction:
+                    self.conexao.execute('ROLLBACK')
+                logger.error(f'Error saving expenses: {str(error)}')
+                raise
+        
+        return salvas
+    
+    def iter_expenses(self, inicio_data, fim_data, usuario=None, familia_id=None):
+        """Lazily yield expenses in a period, in timestamp order"""
+        filtro, parametros = self._period_filter(inicio_data, fim_data, usuario, familia_id)
+        cursor = self.conexao.execute(
+            f"{SELECT_SQL} WHERE {filtro} ORDER BY timestamp", parametros
+        )
+        while True:
+            linhas = cursor.fetchmany(self.tamanho_lote)
+            if not linhas:
+                break
+            for linha in linhas:
+                yield self._item(linha)
+    
+    def get_recent_expenses(self, inicio_data, fim_data, usuario=None, limite=10, familia_id=None):
+        """Return the latest expenses of a period in chronological order"""
+        try:
+            filtro, parametros = self._period_filter(inicio_data, fim_data, usuario, familia_id)
+            linhas = self.conexao.execute(
+                f"{SELECT_SQL} WHERE {filtro} ORDER BY timestamp DESC LIMIT ?",
+                (*parametros, limite)
+            ).fetchall()
+            return [self._item(linha) for linha in reversed(linhas)]
+        except Exception as error:
+            logger.error(f'Error searching recent expenses: {str(error)}')
+            return []
+    
+    def iter_all_expenses(self):
+        """Yield every stored expense (maintenance jobs only)"""
+        cursor = self.conexao.execute(SELECT_SQL)
+        for linha in cursor:
+            yield self._item(linha)
+    
+    def backfill_family_ids(self, family_repository):
+        """Move every registered number's expenses to its family"""
+        atualizados = 0
+        for whatsapp_from, familia_id in list(family_repository.iter_members()):
+            cursor = self.conexao.execute(
+                'UPDATE despesas SET familia_id = ? WHERE whatsapp_from = ? AND familia_id != ?',
+                (familia_id, whatsapp_from, familia_id)
+            )
+            atualizados += cursor.rowcount
+        
+        logger.info(f'Family ids backfilled: {atualizados} items')
+        return atualizados
+    
+    def iter_active_members(self, inicio_data, fim_data):
+        """Distinct (user_id, familia_id) pairs with expenses in a period"""
+        yield from self.conexao.execute(
+            'SELECT DISTINCT user_id, familia_id FROM despesas WHERE timestamp BETWEEN ? AND ?',
+            (inicio_data, fim_data)
+        )
+    
+    def summarize(self, inicio_data, fim_data, usuario=None, ultimos=10, familia_id=None):
+        """Totals per category (and per user for the family) with SQL GROUP BY"""
+        filtro, parametros = self._period_filter(inicio_data, fim_data, usuario, familia_id)
+        resumo = {'total_centavos': 0, 'count': 0, 'por_categoria': {}, 'por_usuario': {}, 'recentes': []}
+        
+        # One pass over the index (integer SUM); the few (category, user) groups are folded here
+        for categoria, user, total, quantidade in self.conexao.execute(
+            f"SELECT categoria, user_id, SUM(valor_centavos), COUNT(*) FROM despesas WHERE {filtro} "
+            "GROUP BY categoria, user_id",
+            parametros
+        ):
+            dados = resumo['por_categoria'].setdefault(categoria, {'total_centavos': 0, 'count': 0})
+            dados['total_centavos'] += total
+            dados['count'] += quantidade
+            resumo['total_centavos'] += total
+            resumo['count'] += quantidade
+            if usuario is None:
+                resumo['por_usuario'][user] = resumo['por_usuario'].get(user, 0) + total
+        
+        if resumo['count']:
+            resumo['recentes'] = self.get_recent_expenses(inicio_data, fim_data, usuario, ultimos, familia_id)
+        return resumo
+    
+    def _period_filter(self, inicio_data, fim_data, usuario, familia_id):
+        """WHERE clause on one of the indexes: the user's partition, the family's, or every family's"""
+        if usuario:
+            return 'user_id = ? AND timestamp BETWEEN ? AND ?', (usuario, inicio_data, fim_data)
+        if familia_id:
+            return 'familia_id = ? AND timestamp BETWEEN ? AND ?', (familia_id, inicio_data, fim_data)
+        return 'timestamp BETWEEN ? AND ?', (inicio_data, fim_data)
+    
+    def _row(self, dados):
+        """Column values of an expense dict"""
+        return (
+            dados['user_id'],
+            dados['timestamp'],
+            dados.get('familia_id', DEFAULT_FAMILY_ID),
+            dados.get('mes_referencia') or DateHelper.get_month_key(dados['timestamp']),
+            MoneyHelper.item_cents(dados),
+            dados.get('categoria', 'outros'),
+            dados.get('descricao'),
+            dados.get('whatsapp_from'),
+            dados.get('data_criacao')
+        )
+    
+    def _item(self, linha):
+        """Expense dict shaped like a DynamoDB item"""
+        return {coluna: valor for coluna, valor in zip(COLUNAS, linha) if valor is not None}
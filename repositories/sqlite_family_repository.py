@@ -0,0 +1,40 @@
+from config.settings import SQLITE_PATH
+from repositories.family_repository import FamilyRepository
+from utils.sqlite_helper import SqliteHelper
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS membros_familia (
+    whatsapp_from TEXT PRIMARY KEY,
+    familia_id TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+class SqliteFamilyRepository(FamilyRepository):
+    """Family members in the same SQLite database as the expenses"""
+    
+    def __init__(self, caminho=SQLITE_PATH):
+        self.caminho = caminho
+        self.conexao.executescript(SCHEMA)
+    
+    @property
+    def conexao(self):
+        """The calling thread's connection (lookups may run on worker threads)"""
+        return SqliteHelper.get_connection(self.caminho)
+    
+    def iter_members(self):
+        yield from self.conexao.execute('SELECT whatsapp_from, familia_id FROM membros_familia')
+    
+    def _lookup(self, whatsapp_from):
+        linha = self.conexao.execute(
+            'SELECT familia_id FROM membros_familia WHERE whatsapp_from = ?', (whatsapp_from,)
+        ).fetchone()
+        return linha[0] if linha else None
+    
+    def _put(self, whatsapp_from, familia_id):
+        self.conexao.execute(
+            'INSERT OR REPLACE INTO membros_familia (whatsapp_from, familia_id) VALUES (?, ?)',
+            (whatsapp_from, familia_id)
+        )
+    
+    def _delete(self, whatsapp_from):
+        self.conexao.execute('DELETE FROM membros_familia WHERE whatsapp_from = ?', (whatsapp_from,))
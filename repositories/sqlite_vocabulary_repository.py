@@ -0,0 +1,60 @@
+from config.settings import SQLITE_PATH
+from repositories.vocabulary_repository import VocabularyRepository
+from utils.sqlite_helper import SqliteHelper
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vocabulario (
+    escopo TEXT NOT NULL,
+    termo TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    contagem INTEGER NOT NULL,
+    PRIMARY KEY (escopo, termo, categoria)
+) WITHOUT ROWID;
+"""
+
+UPSERT_SQL = """
+INSERT INTO vocabulario (escopo, termo, categoria, contagem) VALUES (?, ?, ?, ?)
+ON CONFLICT (escopo, termo, categoria) DO UPDATE SET contagem = contagem + excluded.contagem
+"""
+
+class SqliteVocabularyRepository(VocabularyRepository):
+    """Vocabulary counters in the same SQLite database as the expenses"""
+    
+    def __init__(self, caminho=SQLITE_PATH):
+        self.caminho = caminho
+        self.conexao.executescript(SCHEMA)
+    
+    @property
+    def conexao(self):
+        """The calling thread's connection (lookups may run on worker threads)"""
+        return SqliteHelper.get_connection(self.caminho)
+    
+    def get_counts(self, escopo, termos):
+        termos = list(dict.fromkeys(termos))
+        contagens = {}
+        for termo, categoria, quantidade in self.conexao.execute(
+            f"SELECT termo, categoria, contagem FROM vocabulario WHERE escopo = ? AND termo IN ({', '.join('?' * len(termos))})",
+            (escopo, *termos)
+        ):
+            contagens.setdefault(termo, {})[categoria] = quantidade
+        return contagens
+    
+    def add_counts(self, escopo, contagens):
+        self._write(escopo, contagens, apagar=False)
+    
+    def replace(self, escopo, contagens):
+        self._write(escopo, contagens, apagar=True)
+    
+    def _write(self, escopo, contagens, apagar):
+        """Write one scope's counters in a single transaction"""
+        self.conexao.execute('BEGIN IMMEDIATE')
+        try:
+            if apagar:
+                self.conexao.execute('DELETE FROM vocabulario WHERE escopo = ?', (escopo,))
+            self.conexao.executemany(
+                UPSERT_SQL, [(escopo, termo, categoria, quantidade) for (termo, categoria), quantidade in contagens.items()]
+            )
+            self.conexao.execute('COMMIT')
+        except Exception:
+            self.conexao.execute('ROLLBACK')
+            raise
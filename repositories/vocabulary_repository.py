@@ -0,0 +1,141 @@
+import logging
+import random
+import time
+from boto3.dynamodb.conditions import Key
+from config.settings import (
+    DYNAMODB_VOCABULARY_TABLE_NAME, STORAGE_BACKEND, DYNAMODB_BATCH_MAX_ATTEMPTS, DYNAMODB_BATCH_BACKOFF_BASE
+)
+from utils.concurrency_helper import ConcurrencyHelper
+from utils.dynamodb_helper import DynamoDBHelper
+
+logger = logging.getLogger()
+
+# Counter attributes are 'c#<categoria>', so a category can never clash with the key attributes
+PREFIXO_CATEGORIA = 'c#'
+
+# DynamoDB API limit per BatchGetItem call
+LOTE_LEITURA = 100
+
+class VocabularyRepository:
+    """Term -> category counters per scope (user or family); the backend follows STORAGE_BACKEND"""
+    
+    def get_counts(self, escopo, termos):
+        """{termo: {categoria: contagem}} of the given terms of a scope (unknown terms are left out)"""
+        raise NotImplementedError
+    
+    def add_counts(self, escopo, contagens):
+        """Atomically add {(termo, categoria): n} to a scope's counters"""
+        raise NotImplementedError
+    
+    def replace(self, escopo, contagens):
+        """Overwrite a scope's counters with {(termo, categoria): n} (rebuild job)"""
+        raise NotImplementedError
+    
+    @staticmethod
+    def _by_term(contagens):
+        """{termo: {categoria: n}} from {(termo, categoria): n}"""
+        por_termo = {}
+        for (termo, categoria), quantidade in contagens.items():
+            por_termo.setdefault(termo, {})[categoria] = quantidade
+        return por_termo
+
+
+class DynamoDBVocabularyRepository(VocabularyRepository):
+    """One small item per term (Partition Key 'escopo', Sort Key 'termo'), one 'c#<categoria>' counter each.
+    
+    Items stay a few hundred bytes however large a family's vocabulary grows, and a
+    classification reads only the terms of the description being classified.
+    """
+    
+    def __init__(self):
+        self.table = DynamoDBHelper.get_table(DYNAMODB_VOCABULARY_TABLE_NAME)
+    
+    def get_counts(self, escopo, termos):
+        termos = list(dict.fromkeys(termos))
+        contagens = {}
+        for inicio in range(0, len(termos), LOTE_LEITURA):
+            pedido = {self.table.name: {
+                'Keys': [{'escopo': escopo, 'termo': termo} for termo in termos[inicio:inicio + LOTE_LEITURA]]
+            }}
+            for item in self._batch_get(pedido):
+                contagens[item['termo']] = self._categories(item)
+        return contagens
+    
+    def add_counts(self, escopo, contagens):
+        # One ADD per term; the terms of one expense are written at once
+        ConcurrencyHelper.run_parallel({
+            termo: (lambda termo=termo, categorias=categorias: self._add(escopo, termo, categorias))
+            for termo, categorias in self._by_term(contagens).items()
+        })
+    
+    def replace(self, escopo, contagens):
+        with self.table.batch_writer() as batch:
+            for item in self._paginate(
+                KeyConditionExpression=Key('escopo').eq(escopo), ProjectionExpression='escopo, termo'
+            ):
+                batch.delete_item(Key={'escopo': escopo, 'termo': item['termo']})
+        
+        # Separate pass: one batch may not delete and put the same key
+        with self.table.batch_writer() as batch:
+            for termo, categorias in self._by_term(contagens).items():
+                batch.put_item(Item={
+                    'escopo': escopo, 'termo': termo,
+                    **{f'{PREFIXO_CATEGORIA}{categoria}': quantidade for categoria, quantidade in categorias.items()}
+                })
+    
+    def _add(self, escopo, termo, categorias):
+        """Add one term's category counters"""
+        nomes = {}
+        valores = {}
+        partes = []
+        for indice, (categoria, quantidade) in enumerate(categorias.items()):
+            nomes[f'#c{indice}'] = f'{PREFIXO_CATEGORIA}{categoria}'
+            valores[f':n{indice}'] = quantidade
+            partes.append(f'#c{indice} :n{indice}')
+        
+        self.table.update_item(
+            Key={'escopo': escopo, 'termo': termo},
+            UpdateExpression='ADD ' + ', '.join(partes),
+            ExpressionAttributeNames=nomes,
+            ExpressionAttributeValues=valores
+        )
+    
+    def _categories(self, item):
+        """{categoria: contagem} of a term item"""
+        return {
+            atributo[len(PREFIXO_CATEGORIA):]: int(valor)
+            for atributo, valor in item.items() if atributo.startswith(PREFIXO_CATEGORIA)
+        }
+    
+    def _batch_get(self, pedido):
+        """Items of a BatchGetItem request, retrying unprocessed keys with backoff"""
+        itens = []
+        for tentativa in range(DYNAMODB_BATCH_MAX_ATTEMPTS):
+            if tentativa:
+                time.sleep(random.uniform(0, DYNAMODB_BATCH_BACKOFF_BASE * 2 ** tentativa))
+            
+            response = self.table.meta.client.batch_get_item(RequestItems=pedido)
+            itens.extend(response.get('Responses', {}).get(self.table.name, []))
+            pedido = response.get('UnprocessedKeys')
+            if not pedido:
+                return itens
+        
+        raise RuntimeError(f'batch_get_item left keys unprocessed after {DYNAMODB_BATCH_MAX_ATTEMPTS} attempts')
+    
+    def _paginate(self, **query_kwargs):
+        """Run a query and yield items from every page"""
+        while True:
+            response = self.table.query(**query_kwargs)
+            yield from response.get('Items', [])
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def create_vocabulary_repository():
+    """Build the vocabulary store matching STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'sqlite':
+        from repositories.sqlite_vocabulary_repository import SqliteVocabularyRepository
+        return SqliteVocabularyRepository()
+    return DynamoDBVocabularyRepository()
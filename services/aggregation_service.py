@@ -0,0 +1,100 @@
+from collections import deque
+from utils.money_helper import MoneyHelper
+
+class AggregationService:
+    """Single-pass aggregation of an expense stream, shared by reports and insights (totals in cents)"""
+    
+    def __init__(self, ultimos=10):
+        self.ultimos = ultimos
+    
+    def empty_summary(self):
+        """Summary shape used by rollups, raw aggregation and report rendering"""
+        return {
+            'total_centavos': 0,
+            'count': 0,
+            'por_categoria': {},
+            'por_usuario': {},
+            'recentes': []
+        }
+    
+    def aggregate(self, despesas, incluir_usuarios=True):
+        """Aggregate any iterable of expenses (list or repository generator) in one pass"""
+        total_geral = 0
+        quantidade = 0
+        por_categoria = {}
+        por_usuario = {}
+        recentes = deque(maxlen=self.ultimos)
+        
+        for despesa in despesas:
+            valor = despesa.get('valor_centavos')
+            if type(valor) is not int:
+                # DynamoDB Decimals and legacy 'valor' items; SQLite and new writes are plain ints
+                valor = MoneyHelper.item_cents(despesa)
+            
+            total_geral += valor
+            quantidade += 1
+            
+            cat = despesa.get('categoria', 'outros')
+            dados = por_categoria.get(cat)
+            if dados is None:
+                dados = por_categoria[cat] = {'total_centavos': 0, 'count': 0}
+            dados['total_centavos'] += valor
+            dados['count'] += 1
+            
+            if incluir_usuarios:
+                user = despesa.get('user_id', 'desconhecido')
+                por_usuario[user] = por_usuario.get(user, 0) + valor
+            
+            recentes.append(despesa)
+        
+        return {
+            'total_centavos': total_geral,
+            'count': quantidade,
+            'por_categoria': por_categoria,
+            'por_usuario': por_usuario,
+            'recentes': list(recentes)
+        }
+    
+    def merge(self, resumo, posterior):
+        """Summary of two back-to-back stretches of a period (a precomputed one and the expenses after it)"""
+        if not posterior['count']:
+            return resumo
+        
+        por_categoria = {categoria: dict(dados) for categoria, dados in resumo['por_categoria'].items()}
+        for categoria, dados in posterior['por_categoria'].items():
+            atual = por_categoria.setdefault(categoria, {'total_centavos': 0, 'count': 0})
+            atual['total_centavos'] += dados['total_centavos']
+            atual['count'] += dados['count']
+        
+        por_usuario = dict(resumo['por_usuario'])
+        for usuario, total in posterior['por_usuario'].items():
+            por_usuario[usuario] = por_usuario.get(usuario, 0) + total
+        
+        return {
+            'total_centavos': resumo['total_centavos'] + posterior['total_centavos'],
+            'count': resumo['count'] + posterior['count'],
+            'por_categoria': por_categoria,
+            'por_usuario': por_usuario,
+            'recentes': (list(resumo['recentes']) + list(posterior['recentes']))[-self.ultimos:]
+        }
+    
+    @staticmethod
+    def category_breakdown(resumo):
+        """Categories sorted by total (cents), with their share of the overall total"""
+        total_geral = resumo['total_centavos']
+        return [
+            (categoria, dados['total_centavos'], dados['count'],
+             (dados['total_centavos'] / total_geral * 100) if total_geral > 0 else 0)
+            for categoria, dados in sorted(
+                resumo['por_categoria'].items(), key=lambda x: x[1]['total_centavos'], reverse=True
+            )
+        ]
+    
+    @staticmethod
+    def user_breakdown(resumo):
+        """Users sorted by total (cents), with their share of the overall total"""
+        total_geral = resumo['total_centavos']
+        return [
+            (usuario, total, (total / total_geral * 100) if total_geral > 0 else 0)
+            for usuario, total in sorted(resumo['por_usuario'].items(), key=lambda x: x[1], reverse=True)
+        ]
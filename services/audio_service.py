@@ -1,33 +1,96 @@
-import os
-import base64
+import hashlib
+import itertools
 import logging
 import requests
-from config.settings import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, GEMINI_API_KEY, GEMINI_URL
+from collections import deque
+from config.settings import (
+    TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, GEMINI_API_KEY, GEMINI_UPLOAD_URL, GEMINI_AUDIO_TIMEOUT,
+    AUDIO_MAX_BYTES, AUDIO_MAX_SECONDS, AUDIO_INLINE_MAX_BYTES, AUDIO_CHUNK_BYTES,
+    AUDIO_UPLOAD_PART_BYTES
+)
+from services.gemini_client import GeminiClient
+from utils.audio_helper import AudioHelper, Base64StreamEncoder, SizedStream
+from utils.deadline_helper import DeadlineHelper
+from utils.http_helper import HttpHelper
+from utils.metrics_helper import MetricsHelper
 
 logger = logging.getLogger()
 
 class AudioService:
     """Service to handle audio conversion to text"""
     
+    def __init__(self, gemini_client=None):
+        self.gemini_client = gemini_client or GeminiClient()
+    
     def convert_to_text(self, media_url):
         """Convert WhatsApp audio to text using Gemini API"""
+        audio = self.download_audio(media_url)
+        if not audio:
+            return None
+        return self.transcribe(audio)
+    
+    def download_audio(self, media_url):
+        """Stream audio from Twilio with a size cap.
+        
+        Small files are base64-encoded; files above AUDIO_INLINE_MAX_BYTES are
+        streamed straight into Gemini's file API. Without a Content-Length (or with
+        a wrong one), the bytes actually read decide.
+        Returns a dict with content_type, tamanho, hash (sha256 of the bytes) and
+        either base64 or file_uri, or None when the download fails or the audio is too large/long.
+        """
         try:
-            # Download audio from Twilio
             logger.info(f"Downloading audio from: {media_url}")
             
             auth = (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-            response = requests.get(media_url, auth=auth, timeout=30)
-            response.raise_for_status()
+            timeout = DeadlineHelper.timeout(30)
+            with HttpHelper.get_session().get(media_url, auth=auth, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                
+                content_type = response.headers.get('content-type', 'audio/ogg').split(';')[0].strip()
+                tamanho_declarado = int(response.headers.get('content-length') or 0)
+                
+                # Reject oversized audio before reading a single byte
+                if tamanho_declarado > AUDIO_MAX_BYTES:
+                    logger.warning(f"Audio too large: {tamanho_declarado} bytes")
+                    MetricsHelper.increment('audio.rejeitado_tamanho')
+                    return None
+                
+                estado = {'final': b'', 'hash': hashlib.sha256(), 'tamanho': 0}
+                chunks = self._limited_chunks(response, estado)
+                
+                if tamanho_declarado > AUDIO_INLINE_MAX_BYTES:
+                    base64_audio, file_uri = None, self._upload_to_gemini(chunks, tamanho_declarado, content_type)
+                else:
+                    base64_audio, file_uri = self._read_inline(chunks, content_type)
             
-            audio_content = response.content
-            logger.info(f"Audio downloaded, size: {len(audio_content)} bytes")
+            audio = {
+                'content_type': content_type,
+                'tamanho': estado['tamanho'],
+                'base64': base64_audio,
+                'file_uri': file_uri,
+                'hash': estado['hash'].hexdigest()
+            }
+            logger.info(f"Audio downloaded, size: {audio['tamanho']} bytes")
             
-            # Convert to base64
-            audio_base64 = base64.b64encode(audio_content).decode('utf-8')
-            content_type = response.headers.get('content-type', 'audio/ogg')
+            duracao = AudioHelper.ogg_duration(estado['final']) if content_type == 'audio/ogg' else None
+            if duracao and duracao > AUDIO_MAX_SECONDS:
+                logger.warning(f"Audio too long: {duracao:.0f}s")
+                MetricsHelper.increment('audio.rejeitado_duracao')
+                return None
             
-            # Transcribe with Gemini
-            transcription = self._transcribe_with_gemini(audio_base64, content_type)
+            return audio
+            
+        except requests.exceptions.RequestException as error:
+            logger.error(f'Error downloading audio: {str(error)}')
+            return None
+        except Exception as error:
+            logger.error(f'Error reading audio: {str(error)}')
+            return None
+    
+    def transcribe(self, audio):
+        """Transcribe downloaded audio with Gemini"""
+        try:
+            transcription = self._transcribe_with_gemini(audio)
             
             if transcription:
                 logger.info(f'Audio transcribed successfully: {transcription}')
@@ -35,19 +98,113 @@ class AudioService:
             return transcription
             
         except requests.exceptions.RequestException as error:
-            logger.error(f'Error downloading audio or calling Gemini API: {str(error)}')
+            logger.error(f'Error calling Gemini API: {str(error)}')
             return None
         except Exception as error:
             logger.error(f'Error converting audio to text: {str(error)}')
             return None
     
-    def _transcribe_with_gemini(self, audio_base64, content_type):
-        """Send audio to Gemini for transcription"""
+    def _limited_chunks(self, response, estado):
+        """Yield download chunks, aborting past AUDIO_MAX_BYTES and keeping the tail for the duration check"""
+        total = 0
+        for chunk in response.iter_content(chunk_size=AUDIO_CHUNK_BYTES):
+            total += len(chunk)
+            if total > AUDIO_MAX_BYTES:
+                MetricsHelper.increment('audio.rejeitado_tamanho')
+                raise ValueError(f'Audio exceeds {AUDIO_MAX_BYTES} bytes')
+            estado['tamanho'] = total
+            estado['final'] = (estado['final'] + chunk)[-AUDIO_CHUNK_BYTES:]
+            estado['hash'].update(chunk)
+            yield chunk
+    
+    def _read_inline(self, chunks, content_type):
+        """(base64, None) of a download that fits inline, else (None, file_uri).
+        
+        At most AUDIO_INLINE_MAX_BYTES of raw chunks are held: once a download without
+        a (truthful) Content-Length outgrows them, they and the rest of the stream go
+        straight into the file API, and nothing is base64-encoded.
+        """
+        lidos = deque()
+        tamanho = 0
+        for chunk in chunks:
+            lidos.append(chunk)
+            tamanho += len(chunk)
+            if tamanho > AUDIO_INLINE_MAX_BYTES:
+                MetricsHelper.increment('audio.upload_sem_tamanho')
+                # Buffered chunks are released as they are sent
+                buffer = (lidos.popleft() for _ in range(len(lidos)))
+                return None, self._upload_to_gemini(itertools.chain(buffer, chunks), None, content_type)
+        
+        # Each raw chunk is dropped as soon as it is encoded
+        encoder = Base64StreamEncoder()
+        while lidos:
+            encoder.feed(lidos.popleft())
+        return encoder.finish(), None
+    
+    def _upload_to_gemini(self, chunks, tamanho, content_type):
+        """Stream audio into Gemini's file API (resumable upload) and return its URI.
+        
+        With a known `tamanho` the audio goes in one request; otherwise (None) it goes
+        in AUDIO_UPLOAD_PART_BYTES pieces, the last one finalizing the upload.
+        """
+        session = HttpHelper.get_session()
+        
         headers = {
-            "Content-Type": "application/json",
-            "x-goog-api-key": GEMINI_API_KEY
+            "x-goog-api-key": GEMINI_API_KEY,
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Type": content_type,
+            "Content-Type": "application/json"
         }
+        if tamanho is not None:
+            headers["X-Goog-Upload-Header-Content-Length"] = str(tamanho)
+        inicio = session.post(
+            GEMINI_UPLOAD_URL,
+            headers=headers,
+            json={"file": {"display_name": "whatsapp-audio"}},
+            timeout=DeadlineHelper.timeout(15)
+        )
+        inicio.raise_for_status()
         
+        url = inicio.headers['x-goog-upload-url']
+        if tamanho is not None:
+            response = self._send_part(session, url, SizedStream(chunks, tamanho), 0, 'upload, finalize')
+        else:
+            response = self._send_parts(session, url, chunks)
+        
+        file_uri = response.json()['file']['uri']
+        logger.info(f"Audio uploaded to Gemini file API: {file_uri}")
+        return file_uri
+    
+    def _send_parts(self, session, url, chunks):
+        """Upload a stream of unknown size piece by piece; only one piece is held at a time"""
+        parte = bytearray()
+        enviados = 0
+        for chunk in chunks:
+            parte += chunk
+            # Strictly above: whatever remains at the end is the (non-empty) finalizing piece
+            while len(parte) > AUDIO_UPLOAD_PART_BYTES:
+                self._send_part(session, url, bytes(parte[:AUDIO_UPLOAD_PART_BYTES]), enviados, 'upload')
+                enviados += AUDIO_UPLOAD_PART_BYTES
+                del parte[:AUDIO_UPLOAD_PART_BYTES]
+        return self._send_part(session, url, bytes(parte), enviados, 'upload, finalize')
+    
+    def _send_part(self, session, url, dados, offset, comando):
+        """POST one resumable-upload request"""
+        response = session.post(
+            url,
+            headers={
+                "X-Goog-Upload-Offset": str(offset),
+                "X-Goog-Upload-Command": comando
+            },
+            data=dados,
+            timeout=DeadlineHelper.timeout(GEMINI_AUDIO_TIMEOUT)
+        )
+        response.raise_for_status()
+        return response
+    
+    def _transcribe_with_gemini(self, audio):
+        """Send audio to Gemini for transcription"""
         payload = {
             "contents": [
                 {
@@ -55,12 +212,7 @@ class AudioService:
                         {
                             "text": "Transcreva este áudio em português brasileiro. Responda APENAS com o texto transcrito, sem comentários adicionais."
                         },
-                        {
-                            "inlineData": {
-                                "mimeType": content_type,
-                                "data": audio_base64
-                            }
-                        }
+                        AudioHelper.gemini_part(audio)
                     ]
                 }
             ],
@@ -74,16 +226,13 @@ class AudioService:
         
         logger.info("Sending audio to Gemini for transcription...")
         
-        response = requests.post(GEMINI_URL, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-        
-        result = response.json()
+        body = AudioHelper.serialize_payload(payload, audio)
+        result = self.gemini_client.generate(body, GEMINI_AUDIO_TIMEOUT)
         
         # Extract transcription
-        if 'candidates' in result and len(result['candidates']) > 0:
-            candidate = result['candidates'][0]
-            if 'content' in candidate and 'parts' in candidate['content']:
-                return candidate['content']['parts'][0]['text'].strip()
+        transcription = GeminiClient.extract_text(result)
+        if transcription:
+            return transcription
         
         logger.warning("No transcription found in Gemini response")
-        return None
\ No newline at end of file
+        return None
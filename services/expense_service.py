@@ -1,43 +1,92 @@
 import logging
-from datetime import datetime
-from decimal import Decimal
-from repositories.expense_repository import ExpenseRepository
+from datetime import datetime, timedelta
+from config.settings import VOCABULARY_INDEX
+from repositories.expense_repository import create_expense_repository
+from repositories.family_repository import create_family_repository
+from repositories.rollup_repository import RollupRepository
+from services.insight_cache import InsightCache
+from utils.date_helper import DateHelper
+from utils.interpretation_helper import InterpretationHelper
+from utils.money_helper import MoneyHelper
+from utils.tracing_helper import TracingHelper
 
 logger = logging.getLogger()
 
 class ExpenseService:
     """Service to handle expense processing"""
     
-    def __init__(self):
-        self.repository = ExpenseRepository()
+    def __init__(self, repository=None, family_repository=None, vocabulary_index=None):
+        self.repository = repository or create_expense_repository()
+        self.family_repository = family_repository or create_family_repository()
+        # Stores that aggregate with SQL need no rollup table
+        self.rollup_repository = None if self.repository.native_aggregation else RollupRepository()
+        self.insight_cache = InsightCache()
+        self.vocabulary_index = vocabulary_index
+        if VOCABULARY_INDEX and self.vocabulary_index is None:
+            from services.vocabulary_index import VocabularyIndex
+            self.vocabulary_index = VocabularyIndex()
     
     def process_expense(self, mensagem, interpretacao):
-        """Process expense using Gemini interpretation"""
+        """Process every expense of a message using Gemini interpretation"""
         try:
-            # Prepare expense data
-            dados_despesa = {
-                'timestamp': datetime.now().isoformat(),
-                'valor': Decimal(str(interpretacao.get('valor', 0))),
-                'categoria': interpretacao.get('categoria', 'outros'),
-                'descricao': interpretacao.get('descricao', mensagem.get('texto', '')),
-                'user_id': mensagem.get('profileName', 'desconhecido'),
-                'whatsapp_from': mensagem.get('from', ''),
-                'data_criacao': datetime.now().isoformat()
-            }
+            # Retries of the same webhook reuse the first attempt's time, so the keys are stable
+            recebido_em = mensagem.get('recebidoEm') or datetime.now().isoformat()
+            base = datetime.fromisoformat(recebido_em)
+            familia_id = self.family_repository.get_family_id(mensagem.get('from'))
+            data_criacao = datetime.now().isoformat()
             
-            # Save to DynamoDB
-            self.repository.save_expense(dados_despesa)
+            despesas = []
+            for indice, item in enumerate(InterpretationHelper.expense_items(interpretacao) or [{}]):
+                despesas.append({
+                    # One microsecond apart: expenses of one message need distinct (user_id, timestamp) keys
+                    'timestamp': (base + timedelta(microseconds=indice)).isoformat() if indice else recebido_em,
+                    'valor_centavos': MoneyHelper.to_cents(item.get('valor', 0)),
+                    'categoria': item.get('categoria', 'outros'),
+                    'descricao': item.get('descricao', mensagem.get('texto', '')),
+                    'user_id': mensagem.get('profileName', 'desconhecido'),
+                    'whatsapp_from': mensagem.get('from', ''),
+                    'familia_id': familia_id,
+                    'data_criacao': data_criacao
+                })
+            
+            # Save to DynamoDB with their rollup increments (one write for the whole message)
+            with TracingHelper.span('dynamodb_escrita'):
+                salvas = self.repository.save_expenses(despesas, self.rollup_repository)
+                if salvas:
+                    # Same user, family and moment: one invalidation covers the whole message
+                    self._invalidate_insights(salvas[0])
+                    self._learn_vocabulary(salvas)
             
             # Format response
-            return self._format_expense_response(dados_despesa, mensagem)
+            return self._format_expense_response(despesas, mensagem)
             
         except Exception as error:
             logger.error(f'Error processing expense with Gemini: {str(error)}')
             raise
     
-    def _format_expense_response(self, dados_despesa, mensagem):
-        """Format expense confirmation message"""
-        data_formatada = datetime.fromisoformat(dados_despesa['timestamp']).strftime('%d/%m/%Y %H:%M')
+    def _learn_vocabulary(self, salvas):
+        """Teach the sender's vocabularies the categories just saved (rebuild job repairs any gap)"""
+        if self.vocabulary_index is None:
+            return
+        try:
+            self.vocabulary_index.learn(salvas)
+        except Exception as error:
+            logger.error(f'Error updating vocabulary: {str(error)}')
+    
+    def _invalidate_insights(self, dados_despesa):
+        """Drop cached insights of the periods this expense lands in"""
+        try:
+            escopos = [
+                RollupRepository.user_scope(dados_despesa['user_id']),
+                RollupRepository.family_scope(dados_despesa['familia_id'])
+            ]
+            self.insight_cache.invalidate(escopos, DateHelper.get_period_labels(dados_despesa['timestamp']))
+        except Exception as error:
+            logger.error(f'Error invalidating insights: {str(error)}')
+    
+    def _format_expense_response(self, despesas, mensagem):
+        """Format expense confirmation message (one block per message, however many expenses)"""
+        data_formatada = datetime.fromisoformat(despesas[0]['timestamp']).strftime('%d/%m/%Y %H:%M')
         
         categoria_emoji = {
             'alimentacao': '🍽️',
@@ -47,19 +96,33 @@ class ExpenseService:
             'outros': '📝'
         }
         
-        emoji = categoria_emoji.get(dados_despesa['categoria'], '📝')
-        valor = float(dados_despesa['valor'])
-        
         # Add audio indicator if it was converted from audio
         audio_indicator = "🎤➡️📝 " if mensagem.get('numMedia', 0) > 0 else ""
         
-        return f"""✅ {audio_indicator}Despesa registrada com IA!
-
-📊 *Detalhes:*
-• Valor: R$ {valor:.2f}
+        if len(despesas) == 1:
+            dados_despesa = despesas[0]
+            emoji = categoria_emoji.get(dados_despesa['categoria'], '📝')
+            detalhes = f"""• Valor: R$ {MoneyHelper.format(dados_despesa['valor_centavos'])}
 • Categoria: {emoji} {dados_despesa['categoria']}
 • Descrição: {dados_despesa['descricao']}
-• Data: {data_formatada}
+• Data: {data_formatada}"""
+            titulo = "Despesa registrada com IA!"
+        else:
+            linhas = [
+                f"• R$ {MoneyHelper.format(d['valor_centavos'])} - {categoria_emoji.get(d['categoria'], '📝')} "
+                f"{d['categoria']} - {d['descricao']}"
+                for d in despesas
+            ]
+            total = sum(d['valor_centavos'] for d in despesas)
+            detalhes = '\n'.join(linhas) + f"""
+• Total: R$ {MoneyHelper.format(total)}
+• Data: {data_formatada}"""
+            titulo = f"{len(despesas)} despesas registradas com IA!"
+        
+        return f"""✅ {audio_indicator}{titulo}
+
+📊 *Detalhes:*
+{detalhes}
 
 🤖 *Processado automaticamente pela IA Gemini*
 💬 *Dica:* Envie áudios ou textos - eu entendo os dois!"""
\ No newline at end of file
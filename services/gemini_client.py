@@ -0,0 +1,168 @@
+import json
+import logging
+import random
+import time
+import requests
+from config.settings import (
+    GEMINI_API_KEY, GEMINI_URL, GEMINI_TIMEOUT, GEMINI_MAX_ATTEMPTS, GEMINI_BACKOFF_BASE,
+    GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_COOLDOWN
+)
+from utils.circuit_breaker import CircuitBreaker
+from utils.deadline_helper import DeadlineHelper
+from utils.http_helper import HttpHelper
+from utils.metrics_helper import MetricsHelper
+from utils.tracing_helper import TracingHelper
+
+logger = logging.getLogger()
+
+# Not worth calling Gemini with less time than this
+MIN_TIMEOUT_SECONDS = 1.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Module scope: failures seen by one invocation protect the next ones
+_breaker = CircuitBreaker('gemini', GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_COOLDOWN)
+
+
+class GeminiUnavailableError(requests.exceptions.RequestException):
+    """Gemini was skipped or kept failing (circuit open, deadline reached or retries exhausted)"""
+
+
+class GeminiClient:
+    """Deadline-aware Gemini HTTP client with jittered retries and a circuit breaker"""
+    
+    def is_available(self):
+        """False while the circuit is open (callers should degrade instead of calling)"""
+        return not _breaker.is_open()
+    
+    def generate(self, body, timeout_maximo=GEMINI_TIMEOUT, url=GEMINI_URL, stream_json=False):
+        """POST a serialized generateContent payload and return the parsed response.
+        
+        With stream_json the same payload goes to streamGenerateContent and reading
+        stops as soon as the text holds a complete JSON object or array; the result
+        has the generateContent shape.
+        """
+        if stream_json:
+            url = self._stream_url(url)
+        headers = {
+            "Content-Type": "application/json",
+            "x-goog-api-key": GEMINI_API_KEY
+        }
+        ultimo_erro = None
+        
+        for tentativa in range(GEMINI_MAX_ATTEMPTS):
+            if not _breaker.allow():
+                raise GeminiUnavailableError('Gemini circuit is open')
+            
+            timeout = DeadlineHelper.timeout(timeout_maximo)
+            if timeout < MIN_TIMEOUT_SECONDS:
+                MetricsHelper.increment('gemini.sem_tempo')
+                raise GeminiUnavailableError('No time left in the request deadline')
+            
+            try:
+                MetricsHelper.increment('gemini.chamadas')
+                with TracingHelper.span('gemini'):
+                    response = HttpHelper.get_session().post(
+                        url, headers=headers, data=body, timeout=timeout, stream=stream_json
+                    )
+                    
+                    if response.status_code in RETRYABLE_STATUS:
+                        response.close()
+                        raise requests.exceptions.HTTPError(f'Gemini returned {response.status_code}', response=response)
+                    response.raise_for_status()
+                    
+                    result = self._read_json_stream(response) if stream_json else response.json()
+                
+                _breaker.record_success()
+                self._record_usage(result)
+                return result
+                
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.HTTPError,
+                    requests.exceptions.ChunkedEncodingError, ValueError) as error:
+                # ValueError: a body or streamed event that is not valid JSON counts as a failed call too
+                status = getattr(getattr(error, 'response', None), 'status_code', None)
+                if status is not None and status not in RETRYABLE_STATUS:
+                    # 4xx: our request is wrong, retrying will not help
+                    raise
+                
+                _breaker.record_failure()
+                MetricsHelper.increment('gemini.falhas')
+                ultimo_erro = error
+                logger.warning(f'Gemini attempt {tentativa + 1} failed: {str(error)}')
+                
+                espera = random.uniform(0, GEMINI_BACKOFF_BASE * 2 ** tentativa)
+                restante = DeadlineHelper.remaining()
+                if tentativa + 1 >= GEMINI_MAX_ATTEMPTS or (restante is not None and restante < espera + MIN_TIMEOUT_SECONDS):
+                    break
+                time.sleep(espera)
+        
+        raise GeminiUnavailableError(f'Gemini failed after retries: {str(ultimo_erro)}')
+    
+    @staticmethod
+    def _stream_url(url):
+        """streamGenerateContent (server-sent events) endpoint of a generateContent URL"""
+        return url.replace(':generateContent', ':streamGenerateContent') + '?alt=sse'
+    
+    @staticmethod
+    def _read_json_stream(response):
+        """Join streamed text chunks until a JSON value is complete, then drop the connection"""
+        texto, uso = '', {}
+        try:
+            # chunk_size=None hands over each chunk as it arrives instead of waiting for 512 bytes
+            for linha in response.iter_lines(chunk_size=None):
+                if not linha.startswith(b'data:'):
+                    continue
+                evento = json.loads(linha[5:])
+                uso = evento.get('usageMetadata') or uso
+                for candidato in evento.get('candidates', [])[:1]:
+                    for parte in candidato.get('content', {}).get('parts', []):
+                        texto += parte.get('text', '')
+                
+                fim = GeminiClient.json_end(texto)
+                if fim is not None:
+                    # The rest is whitespace and the final usage event: not worth waiting for
+                    MetricsHelper.increment('gemini.stream_interrompido')
+                    texto = texto[:fim]
+                    break
+        finally:
+            response.close()
+        
+        return {'candidates': [{'content': {'parts': [{'text': texto}]}}], 'usageMetadata': uso}
+    
+    @staticmethod
+    def json_end(texto):
+        """Index just past the first complete top-level JSON object or array in texto, or None"""
+        # One counter for both bracket kinds: a value that opens with '[' only ends at its ']'
+        profundidade, em_string, escapado = 0, False, False
+        for indice, caractere in enumerate(texto):
+            if em_string:
+                if escapado:
+                    escapado = False
+                elif caractere == '\\':
+                    escapado = True
+                elif caractere == '"':
+                    em_string = False
+            elif caractere in '{[':
+                profundidade += 1
+            elif caractere in '}]' and profundidade:
+                profundidade -= 1
+                if not profundidade:
+                    return indice + 1
+            elif caractere == '"' and profundidade:
+                em_string = True
+        return None
+    
+    @staticmethod
+    def _record_usage(result):
+        """Add Gemini's token counts to the current request's metrics"""
+        uso = result.get('usageMetadata') or {}
+        TracingHelper.add_metric('gemini_tokens_entrada', uso.get('promptTokenCount', 0))
+        TracingHelper.add_metric('gemini_tokens_saida', uso.get('candidatesTokenCount', 0))
+    
+    @staticmethod
+    def extract_text(result):
+        """Text of the first candidate, or None"""
+        if 'candidates' in result and len(result['candidates']) > 0:
+            candidate = result['candidates'][0]
+            if 'content' in candidate and 'parts' in candidate['content']:
+                return candidate['content']['parts'][0]['text'].strip()
+        return None
@@ -1,69 +1,61 @@
 import json
 import logging
 import requests
-from config.settings import GEMINI_API_KEY, GEMINI_URL
+from config.settings import GEMINI_TIMEOUT, GEMINI_AUDIO_TIMEOUT, GEMINI_STREAMING, INSIGHT_PROMPT_MAX_TOKENS
+from services.aggregation_service import AggregationService
+from services.gemini_client import GeminiClient
+from utils.audio_helper import AudioHelper
+from utils.interpretation_helper import InterpretationHelper
+from utils.money_helper import MoneyHelper
+from utils.prompt_helper import PromptHelper
 
 logger = logging.getLogger()
 
+# System instructions are constant, so every request shares the same cacheable prefix
+TIPOS_INTERPRETACAO = """- Gasto relatado (um item por gasto; "50 no almoço, 30 de uber" tem dois): {"tipo":"despesa","despesas":[{"valor":50.0,"categoria":"alimentacao","descricao":"almoço"}]}
+  valor só o número; categoria alimentacao, transporte, saude, lazer ou outros; descricao curta
+- Pedido de relatório ou de informação sobre gastos: {"tipo":"consulta","periodo":"mes_atual","escopo":"individual","mes_especifico":null}
+  periodo semana_atual, mes_atual ou mes_especifico; escopo individual ou familiar; mes_especifico o mês citado (1-12) ou null
+- Qualquer outra mensagem: {"tipo":"ajuda"}"""
+
+INSTRUCAO_TEXTO = f"""Classifique a mensagem de WhatsApp de um controle de despesas (português brasileiro). Responda só com um JSON:
+{TIPOS_INTERPRETACAO}"""
+
+INSTRUCAO_AUDIO = f"""Transcreva o áudio de WhatsApp anexado (português brasileiro) e classifique-o num controle de despesas. Responda só com um JSON, incluindo o texto transcrito em "transcricao":
+{TIPOS_INTERPRETACAO}"""
+
+INSTRUCAO_INSIGHTS = """Você é especialista em finanças pessoais. Com os dados de despesas recebidos, escreva em português brasileiro 3 insights práticos e específicos (máximo 4 linhas cada), só os insights, sem conclusão ou resumo, com emojis relevantes:
+1. **Padrão Principal:** o padrão mais importante nos gastos
+2. **Oportunidade de Economia:** onde há maior potencial de redução de custos
+3. **Recomendação Estratégica:** uma ação concreta para otimizar os gastos"""
+
+# Characters kept of each recent expense's description in the insights prompt
+DESCRICAO_MAX_CARACTERES = 30
+
 class GeminiService:
     """Service to handle Gemini AI interactions"""
     
+    INSIGHT_PADRAO = "💡 Continue registrando suas despesas para obter insights personalizados da IA!"
+    
+    def __init__(self, client=None):
+        self.client = client or GeminiClient()
+    
     def interpret_message(self, texto_mensagem):
         """Use Gemini to interpret message type and extract relevant data"""
         try:
-            prompt = f"""Analise a seguinte mensagem de WhatsApp e determine se é:
-1. DESPESA: usuário relatando um gasto
-2. CONSULTA: usuário pedindo relatório/informações sobre gastos
-3. AJUDA: mensagem que não se encaixa nas anteriores
-
-Mensagem: "{texto_mensagem}"
-
-Se for DESPESA, extraia:
-- Valor gasto (apenas número, sem texto)
-- Categoria (alimentacao, transporte, saude, lazer, outros)
-- Descrição resumida do gasto
-
-Se for CONSULTA, identifique:
-- Período solicitado (semana_atual, mes_atual, mes_especifico)
-- Se é consulta individual ou familiar
-- Mês específico se mencionado (1-12)
-
-Responda APENAS com um JSON válido no formato:
-
-Para DESPESA:
-{{
-    "tipo": "despesa",
-    "valor": 50.0,
-    "categoria": "alimentacao",
-    "descricao": "almoço no restaurante"
-}}
-
-Para CONSULTA:
-{{
-    "tipo": "consulta",
-    "periodo": "mes_atual",
-    "escopo": "individual",
-    "mes_especifico": null
-}}
-
-Para AJUDA:
-{{
-    "tipo": "ajuda"
-}}
-
-IMPORTANTE: Responda APENAS com o JSON, sem texto adicional."""
+            instrucao, prompt = self._build_interpretation_prompt(texto_mensagem)
             
-            response = self._call_gemini(prompt, max_tokens=200, temperature=0.1)
+            # Room for a few expenses in one message
+            response = self._call_gemini(prompt, max_tokens=400, temperature=0.1, instrucao=instrucao, resposta_json=True)
             
             if response:
-                # Clean response and parse JSON
-                clean_response = response.replace('```json', '').replace('```', '').strip()
-                logger.info(f'Gemini interpretation: {clean_response}')
-                return json.loads(clean_response)
+                interpretacao = InterpretationHelper.normalize(self._parse_json_response(response))
+                logger.info(f'Gemini interpretation: {interpretacao}')
+                return interpretacao
             
-            # Fallback
+            # Fallback (flagged so callers can prefer a local interpretation)
             logger.warning("Could not interpret message with Gemini, using fallback")
-            return {"tipo": "ajuda"}
+            return {"tipo": "ajuda", "fallback": True}
             
         except json.JSONDecodeError as error:
             logger.error(f'Error parsing Gemini JSON response: {str(error)}')
@@ -72,146 +64,142 @@ IMPORTANTE: Responda APENAS com o JSON, sem texto adicional."""
             logger.error(f'Error interpreting message: {str(error)}')
             return {"tipo": "ajuda"}
     
-    def generate_insights(self, despesas, titulo, is_consulta_familia, periodo):
-        """Generate insights with Gemini API"""
+    def interpret_audio(self, audio):
+        """Transcribe and interpret a voice note in a single Gemini request.
+        
+        Returns the interpretation dict with a 'transcricao' field, or None when
+        the response is not valid JSON so the caller can use the two-step path.
+        """
         try:
-            # Prepare data for analysis
-            total_geral = sum(float(item.get('valor', 0)) for item in despesas)
+            instrucao, prompt = self._build_interpretation_prompt(None)
+            response = self._call_gemini(
+                prompt, max_tokens=1200, temperature=0.1, audio=audio, timeout=GEMINI_AUDIO_TIMEOUT,
+                instrucao=instrucao, resposta_json=True
+            )
             
-            # Group by category
-            por_categoria = {}
-            for despesa in despesas:
-                cat = despesa.get('categoria', 'outros')
-                if cat not in por_categoria:
-                    por_categoria[cat] = {'total': 0, 'count': 0}
-                por_categoria[cat]['total'] += float(despesa.get('valor', 0))
-                por_categoria[cat]['count'] += 1
+            if response:
+                interpretacao = self._parse_json_response(response)
+                if isinstance(interpretacao, dict) and interpretacao.get('tipo') and interpretacao.get('transcricao'):
+                    interpretacao = InterpretationHelper.normalize(interpretacao)
+                    logger.info(f'Gemini audio interpretation: {interpretacao}')
+                    return interpretacao
             
-            # Group by user if family query
-            por_usuario = {}
-            if is_consulta_familia:
-                for despesa in despesas:
-                    user = despesa.get('user_id', 'desconhecido')
-                    if user not in por_usuario:
-                        por_usuario[user] = 0
-                    por_usuario[user] += float(despesa.get('valor', 0))
+            logger.warning("Invalid one-shot audio interpretation, falling back to transcription")
+            return None
             
+        except json.JSONDecodeError as error:
+            logger.error(f'Error parsing Gemini audio JSON response: {str(error)}')
+            return None
+        except Exception as error:
+            logger.error(f'Error interpreting audio: {str(error)}')
+            return None
+    
+    def _build_interpretation_prompt(self, texto_mensagem):
+        """System instruction and user text for a text message, or for an attached audio when texto_mensagem is None"""
+        if texto_mensagem is None:
+            return INSTRUCAO_AUDIO, None
+        return INSTRUCAO_TEXTO, f'Mensagem: "{texto_mensagem}"'
+    
+    def _parse_json_response(self, response):
+        """Strip markdown fences from a Gemini reply and parse its JSON"""
+        clean_response = response.replace('```json', '').replace('```', '').strip()
+        return json.loads(clean_response)
+    
+    def generate_insights(self, resumo, titulo, is_consulta_familia, periodo):
+        """Generate insights with Gemini API from an aggregated summary"""
+        try:
             # Build analysis prompt
-            prompt = self._build_insights_prompt(
-                por_categoria, por_usuario, despesas, 
-                total_geral, periodo, is_consulta_familia
-            )
+            prompt = self._build_insights_prompt(resumo, periodo, is_consulta_familia)
             
-            insight = self._call_gemini(prompt, max_tokens=500, temperature=0.7)
+            insight = self._call_gemini(prompt, max_tokens=500, temperature=0.7, instrucao=INSTRUCAO_INSIGHTS)
             
             if insight:
                 logger.info(f'Generated detailed insight: {insight[:200]}...')
                 return insight
             
-            return "💡 Continue registrando suas despesas para obter insights personalizados da IA!"
+            return self.INSIGHT_PADRAO
             
         except Exception as error:
             logger.error(f'Error generating AI insight: {str(error)}')
-            return "💡 Continue registrando suas despesas para obter insights personalizados da IA!"
+            return self.INSIGHT_PADRAO
     
-    def _build_insights_prompt(self, por_categoria, por_usuario, despesas, total_geral, periodo, is_consulta_familia):
-        """Build comprehensive prompt for insights generation"""
-        # Prepare category data
-        categorias = []
-        for cat, dados in sorted(por_categoria.items(), key=lambda x: x[1]['total'], reverse=True):
-            categorias.append({
-                'categoria': cat,
-                'total': dados['total'],
-                'quantidade': dados['count'],
-                'porcentagem': f"{(dados['total'] / total_geral * 100):.1f}" if total_geral > 0 else "0.0"
-            })
-        
-        # Prepare user data
-        usuarios = []
-        if is_consulta_familia:
-            for user, total in sorted(por_usuario.items(), key=lambda x: x[1], reverse=True):
-                usuarios.append({
-                    'usuario': user,
-                    'total': total,
-                    'porcentagem': f"{(total / total_geral * 100):.1f}" if total_geral > 0 else "0.0"
-                })
+    def _build_insights_prompt(self, resumo, periodo, is_consulta_familia):
+        """Compact data tables for the insights, capped at INSIGHT_PROMPT_MAX_TOKENS (instructions go separately)"""
+        linhas = [
+            f"Período: {periodo}",
+            f"Análise: {'Família' if is_consulta_familia else 'Individual'}",
+            f"Total: R$ {MoneyHelper.format(resumo['total_centavos'])} em {resumo['count']} despesas",
+            "Categorias (categoria|R$|%|despesas):"
+        ]
+        linhas += [
+            f"{categoria}|{MoneyHelper.format(total)}|{porcentagem:.1f}|{quantidade}"
+            for categoria, total, quantidade, porcentagem in AggregationService.category_breakdown(resumo)
+        ]
         
-        # Format data for prompt
-        categorias_text = '\n'.join([
-            f"- {c['categoria']}: R$ {c['total']:.2f} ({c['porcentagem']}%) - {c['quantidade']} despesas"
-            for c in categorias
-        ])
+        if is_consulta_familia and len(resumo['por_usuario']) > 1:
+            linhas.append("Pessoas (pessoa|R$|%):")
+            linhas += [
+                f"{usuario}|{MoneyHelper.format(total)}|{porcentagem:.1f}"
+                for usuario, total, porcentagem in AggregationService.user_breakdown(resumo)
+            ]
         
-        usuarios_text = ""
-        if is_consulta_familia and len(usuarios) > 1:
-            usuarios_text = f"\n\nGastos por pessoa:\n" + '\n'.join([
-                f"- {u['usuario']}: R$ {u['total']:.2f} ({u['porcentagem']}%)"
-                for u in usuarios
-            ])
+        # Recent expenses fill what is left of the budget, newest first
+        cabecalho = "Últimas despesas (categoria|R$|descrição):"
+        restante = INSIGHT_PROMPT_MAX_TOKENS - PromptHelper.estimate_tokens('\n'.join(linhas + [cabecalho]))
+        recentes, _ = PromptHelper.fit_lines((
+            f"{d.get('categoria', 'outros')}|{MoneyHelper.format(MoneyHelper.item_cents(d))}|"
+            f"{PromptHelper.clip(d.get('descricao', ''), DESCRICAO_MAX_CARACTERES)}"
+            for d in reversed(resumo['recentes'][-10:])
+        ), restante)
+        if recentes:
+            linhas.append(cabecalho)
+            linhas += reversed(recentes)
         
-        # Recent expenses context
-        despesas_recentes = ""
-        if despesas:
-            detalhes_despesas = despesas[-10:]  # Last 10 expenses
-            despesas_recentes = f"\n\nÚltimas despesas registradas:\n" + '\n'.join([
-                f"- {d.get('categoria', 'outros')}: R$ {float(d.get('valor', 0)):.2f} - {d.get('descricao', '')[:30]}..."
-                for d in detalhes_despesas
-            ])
-        
-        return f"""Analise detalhadamente os dados de despesas e forneça insights úteis e práticos em português brasileiro:
-
-Período analisado: {periodo}
-Total gasto: R$ {total_geral:.2f}
-Número de despesas: {len(despesas)}
-Tipo de análise: {'Família' if is_consulta_familia else 'Individual'}
-
-Distribuição por categoria:
-{categorias_text}{usuarios_text}{despesas_recentes}
-
-Como especialista em finanças pessoais, forneça 3 insights práticos e específicos (máximo 4 linhas cada):
-
-1. **Padrão Principal:** Qual o padrão mais importante identificado nos gastos?
-2. **Oportunidade de Economia:** Onde há maior potencial de redução de custos?
-3. **Recomendação Estratégica:** Qual ação concreta recomenda para otimizar os gastos?
-
-Só traga os insights, sem conclusão ou resumo, seja prático e focado nos dados apresentados. Use emojis relevantes."""
+        return '\n'.join(linhas)
+    
+    def is_available(self):
+        """Whether Gemini is healthy enough to be called (circuit closed)"""
+        return self.client.is_available()
     
-    def _call_gemini(self, prompt, max_tokens=1000, temperature=0.7):
-        """Generic method to call Gemini API"""
+    def _call_gemini(self, prompt, max_tokens=1000, temperature=0.7, audio=None, timeout=GEMINI_TIMEOUT,
+                     instrucao=None, resposta_json=False):
+        """Generic method to call Gemini API (optionally with a system instruction and a downloaded audio).
+        
+        With resposta_json the model is asked for a JSON response, which is streamed
+        and cut at the end of the object when GEMINI_STREAMING is on.
+        """
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "x-goog-api-key": GEMINI_API_KEY
+            configuracao = {
+                "temperature": temperature,
+                "maxOutputTokens": max_tokens,
+                "topP": 0.8,
+                "topK": 40
             }
+            if resposta_json:
+                configuracao["responseMimeType"] = "application/json"
             
             payload = {
                 "contents": [
                     {
                         "parts": [
-                            {"text": prompt}
+                            *([{"text": prompt}] if prompt else []),
+                            *([AudioHelper.gemini_part(audio)] if audio else [])
                         ]
                     }
                 ],
-                "generationConfig": {
-                    "temperature": temperature,
-                    "maxOutputTokens": max_tokens,
-                    "topP": 0.8,
-                    "topK": 40
-                }
+                "generationConfig": configuracao
             }
+            if instrucao:
+                payload["systemInstruction"] = {"parts": [{"text": instrucao}]}
             
-            response = requests.post(GEMINI_URL, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
+            body = AudioHelper.serialize_payload(payload, audio)
+            if resposta_json and GEMINI_STREAMING:
+                result = self.client.generate(body, timeout, stream_json=True)
+            else:
+                result = self.client.generate(body, timeout)
             
-            if 'candidates' in result and len(result['candidates']) > 0:
-                candidate = result['candidates'][0]
-                if 'content' in candidate and 'parts' in candidate['content']:
-                    return candidate['content']['parts'][0]['text'].strip()
-            
-            return None
+            return GeminiClient.extract_text(result)
             
         except requests.exceptions.RequestException as error:
             logger.error(f'Error calling Gemini API: {str(error)}')
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import logging
+from config.settings import INSIGHT_CACHE_SIZE, INSIGHT_CACHE_TTL, INSIGHT_CACHE_SHARED
+from services.aggregation_service import AggregationService
+from utils.lru_cache import LRUCache
+from utils.money_helper import MoneyHelper
+
+logger = logging.getLogger()
+
+# Module scope: survives across warm invocations
+_insights = LRUCache('insight', INSIGHT_CACHE_SIZE, INSIGHT_CACHE_TTL)
+
+class InsightCache:
+    """Cache of AI insights per scope and period, validated by a fingerprint of the prompt inputs"""
+    
+    def __init__(self, cache_repository=None):
+        self.cache_repository = cache_repository
+        
+        if INSIGHT_CACHE_SHARED and self.cache_repository is None:
+            from repositories.cache_repository import CacheRepository
+            self.cache_repository = CacheRepository()
+    
+    def get(self, escopo, periodo, resumo, is_consulta_familia):
+        """Return the cached insight if the aggregated inputs are unchanged"""
+        return self.match(self.fetch(escopo, periodo), resumo, periodo, is_consulta_familia)
+    
+    def fetch(self, escopo, periodo):
+        """Read the stored entry of a scope/period; needs no summary, so it can run alongside the period read"""
+        chave = self._key(escopo, periodo)
+        entrada = _insights.get(chave)
+        
+        if entrada is None and self.cache_repository:
+            entrada = self.cache_repository.get(chave)
+            if entrada is not None:
+                _insights.set(chave, entrada)
+        return entrada
+    
+    def match(self, entrada, resumo, periodo, is_consulta_familia):
+        """Insight of a fetched entry, or None when it was built from other inputs"""
+        if not entrada or entrada.get('fingerprint') != self.fingerprint(resumo, periodo, is_consulta_familia):
+            return None
+        
+        logger.info(f'Insight cache hit: {periodo}')
+        return entrada['insight']
+    
+    def set(self, escopo, periodo, resumo, is_consulta_familia, insight):
+        """Store an insight under the fingerprint of its inputs"""
+        chave = self._key(escopo, periodo)
+        entrada = {'fingerprint': self.fingerprint(resumo, periodo, is_consulta_familia), 'insight': insight}
+        
+        _insights.set(chave, entrada)
+        if self.cache_repository:
+            self.cache_repository.put(chave, entrada, INSIGHT_CACHE_TTL)
+    
+    def invalidate(self, escopos, periodos):
+        """Drop insights of every scope/period a new expense affects"""
+        for escopo in escopos:
+            for periodo in periodos:
+                chave = self._key(escopo, periodo)
+                _insights.delete(chave)
+                if self.cache_repository:
+                    self.cache_repository.delete(chave)
+    
+    @staticmethod
+    def fingerprint(resumo, periodo, is_consulta_familia):
+        """Hash of exactly what _build_insights_prompt sends to Gemini"""
+        dados = {
+            'periodo': periodo,
+            'familia': is_consulta_familia,
+            'count': resumo['count'],
+            'total': resumo['total_centavos'],
+            'categorias': [
+                (categoria, total, quantidade)
+                for categoria, total, quantidade, _ in AggregationService.category_breakdown(resumo)
+            ],
+            'usuarios': [
+                (usuario, total)
+                for usuario, total, _ in AggregationService.user_breakdown(resumo)
+            ] if is_consulta_familia else [],
+            'recentes': [
+                (d.get('categoria', 'outros'), MoneyHelper.item_cents(d), d.get('descricao', '')[:30])
+                for d in resumo['recentes'][-10:]
+            ]
+        }
+        serializado = json.dumps(dados, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _key(escopo, periodo):
+        """Cache key of one scope/period"""
+        return f"insight#{escopo}#{periodo}"
@@ -0,0 +1,94 @@
+import hashlib
+import logging
+from config.settings import INTERPRETATION_CACHE_SIZE, INTERPRETATION_CACHE_TTL, INTERPRETATION_CACHE_SHARED
+from services.local_parser_service import LocalParserService
+from utils.interpretation_helper import InterpretationHelper
+from utils.lru_cache import LRUCache
+from utils.metrics_helper import MetricsHelper
+from utils.text_helper import TextHelper
+
+logger = logging.getLogger()
+
+# Module scope: survives across warm invocations
+_interpretacoes = LRUCache('interpretacao', INTERPRETATION_CACHE_SIZE, INTERPRETATION_CACHE_TTL)
+
+class InterpretationCache:
+    """Cache of interpretations keyed by message template ("uber 35" and "uber 42" share one entry)"""
+    
+    def __init__(self, local_parser=None, cache_repository=None):
+        self.local_parser = local_parser or LocalParserService()
+        self.cache_repository = cache_repository
+        
+        if INTERPRETATION_CACHE_SHARED and self.cache_repository is None:
+            from repositories.cache_repository import CacheRepository
+            self.cache_repository = CacheRepository()
+    
+    def get(self, texto_mensagem):
+        """Get a cached interpretation with the amounts taken from the current message"""
+        chave = self._key(texto_mensagem)
+        interpretacao = _interpretacoes.get(chave)
+        
+        if interpretacao is None and self.cache_repository:
+            interpretacao = self.cache_repository.get(chave)
+            MetricsHelper.increment(f"cache.interpretacao_compartilhado.{'hit' if interpretacao else 'miss'}")
+            if interpretacao is not None:
+                _interpretacoes.set(chave, interpretacao)
+        
+        if interpretacao is None:
+            return None
+        
+        # Entries cached before multi-expense messages have the single-expense fields
+        interpretacao = dict(InterpretationHelper.normalize(interpretacao))
+        if interpretacao.get('tipo') == 'despesa':
+            valores = self._amounts(texto_mensagem)
+            if len(valores) != len(interpretacao['despesas']):
+                return None
+            interpretacao['despesas'] = [
+                {**despesa, 'valor': valor} for despesa, valor in zip(interpretacao['despesas'], valores)
+            ]
+        
+        logger.info(f'Interpretation cache hit: {interpretacao}')
+        return interpretacao
+    
+    def set(self, texto_mensagem, interpretacao):
+        """Cache an interpretation if it generalizes to other amounts of the same template"""
+        tipo = interpretacao.get('tipo')
+        valores = self._amounts(texto_mensagem)
+        
+        if tipo == 'despesa':
+            # Only cache when the amounts in the text are the ones Gemini extracted, in order
+            despesas = InterpretationHelper.expense_items(interpretacao)
+            try:
+                if [float(despesa.get('valor', 0)) for despesa in despesas] != valores:
+                    return
+            except (TypeError, ValueError):
+                return
+            entrada = {campo: valor for campo, valor in interpretacao.items() if campo not in ('valor', 'confianca')}
+            entrada['despesas'] = [
+                {campo: valor for campo, valor in despesa.items() if campo != 'valor'} for despesa in despesas
+            ]
+        elif tipo == 'consulta' and not valores:
+            entrada = dict(interpretacao)
+        else:
+            return
+        
+        chave = self._key(texto_mensagem)
+        _interpretacoes.set(chave, entrada)
+        if self.cache_repository:
+            self.cache_repository.put(chave, entrada, INTERPRETATION_CACHE_TTL)
+    
+    def get_stats(self):
+        """Hit/miss/eviction counters for both tiers"""
+        return {
+            **MetricsHelper.get_counters('cache.interpretacao'),
+            'tamanho': len(_interpretacoes)
+        }
+    
+    def _key(self, texto_mensagem):
+        """Cache key from the normalized, amount-free template"""
+        template = self.local_parser.to_template(texto_mensagem)
+        return 'interpretacao#' + hashlib.sha256(template.encode('utf-8')).hexdigest()[:32]
+    
+    def _amounts(self, texto_mensagem):
+        """Amounts present in the current message"""
+        return self.local_parser.extract_amounts(TextHelper.normalize(texto_mensagem))
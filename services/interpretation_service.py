@@ -0,0 +1,196 @@
+import logging
+import random
+from config.settings import (
+    LOCAL_PARSER_MIN_CONFIDENCE, LOCAL_PARSER_SHADOW_RATE, LOCAL_PARSER_DEGRADED_MIN_CONFIDENCE, AUDIO_ONE_SHOT,
+    VOCABULARY_INDEX
+)
+from services.interpretation_cache import InterpretationCache
+from services.local_parser_service import LocalParserService
+from services.transcription_cache import TranscriptionCache
+from utils.interpretation_helper import InterpretationHelper
+from utils.metrics_helper import MetricsHelper
+from utils.tracing_helper import TracingHelper
+
+logger = logging.getLogger()
+
+class InterpretationService:
+    """Service that interprets messages locally when possible and falls back to Gemini.
+    
+    The Gemini and audio services (and `requests` with them) are only imported
+    when a message actually needs them.
+    """
+    
+    def __init__(self, gemini_service=None, local_parser=None, audio_service=None, vocabulary_index=None):
+        self._gemini_service = gemini_service
+        self._audio_service = audio_service
+        self.local_parser = local_parser or LocalParserService()
+        self.cache = InterpretationCache(self.local_parser)
+        self.transcription_cache = TranscriptionCache()
+        self.vocabulary_index = vocabulary_index
+        if VOCABULARY_INDEX and self.vocabulary_index is None:
+            from services.vocabulary_index import VocabularyIndex
+            self.vocabulary_index = VocabularyIndex()
+    
+    @property
+    def gemini_service(self):
+        """Gemini service, built on first use"""
+        if self._gemini_service is None:
+            from services.gemini_service import GeminiService
+            self._gemini_service = GeminiService()
+        return self._gemini_service
+    
+    @property
+    def audio_service(self):
+        """Audio download/transcription service, built on first use"""
+        if self._audio_service is None:
+            from services.audio_service import AudioService
+            self._audio_service = AudioService(self.gemini_service.client)
+        return self._audio_service
+    
+    def interpret(self, texto_mensagem, usuario=None, familia_id=None):
+        """Interpret a message, calling Gemini only when the local parser is unsure.
+        
+        With the sender (`usuario`, `familia_id`) known, descriptions no keyword matches
+        may be categorized from their learned vocabulary.
+        """
+        MetricsHelper.increment('interpretacao.total')
+        
+        local = self._parse_locally(texto_mensagem, usuario, familia_id)
+        
+        if local and local['confianca'] >= LOCAL_PARSER_MIN_CONFIDENCE:
+            MetricsHelper.increment('interpretacao.local')
+            logger.info(f'Local interpretation: {local}')
+            
+            if random.random() < LOCAL_PARSER_SHADOW_RATE:
+                self._compare(local, self.gemini_service.interpret_message(texto_mensagem))
+            
+            return local
+        
+        cacheada = self.cache.get(texto_mensagem)
+        if cacheada:
+            MetricsHelper.increment('interpretacao.cache')
+            return cacheada
+        
+        # Gemini brownout: do not wait on it, use the best local guess
+        if not self.gemini_service.is_available():
+            return self._degraded(local)
+        
+        MetricsHelper.increment('interpretacao.gemini')
+        interpretacao = self.gemini_service.interpret_message(texto_mensagem)
+        
+        if interpretacao.get('fallback'):
+            return self._degraded(local)
+        
+        if interpretacao.get('tipo') != 'ajuda':
+            self.cache.set(texto_mensagem, interpretacao)
+        
+        if local:
+            self._compare(local, interpretacao)
+        
+        return interpretacao
+    
+    def fetch_audio(self, media_url):
+        """Cached transcription of a known media, or the downloaded audio: (texto, audio)"""
+        MetricsHelper.increment('transcricao.consultas')
+        
+        # Known media (Twilio retry): skip the download and the transcription
+        texto = self.transcription_cache.get_by_media(media_url)
+        if texto:
+            return texto, None
+        
+        with TracingHelper.span('download'):
+            return None, self.audio_service.download_audio(media_url)
+    
+    def interpret_audio(self, media_url, obtido=None, usuario=None, familia_id=None):
+        """Transcribe and interpret a voice note; returns (texto, interpretacao) or (None, None).
+        
+        `obtido` is the fetch_audio result when the caller already fetched it
+        alongside other reads.
+        """
+        texto, audio = obtido or self.fetch_audio(media_url)
+        if texto:
+            return texto, self.interpret(texto, usuario, familia_id)
+        if not audio:
+            return None, None
+        
+        # Same audio under a new SID (forwarded voice note): skip the transcription
+        texto = self.transcription_cache.get_by_hash(media_url, audio)
+        if texto:
+            return texto, self.interpret(texto, usuario, familia_id)
+        
+        if AUDIO_ONE_SHOT:
+            with TracingHelper.span('transcricao'):
+                interpretacao = self.gemini_service.interpret_audio(audio)
+            if interpretacao:
+                MetricsHelper.increment('interpretacao.audio_unico')
+                texto = interpretacao.pop('transcricao').strip()
+                self.transcription_cache.set(media_url, audio, texto)
+                return texto, interpretacao
+        
+        # Two-step path: transcribe, then interpret the transcript as text
+        MetricsHelper.increment('interpretacao.audio_duas_etapas')
+        with TracingHelper.span('transcricao'):
+            texto = self.audio_service.transcribe(audio)
+        if not texto:
+            return None, None
+        self.transcription_cache.set(media_url, audio, texto)
+        return texto, self.interpret(texto, usuario, familia_id)
+    
+    def get_stats(self):
+        """Hit rate of the local parser and how often it agrees with Gemini"""
+        return {
+            'total': MetricsHelper.get('interpretacao.total'),
+            'taxa_local': MetricsHelper.ratio('interpretacao.local', 'interpretacao.total'),
+            'taxa_cache': MetricsHelper.ratio('interpretacao.cache', 'interpretacao.total'),
+            'precisao_local': MetricsHelper.ratio('interpretacao.comparacao.concordou', 'interpretacao.comparacao.total')
+        }
+    
+    def _degraded(self, local):
+        """Interpretation used while Gemini is unavailable"""
+        MetricsHelper.increment('interpretacao.degradado')
+        if local and local['confianca'] >= LOCAL_PARSER_DEGRADED_MIN_CONFIDENCE:
+            logger.warning(f'Gemini unavailable, using local interpretation: {local}')
+            return local
+        return {"tipo": "ajuda"}
+    
+    def _parse_locally(self, texto_mensagem, usuario=None, familia_id=None):
+        """Run the local parser without ever breaking the request"""
+        classificar = None
+        if self.vocabulary_index and usuario:
+            classificar = lambda descricao: self.vocabulary_index.classify(descricao, usuario, familia_id)
+        
+        try:
+            return self.local_parser.parse(texto_mensagem, classificar)
+        except Exception as error:
+            logger.error(f'Error in local parser: {str(error)}')
+            return None
+    
+    def _compare(self, local, interpretacao):
+        """Record whether the local guess matches Gemini's interpretation"""
+        campos = {
+            'consulta': ('tipo', 'periodo', 'escopo', 'mes_especifico')
+        }.get(interpretacao.get('tipo'), ('tipo',))
+        
+        concordou = all(self._same(local.get(campo), interpretacao.get(campo)) for campo in campos)
+        if concordou and interpretacao.get('tipo') == 'despesa':
+            # Same expenses, in the same order, with the same amounts and categories
+            locais = InterpretationHelper.expense_items(local)
+            remotas = InterpretationHelper.expense_items(interpretacao)
+            concordou = len(locais) == len(remotas) and all(
+                self._same(a.get('valor'), b.get('valor')) and a.get('categoria') == b.get('categoria')
+                for a, b in zip(locais, remotas)
+            )
+        
+        MetricsHelper.increment('interpretacao.comparacao.total')
+        MetricsHelper.increment(f"interpretacao.comparacao.{'concordou' if concordou else 'discordou'}")
+        
+        if not concordou:
+            logger.info(f'Local parser disagreed with Gemini: local={local} gemini={interpretacao}')
+    
+    @staticmethod
+    def _same(a, b):
+        """Compare interpretation fields, tolerating int/float/str amounts"""
+        try:
+            return float(a) == float(b)
+        except (TypeError, ValueError):
+            return a == b
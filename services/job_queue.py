@@ -0,0 +1,50 @@
+import json
+import logging
+from config.settings import JOB_QUEUE_BACKEND, SQS_QUEUE_URL
+
+logger = logging.getLogger()
+
+class JobQueue:
+    """Interface for queues that hand deferred jobs to the worker"""
+    
+    def enqueue(self, job):
+        """Enqueue a JSON-serializable job"""
+        raise NotImplementedError
+
+
+class SqsJobQueue(JobQueue):
+    """Job queue backed by Amazon SQS (the worker Lambda is subscribed to it)"""
+    
+    def __init__(self, queue_url=SQS_QUEUE_URL):
+        import boto3
+        self.queue_url = queue_url
+        self.sqs = boto3.client('sqs')
+    
+    def enqueue(self, job):
+        """Send the job as an SQS message"""
+        resultado = self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(job, default=str))
+        logger.info(f"Job enqueued: {resultado.get('MessageId')}")
+        return resultado
+
+
+class InMemoryJobQueue(JobQueue):
+    """Job queue kept in memory, for tests and local runs"""
+    
+    def __init__(self):
+        self.jobs = []
+    
+    def enqueue(self, job):
+        """Store the job (round-tripped through JSON, like SQS would)"""
+        self.jobs.append(json.loads(json.dumps(job, default=str)))
+    
+    def drain(self):
+        """Return and clear every pending job"""
+        jobs, self.jobs = self.jobs, []
+        return jobs
+
+
+def create_job_queue():
+    """Build the queue selected by JOB_QUEUE_BACKEND"""
+    if JOB_QUEUE_BACKEND == 'memory':
+        return InMemoryJobQueue()
+    return SqsJobQueue()
@@ -0,0 +1,342 @@
+import re
+from utils.text_helper import TextHelper
+
+# Number words (accents already stripped)
+NUMEROS_POR_EXTENSO = {
+    'zero': 0, 'um': 1, 'uma': 1, 'dois': 2, 'duas': 2, 'tres': 3, 'quatro': 4,
+    'cinco': 5, 'seis': 6, 'sete': 7, 'oito': 8, 'nove': 9, 'dez': 10,
+    'onze': 11, 'doze': 12, 'treze': 13, 'catorze': 14, 'quatorze': 14, 'quinze': 15,
+    'dezesseis': 16, 'dezessete': 17, 'dezoito': 18, 'dezenove': 19,
+    'vinte': 20, 'trinta': 30, 'quarenta': 40, 'cinquenta': 50, 'sessenta': 60,
+    'setenta': 70, 'oitenta': 80, 'noventa': 90,
+    'cem': 100, 'cento': 100, 'duzentos': 200, 'duzentas': 200, 'trezentos': 300,
+    'trezentas': 300, 'quatrocentos': 400, 'quatrocentas': 400, 'quinhentos': 500,
+    'quinhentas': 500, 'seiscentos': 600, 'setecentos': 700, 'oitocentos': 800,
+    'novecentos': 900
+}
+
+PALAVRAS_MOEDA = {'real', 'reais', 'conto', 'contos', 'pila', 'pilas', 'mangos'}
+
+CATEGORIAS_PALAVRAS = {
+    'alimentacao': [
+        'almoco', 'almocei', 'janta', 'jantar', 'jantei', 'cafe', 'lanche', 'lanchei', 'comida',
+        'restaurante', 'mercado', 'supermercado', 'padaria', 'pizza', 'ifood', 'hamburguer',
+        'acougue', 'feira', 'sorvete', 'marmita', 'refeicao', 'delivery', 'hortifruti', 'pao'
+    ],
+    'transporte': [
+        'uber', 'taxi', 'onibus', 'metro', 'gasolina', 'combustivel', 'estacionamento',
+        'pedagio', 'passagem', 'trem', 'posto', 'etanol', 'corrida', 'cabify', 'brt'
+    ],
+    'saude': [
+        'farmacia', 'remedio', 'remedios', 'medico', 'exame', 'exames', 'dentista', 'hospital',
+        'plano de saude', 'psicologo', 'vacina', 'fisioterapia', 'drogaria'
+    ],
+    'lazer': [
+        'cinema', 'show', 'netflix', 'spotify', 'bar', 'cerveja', 'viagem', 'passeio', 'jogo',
+        'teatro', 'festa', 'balada', 'streaming', 'parque', 'ingresso'
+    ]
+}
+
+MESES = {
+    'janeiro': 1, 'fevereiro': 2, 'marco': 3, 'abril': 4, 'maio': 5, 'junho': 6,
+    'julho': 7, 'agosto': 8, 'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12
+}
+
+VALOR_RE = re.compile(
+    r'(?<![\w/.,])(?:r\$\s*)?(\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?)(?![\d/.,]*\d)'
+    r'(?!\s*(?:h\b|hs\b|hrs?\b|horas?\b|min|%|x\b|km\b|kg\b|anos?\b|dias?\b|vezes\b))'
+)
+DATA_ANTES_RE = re.compile(r'\b(?:dia|as|no dia|numero)\s*$')
+VERBOS_DESPESA_RE = re.compile(
+    r'\b(gastei|gastamos|paguei|pagamos|comprei|compramos|custou|custa|deu|saiu|foi|gasto|despesa|conta)\b'
+)
+CONSULTA_RE = re.compile(
+    r'\bquanto\b.*\b(gastei|gastamos|gastou|gastaram|gasto|gastos|foi)\b'
+    r'|\b(relatorio|resumo|extrato|balanco)\b'
+    r'|\b(meus|nossos|os)? ?gastos (de|do|da|desse|deste|dessa|desta|no|na|em)\b'
+)
+AJUDA_RE = re.compile(
+    r'^(oi+|ola|opa|e ai|ajuda|help|menu|inicio|comandos|como funciona|bom dia|boa tarde|boa noite|obrigad[oa]|valeu)'
+    r'[\s!?.,]*(tudo bem|bot)?[\s!?.,]*$'
+)
+FAMILIA_RE = re.compile(r'\b(familia|gastamos|gastaram|nos|todos|casa|nossos|nossas)\b')
+PERIODO_DESCONHECIDO_RE = re.compile(r'\b(passad[oa]|anterior|ontem|hoje|ano|trimestre|dia \d+)\b')
+# Words of the amount itself, dropped from descriptions wherever they appear
+PALAVRAS_VALOR = {'r$', 'mil', 'centavos'} | set(NUMEROS_POR_EXTENSO) | PALAVRAS_MOEDA
+# Filler words and verbs around the item ('gastei 50 reais no almoço' -> 'almoço'), dropped only at its edges
+PALAVRAS_BORDA = {
+    'de', 'do', 'da', 'dos', 'das', 'no', 'na', 'nos', 'nas', 'em', 'com', 'para', 'pra', 'pro', 'por',
+    'pelo', 'pela', 'o', 'a', 'os', 'as', 'ao', 'e', 'hoje', 'ontem', 'agora', 'so', 'mais', 'quase'
+}
+NUMERO_RE = re.compile(r'(?:r\$)?\d[\d.,]*')
+# Between expenses of one message: ", " (not the decimal comma), ";", line breaks and " e "
+SEPARADOR_RE = re.compile(r'\s*[,;]\s+|\s*;\s*|\s*\n\s*|\s+[eE]\s+')
+
+
+class LocalParserService:
+    """Deterministic Portuguese rule engine that interprets common messages without an LLM"""
+    
+    def parse(self, texto_mensagem, classificar=None):
+        """Interpret a message locally; returns the Gemini-shaped dict plus 'confianca', or None.
+        
+        `classificar(descricao)` is asked for the category of descriptions no keyword
+        matches (the sender's learned vocabulary); it returns a category or None.
+        """
+        texto = TextHelper.normalize(texto_mensagem)
+        if not texto:
+            return None
+        
+        if AJUDA_RE.match(texto):
+            return {'tipo': 'ajuda', 'confianca': 0.95}
+        
+        valores = self.extract_amounts(texto)
+        
+        if CONSULTA_RE.search(texto) and not valores:
+            return self._parse_query(texto)
+        
+        if valores:
+            return self._parse_expense(texto_mensagem, texto, valores, classificar)
+        
+        return None
+    
+    def extract_amounts(self, texto):
+        """Extract every amount in a normalized message (digits, R$ and number words)"""
+        valores = []
+        
+        for match in VALOR_RE.finditer(texto):
+            if DATA_ANTES_RE.search(texto[:match.start()]):
+                continue
+            valores.append(self._parse_number(match.group(1)))
+        
+        valores.extend(self._extract_written_amounts(texto))
+        return [valor for valor in valores if valor > 0]
+    
+    def to_template(self, texto_mensagem):
+        """Normalized text with numeric amounts replaced by a placeholder ('uber <valor>')"""
+        texto = TextHelper.normalize(texto_mensagem)
+        partes = []
+        ultimo = 0
+        
+        for match in VALOR_RE.finditer(texto):
+            if DATA_ANTES_RE.search(texto[:match.start()]):
+                continue
+            partes.append(texto[ultimo:match.start()])
+            partes.append('<valor>')
+            ultimo = match.end()
+        
+        partes.append(texto[ultimo:])
+        return ''.join(partes)
+    
+    def _parse_expense(self, texto_original, texto, valores, classificar=None):
+        """Build an expense interpretation and score how sure we are"""
+        if len(valores) > 1:
+            multiplas = self._parse_expenses(texto_original, len(valores), classificar)
+            if multiplas:
+                return multiplas
+        
+        categoria = self._match_category(texto, classificar)
+        tem_verbo = bool(VERBOS_DESPESA_RE.search(texto))
+        
+        if len(valores) > 1:
+            confianca = 0.2
+        elif categoria:
+            confianca = 0.9 if tem_verbo or len(texto.split()) <= 4 else 0.8
+        elif tem_verbo:
+            confianca = 0.5
+        else:
+            confianca = 0.3
+        
+        return {
+            'tipo': 'despesa',
+            'despesas': [{
+                'valor': valores[0],
+                'categoria': categoria or 'outros',
+                'descricao': self._describe(texto_original)
+            }],
+            'confianca': confianca
+        }
+    
+    def _parse_expenses(self, texto_original, quantidade, classificar=None):
+        """One expense per piece of '50 no almoço, 30 de uber e 120 no mercado', or None"""
+        despesas = []
+        inicio_pendente = None
+        juntou = False
+        
+        for inicio, fim in self._split_pieces(texto_original):
+            valores = self.extract_amounts(TextHelper.normalize(texto_original[inicio:fim]))
+            if len(valores) > 1:
+                return None
+            if not valores:
+                # Text without an amount ("almoço e sobremesa 50") belongs to the next piece
+                inicio_pendente = inicio if inicio_pendente is None else inicio_pendente
+                juntou = True
+                continue
+            
+            descricao = texto_original[inicio if inicio_pendente is None else inicio_pendente:fim]
+            despesas.append({
+                'valor': valores[0],
+                'categoria': self._match_category(TextHelper.normalize(descricao), classificar),
+                'descricao': self._describe(descricao)
+            })
+            inicio_pendente = None
+        
+        if len(despesas) != quantidade:
+            return None
+        
+        # Every piece must name its category; guesses go to Gemini
+        confianca = 0.85 if not juntou and all(despesa['categoria'] for despesa in despesas) else 0.4
+        for despesa in despesas:
+            despesa['categoria'] = despesa['categoria'] or 'outros'
+        
+        return {'tipo': 'despesa', 'despesas': despesas, 'confianca': confianca}
+    
+    def _split_pieces(self, texto_original):
+        """(start, end) spans of a message split on expense separators.
+        
+        " e " inside a written amount ('quarenta e cinco', 'vinte reais e cinquenta centavos')
+        is not a separator.
+        """
+        pedacos = []
+        inicio = 0
+        
+        for separador in SEPARADOR_RE.finditer(texto_original):
+            if separador.group().strip() in ('e', 'E'):
+                anterior = TextHelper.normalize(texto_original[max(0, separador.start() - 20):separador.start()])
+                seguinte = TextHelper.normalize(texto_original[separador.end():separador.end() + 20])
+                anterior = anterior.split(' ')[-1]
+                seguinte = seguinte.split(' ')[0]
+                if ((seguinte in NUMEROS_POR_EXTENSO or seguinte == 'mil')
+                        and (anterior in NUMEROS_POR_EXTENSO or anterior in PALAVRAS_MOEDA or anterior == 'mil')):
+                    continue
+            pedacos.append((inicio, separador.start()))
+            inicio = separador.end()
+        
+        pedacos.append((inicio, len(texto_original)))
+        return [(inicio, fim) for inicio, fim in pedacos if texto_original[inicio:fim].strip()]
+    
+    def _parse_query(self, texto):
+        """Build a report interpretation (period, scope and month)"""
+        escopo = 'familiar' if FAMILIA_RE.search(texto) else 'individual'
+        mes_especifico = next((numero for nome, numero in MESES.items() if re.search(rf'\b{nome}\b', texto)), None)
+        
+        if mes_especifico:
+            periodo = 'mes_especifico'
+            confianca = 0.9
+        elif re.search(r'\bsemana\b', texto):
+            periodo = 'semana_atual'
+            confianca = 0.9
+        elif re.search(r'\bmes\b', texto):
+            periodo = 'mes_atual'
+            confianca = 0.9
+        else:
+            periodo = 'mes_atual'
+            confianca = 0.8
+        
+        # Periods we do not support locally ("mês passado", "ontem") go to Gemini
+        if PERIODO_DESCONHECIDO_RE.search(texto):
+            confianca = 0.3
+        
+        return {
+            'tipo': 'consulta',
+            'periodo': periodo,
+            'escopo': escopo,
+            'mes_especifico': mes_especifico,
+            'confianca': confianca
+        }
+    
+    def _describe(self, texto_original):
+        """Item phrase of an expense text, without its amount, currency and surrounding filler"""
+        palavras = [
+            palavra for palavra in texto_original.split()
+            if not self._is_amount_word(TextHelper.normalize(palavra).strip('.,!?;:'))
+        ]
+        borda = lambda palavra: self._is_edge_word(TextHelper.normalize(palavra).strip('.,!?;:'))
+        while palavras and borda(palavras[0]):
+            palavras.pop(0)
+        while palavras and borda(palavras[-1]):
+            palavras.pop()
+        
+        # Nothing but the amount ('50 reais'): keep the message as sent
+        descricao = ' '.join(palavras).strip('.,!?;: ') or texto_original.strip()
+        return descricao[:100]
+    
+    @staticmethod
+    def _is_amount_word(palavra):
+        return palavra in PALAVRAS_VALOR or bool(NUMERO_RE.fullmatch(palavra))
+    
+    @staticmethod
+    def _is_edge_word(palavra):
+        # 'conta' names the item ('conta de luz') more often than it is filler
+        if not palavra or palavra in PALAVRAS_BORDA:
+            return True
+        return palavra != 'conta' and bool(VERBOS_DESPESA_RE.fullmatch(palavra))
+    
+    def _match_category(self, texto, classificar=None):
+        """Find the category of the first keyword present in the message, else ask `classificar`"""
+        for categoria, palavras in CATEGORIAS_PALAVRAS.items():
+            for palavra in palavras:
+                if re.search(rf'\b{palavra}\b', texto):
+                    return categoria
+        return classificar(texto) if classificar else None
+    
+    def _parse_number(self, numero):
+        """Parse '25', '25,90', '25.90' and '1.200,50' into a float"""
+        if ',' in numero:
+            return float(numero.replace('.', '').replace(',', '.'))
+        if re.fullmatch(r'\d{1,3}(?:\.\d{3})+', numero):
+            return float(numero.replace('.', ''))
+        return float(numero)
+    
+    def _extract_written_amounts(self, texto):
+        """Extract amounts written out ('cinquenta reais', 'quarenta e cinco')"""
+        palavras = texto.split()
+        valores = []
+        i = 0
+        
+        while i < len(palavras):
+            if palavras[i] not in NUMEROS_POR_EXTENSO and palavras[i] != 'mil':
+                i += 1
+                continue
+            
+            valor, fim = self._read_number_words(palavras, i)
+            seguido_de_moeda = fim < len(palavras) and palavras[fim] in PALAVRAS_MOEDA
+            
+            # A lone "um"/"uma" is usually an article ("uma pizza"), not an amount
+            if fim - i == 1 and palavras[i] in ('um', 'uma') and not seguido_de_moeda:
+                i = fim
+                continue
+            
+            # "vinte reais e cinquenta centavos"
+            if seguido_de_moeda and fim + 2 < len(palavras) and palavras[fim + 1] == 'e':
+                centavos, fim_centavos = self._read_number_words(palavras, fim + 2)
+                if fim_centavos < len(palavras) and palavras[fim_centavos] == 'centavos':
+                    valor += centavos / 100
+                    fim = fim_centavos
+            
+            valores.append(valor)
+            i = fim + 1
+        
+        return valores
+    
+    def _read_number_words(self, palavras, inicio):
+        """Read a run of number words joined by 'e'; returns (value, index after the run)"""
+        total = 0
+        atual = 0
+        i = inicio
+        
+        while i < len(palavras):
+            palavra = palavras[i]
+            if palavra in NUMEROS_POR_EXTENSO:
+                atual += NUMEROS_POR_EXTENSO[palavra]
+            elif palavra == 'mil':
+                total += (atual or 1) * 1000
+                atual = 0
+            elif (palavra == 'e' and i + 1 < len(palavras)
+                  and (palavras[i + 1] in NUMEROS_POR_EXTENSO or palavras[i + 1] == 'mil')
+                  and i > inicio):
+                pass
+            else:
+                break
+            i += 1
+        
+        return float(total + atual), i
@@ -0,0 +1,52 @@
+import logging
+from config.settings import (
+    MESSAGE_SENDER_BACKEND, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_NUMBER, TWILIO_MESSAGES_URL
+)
+
+logger = logging.getLogger()
+
+class MessageSender:
+    """Interface for sending WhatsApp messages outside of a webhook reply"""
+    
+    def send(self, destino, mensagem):
+        """Send a message to a WhatsApp address (whatsapp:+55...)"""
+        raise NotImplementedError
+
+
+class TwilioMessageSender(MessageSender):
+    """Sender that uses the Twilio REST API"""
+    
+    def send(self, destino, mensagem):
+        """Create a Twilio message"""
+        from utils.http_helper import HttpHelper
+        
+        response = HttpHelper.get_session().post(
+            TWILIO_MESSAGES_URL.format(account_sid=TWILIO_ACCOUNT_SID),
+            auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+            data={'From': TWILIO_WHATSAPP_NUMBER, 'To': destino, 'Body': mensagem},
+            timeout=15
+        )
+        response.raise_for_status()
+        
+        sid = response.json().get('sid')
+        logger.info(f'Message sent to {destino}: {sid}')
+        return sid
+
+
+class InMemoryMessageSender(MessageSender):
+    """Sender that records messages in memory, for tests and local runs"""
+    
+    def __init__(self):
+        self.enviadas = []
+    
+    def send(self, destino, mensagem):
+        """Record the message"""
+        self.enviadas.append({'destino': destino, 'mensagem': mensagem})
+        return f"memoria-{len(self.enviadas)}"
+
+
+def create_message_sender():
+    """Build the sender selected by MESSAGE_SENDER_BACKEND"""
+    if MESSAGE_SENDER_BACKEND == 'memory':
+        return InMemoryMessageSender()
+    return TwilioMessageSender()
@@ -0,0 +1,38 @@
+import logging
+from config.settings import PRECOMPUTED_REPORT_TTL
+from repositories.cache_repository import CacheRepository
+
+logger = logging.getLogger()
+
+class PrecomputedReportCache:
+    """Reports built ahead of time by the precompute job, stored with the moment their data ends"""
+    
+    def __init__(self, cache_repository=None):
+        self.cache_repository = cache_repository or CacheRepository()
+    
+    def get(self, escopo, periodo_info, inicio_data):
+        """Precomputed entry for this period, or None (missing, or from an earlier week/month)"""
+        entrada = self.cache_repository.get(self._key(escopo, periodo_info))
+        if not entrada or entrada.get('inicio') != inicio_data:
+            return None
+        logger.info(f"Precomputed report hit: {escopo} {periodo_info} up to {entrada['calculado_ate']}")
+        return entrada
+    
+    def set(self, escopo, periodo_info, inicio_data, calculado_ate, corte, vistas, resumo, insight):
+        """Store a summary covering [inicio_data, calculado_ate] and its insight.
+        
+        `vistas` are the (user_id, timestamp) keys it counted after `corte`: readers
+        re-read from there and skip them, catching expenses saved after the job ran.
+        """
+        self.cache_repository.put(self._key(escopo, periodo_info), {
+            'inicio': inicio_data,
+            'calculado_ate': calculado_ate,
+            'corte': corte,
+            'vistas': vistas,
+            'resumo': resumo,
+            'insight': insight
+        }, PRECOMPUTED_REPORT_TTL)
+    
+    @staticmethod
+    def _key(escopo, periodo_info):
+        return f'relatorio#{escopo}#{periodo_info}'
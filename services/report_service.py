@@ -1,20 +1,40 @@
 import logging
 from datetime import datetime, timedelta
-from repositories.expense_repository import ExpenseRepository
+from config.settings import PRECOMPUTED_OVERLAP_SECONDS, PRECOMPUTED_REPORTS
+from repositories.expense_repository import create_expense_repository
+from repositories.family_repository import create_family_repository
+from repositories.rollup_repository import RollupRepository
+from services.aggregation_service import AggregationService
 from services.gemini_service import GeminiService
+from services.insight_cache import InsightCache
+from services.precomputed_report_cache import PrecomputedReportCache
+from utils.concurrency_helper import ConcurrencyHelper
 from utils.date_helper import DateHelper
+from utils.money_helper import MoneyHelper
+from utils.tracing_helper import TracingHelper
 
 logger = logging.getLogger()
 
 class ReportService:
     """Service to handle expense reports and queries"""
     
-    def __init__(self):
-        self.repository = ExpenseRepository()
-        self.gemini_service = GeminiService()
+    # Periods the precompute job builds ahead of time
+    PERIODOS_PRECALCULADOS = ('semana_atual', 'mes_atual')
+    
+    def __init__(self, gemini_service=None, repository=None, family_repository=None, precomputed_cache=None):
+        self.repository = repository or create_expense_repository()
+        self.family_repository = family_repository or create_family_repository()
+        # Stores that aggregate with SQL need no rollup table
+        self.rollup_repository = None if self.repository.native_aggregation else RollupRepository()
+        self.gemini_service = gemini_service or GeminiService()
+        self.aggregation_service = AggregationService()
+        self.insight_cache = InsightCache()
+        self.precomputed_cache = precomputed_cache
+        if PRECOMPUTED_REPORTS and self.precomputed_cache is None:
+            self.precomputed_cache = PrecomputedReportCache()
         self.date_helper = DateHelper()
     
-    def process_query(self, texto, nome_usuario, interpretacao):
+    def process_query(self, texto, nome_usuario, interpretacao, whatsapp_from=None):
         """Process queries using Gemini interpretation"""
         agora = datetime.now()
         
@@ -26,13 +46,18 @@ class ReportService:
         # Determine if it's personal or family query
         is_consulta_familia = interpretacao.get('escopo', 'individual') == 'familiar'
         
-        # Search expenses
-        despesas = self.repository.search_expenses(
-            inicio_data, fim_data, 
-            None if is_consulta_familia else nome_usuario
-        )
+        usuario = None if is_consulta_familia else nome_usuario
+        familia_id = self.family_repository.get_family_id(whatsapp_from)
+        escopo = self._get_scope(usuario, familia_id)
+        
+        # The period read and the stored insight do not depend on each other: read both at once
+        leituras = ConcurrencyHelper.run_parallel({
+            'resumo': lambda: self._read_summary(escopo, periodo_info, inicio_data, fim_data, usuario, familia_id),
+            'insight': lambda: self.insight_cache.fetch(escopo, periodo)
+        })
+        resumo, insight = leituras['resumo']
         
-        if not despesas:
+        if not resumo['count']:
             return f"""{titulo}
 
 ❌ Nenhuma despesa encontrada neste período.
@@ -40,12 +65,17 @@ class ReportService:
 💡 *Dica:* Registre gastos por texto ou áudio: "gastei 50 reais no almoço" """
         
         # Generate basic report
-        relatorio_basico = self._generate_report(despesas, titulo, is_consulta_familia)
+        with TracingHelper.span('relatorio'):
+            relatorio_basico = self._generate_report(resumo, titulo, is_consulta_familia)
         
-        # Generate insight with AI
-        insight = self.gemini_service.generate_insights(
-            despesas, titulo, is_consulta_familia, periodo
-        )
+        # Generate insight with AI (reused while the period's data is unchanged)
+        if insight is None:
+            with TracingHelper.span('insight'):
+                insight = self._get_insight(escopo, resumo, titulo, is_consulta_familia, periodo, leituras['insight'])
+        
+        # Degraded mode: Gemini is unavailable, send the report without the insight
+        if insight is None:
+            return relatorio_basico
         
         # Combine report with insight
         return f"""{relatorio_basico}
@@ -53,6 +83,138 @@ class ReportService:
 🤖 *Insight Inteligente (IA Gemini):*
 {insight}"""
     
+    def precompute(self, usuario, familia_id, periodo_info, agora=None):
+        """Build and store one scope's report for a current period; returns False when it has no expenses"""
+        if self.precomputed_cache is None:
+            raise ValueError('precompute needs a precomputed_cache (PRECOMPUTED_REPORTS is off)')
+        
+        agora = agora or datetime.now()
+        _, inicio_data, fim_data, titulo, periodo = self._get_period_info({'periodo': periodo_info}, agora)
+        escopo = self._get_scope(usuario, familia_id)
+        
+        # Exact up to the cut (rollup rows cover whole days); the last PRECOMPUTED_OVERLAP_SECONDS
+        # are read as expenses so readers can tell which of them were already counted
+        sobreposicao = datetime.fromisoformat(fim_data) - timedelta(seconds=PRECOMPUTED_OVERLAP_SECONDS)
+        corte = max(inicio_data, sobreposicao.isoformat())
+        if self.repository.native_aggregation:
+            resumo = self.repository.summarize(
+                inicio_data, corte, usuario, self.aggregation_service.ultimos, familia_id
+            )
+        else:
+            despesas = self.repository.iter_expenses(inicio_data, corte, usuario, familia_id)
+            resumo = self.aggregation_service.aggregate(despesas, incluir_usuarios=usuario is None)
+        
+        cauda = list(self.repository.iter_expenses(self._next_timestamp(corte), fim_data, usuario, familia_id))
+        resumo = self.aggregation_service.merge(
+            resumo, self.aggregation_service.aggregate(cauda, incluir_usuarios=usuario is None)
+        )
+        if not resumo['count']:
+            return False
+        
+        entrada = self.insight_cache.fetch(escopo, periodo)
+        insight = self._get_insight(escopo, resumo, titulo, usuario is None, periodo, entrada)
+        vistas = [(despesa['user_id'], despesa['timestamp']) for despesa in cauda]
+        self.precomputed_cache.set(escopo, periodo_info, inicio_data, fim_data, corte, vistas, resumo, insight)
+        return True
+    
+    def _read_summary(self, escopo, periodo_info, inicio_data, fim_data, usuario, familia_id):
+        """(summary, insight): precomputed report plus newer expenses, else pre-aggregated totals or raw expenses"""
+        if self.precomputed_cache and periodo_info in self.PERIODOS_PRECALCULADOS:
+            resumo, insight = self._get_precomputed(escopo, periodo_info, inicio_data, fim_data, usuario, familia_id)
+            if resumo is not None:
+                return resumo, insight
+        return self._get_summary(escopo, inicio_data, fim_data, usuario, familia_id), None
+    
+    def _get_precomputed(self, escopo, periodo_info, inicio_data, fim_data, usuario, familia_id):
+        """(summary, insight) from the precomputed report and the expenses it did not count, or (None, None)"""
+        with TracingHelper.span('dynamodb_leitura'):
+            entrada = self.precomputed_cache.get(escopo, periodo_info, inicio_data)
+        if entrada is None:
+            return None, None
+        
+        try:
+            with TracingHelper.span('agregacao'):
+                # Re-read the overlap: an expense saved after the job may carry an earlier timestamp
+                vistas = {tuple(chave) for chave in entrada.get('vistas', [])}
+                despesas = (
+                    despesa for despesa in self.repository.iter_expenses(
+                        self._next_timestamp(entrada.get('corte', entrada['calculado_ate'])), fim_data, usuario, familia_id
+                    )
+                    if (despesa['user_id'], despesa['timestamp']) not in vistas
+                )
+                posterior = self.aggregation_service.aggregate(despesas, incluir_usuarios=usuario is None)
+        except Exception as error:
+            logger.error(f'Error reading expenses after precomputed report: {str(error)}')
+            return None, None
+        
+        # The stored insight only describes the stored summary
+        if posterior['count']:
+            return self.aggregation_service.merge(entrada['resumo'], posterior), None
+        return entrada['resumo'], entrada['insight']
+    
+    @staticmethod
+    def _next_timestamp(timestamp):
+        """Smallest timestamp after this one (they are microsecond isoformat strings)"""
+        return (datetime.fromisoformat(timestamp) + timedelta(microseconds=1)).isoformat()
+    
+    def _get_scope(self, usuario, familia_id):
+        """Rollup/cache scope of an individual or family query"""
+        if usuario:
+            return RollupRepository.user_scope(usuario)
+        return RollupRepository.family_scope(familia_id)
+    
+    def _get_insight(self, escopo, resumo, titulo, is_consulta_familia, periodo, entrada):
+        """Get the AI insight from the fetched cache entry, or generate and cache it (None while Gemini is unavailable)"""
+        insight = self.insight_cache.match(entrada, resumo, periodo, is_consulta_familia)
+        if insight:
+            return insight
+        
+        if not self.gemini_service.is_available():
+            return None
+        
+        insight = self.gemini_service.generate_insights(resumo, titulo, is_consulta_familia, periodo)
+        if insight != self.gemini_service.INSIGHT_PADRAO:
+            self.insight_cache.set(escopo, periodo, resumo, is_consulta_familia, insight)
+        return insight
+    
+    def _get_summary(self, escopo, inicio_data, fim_data, usuario, familia_id):
+        """Get period totals from the store, from rollups, or by aggregating raw expenses"""
+        if self.repository.native_aggregation:
+            try:
+                with TracingHelper.span('agregacao'):
+                    return self.repository.summarize(
+                        inicio_data, fim_data, usuario, self.aggregation_service.ultimos, familia_id
+                    )
+            except Exception as error:
+                logger.error(f'Error summarizing expenses: {str(error)}')
+                return self.aggregation_service.empty_summary()
+        
+        try:
+            # Rollup rows and the latest items come from different tables: query both at once
+            with TracingHelper.span('dynamodb_leitura'):
+                leituras = ConcurrencyHelper.run_parallel({
+                    'resumo': lambda: self.rollup_repository.get_summary(escopo, inicio_data, fim_data),
+                    'recentes': lambda: self.repository.get_recent_expenses(
+                        inicio_data, fim_data, usuario, self.aggregation_service.ultimos, familia_id
+                    )
+                })
+            resumo = leituras['resumo']
+            # None: no rollup version is active yet, so only the raw expenses are complete
+            if resumo is not None:
+                resumo['recentes'] = leituras['recentes']
+                return resumo
+        except Exception as error:
+            logger.error(f'Error reading rollups: {str(error)}')
+        
+        try:
+            # Reads are streamed into the aggregation, so this span covers both
+            with TracingHelper.span('agregacao'):
+                despesas = self.repository.iter_expenses(inicio_data, fim_data, usuario, familia_id)
+                return self.aggregation_service.aggregate(despesas, incluir_usuarios=usuario is None)
+        except Exception as error:
+            logger.error(f'Error searching expenses: {str(error)}')
+            return self.aggregation_service.empty_summary()
+    
     def _get_period_info(self, interpretacao, agora):
         """Get period information based on interpretation"""
         periodo_info = interpretacao.get('periodo', 'mes_atual')
@@ -75,39 +237,20 @@ class ReportService:
             inicio_data = inicio_mes.isoformat()
             fim_data = fim_mes.isoformat()
             titulo = f"📅 *Relatório de {self.date_helper.get_month_name(mes - 1)}*"
-            periodo = f"mês de {self.date_helper.get_month_name(mes - 1).lower()}"
+            periodo = self.date_helper.get_month_period(mes)
         
         else:  # mes_atual (default)
             inicio_mes = agora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
             inicio_data = inicio_mes.isoformat()
             fim_data = agora.isoformat()
             titulo = f"📅 *Relatório de {self.date_helper.get_month_name(agora.month - 1)}*"
-            periodo = f"mês de {self.date_helper.get_month_name(agora.month - 1).lower()}"
+            periodo = self.date_helper.get_month_period(agora.month)
         
         return periodo_info, inicio_data, fim_data, titulo, periodo
     
-    def _generate_report(self, despesas, titulo, is_consulta_familia):
+    def _generate_report(self, resumo, titulo, is_consulta_familia):
         """Generate formatted report"""
-        # Calculate totals
-        total_geral = sum(float(item.get('valor', 0)) for item in despesas)
-        
-        # Group by category
-        por_categoria = {}
-        for despesa in despesas:
-            cat = despesa.get('categoria', 'outros')
-            if cat not in por_categoria:
-                por_categoria[cat] = {'total': 0, 'count': 0}
-            por_categoria[cat]['total'] += float(despesa.get('valor', 0))
-            por_categoria[cat]['count'] += 1
-        
-        # Group by user (if family query)
-        por_usuario = {}
-        if is_consulta_familia:
-            for despesa in despesas:
-                user = despesa.get('user_id', 'desconhecido')
-                if user not in por_usuario:
-                    por_usuario[user] = 0
-                por_usuario[user] += float(despesa.get('valor', 0))
+        total_geral = resumo['total_centavos']
         
         emojis = {
             'alimentacao': '🍽️',
@@ -120,21 +263,19 @@ class ReportService:
         relatorio = f"{titulo}\n\n"
         
         # General total
-        relatorio += f"💰 *Total:* R$ {total_geral:.2f}\n"
-        relatorio += f"📊 *{len(despesas)} despesas registradas*\n\n"
+        relatorio += f"💰 *Total:* R$ {MoneyHelper.format(total_geral)}\n"
+        relatorio += f"📊 *{resumo['count']} despesas registradas*\n\n"
         
         # By category
         relatorio += "📋 *Por Categoria:*\n"
-        for categoria, dados in sorted(por_categoria.items(), key=lambda x: x[1]['total'], reverse=True):
+        for categoria, total, _, porcentagem in self.aggregation_service.category_breakdown(resumo):
             emoji = emojis.get(categoria, '📝')
-            porcentagem = (dados['total'] / total_geral * 100) if total_geral > 0 else 0
-            relatorio += f"{emoji} {categoria}: R$ {dados['total']:.2f} ({porcentagem:.1f}%)\n"
+            relatorio += f"{emoji} {categoria}: R$ {MoneyHelper.format(total)} ({porcentagem:.1f}%)\n"
         
         # By user (if family)
-        if is_consulta_familia and len(por_usuario) > 1:
+        if is_consulta_familia and len(resumo['por_usuario']) > 1:
             relatorio += "\n👥 *Por Pessoa:*\n"
-            for usuario, total in sorted(por_usuario.items(), key=lambda x: x[1], reverse=True):
-                porcentagem = (total / total_geral * 100) if total_geral > 0 else 0
-                relatorio += f"• {usuario}: R$ {total:.2f} ({porcentagem:.1f}%)\n"
+            for usuario, total, porcentagem in self.aggregation_service.user_breakdown(resumo):
+                relatorio += f"• {usuario}: R$ {MoneyHelper.format(total)} ({porcentagem:.1f}%)\n"
         
-        return relatorio
\ No newline at end of file
+        return relatorio
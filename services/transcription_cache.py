@@ -0,0 +1,91 @@
+import logging
+import re
+from config.settings import TRANSCRIPTION_CACHE_SIZE, TRANSCRIPTION_CACHE_TTL, TRANSCRIPTION_CACHE_SHARED
+from utils.lru_cache import LRUCache
+from utils.metrics_helper import MetricsHelper
+
+logger = logging.getLogger()
+
+# Module scope: survives across warm invocations
+_transcricoes = LRUCache('transcricao', TRANSCRIPTION_CACHE_SIZE, TRANSCRIPTION_CACHE_TTL)
+
+MEDIA_SID_RE = re.compile(r'/Media/(ME[0-9a-fA-F]{32})')
+
+class TranscriptionCache:
+    """Cache of voice-note transcriptions keyed by Twilio media SID and by audio content hash"""
+    
+    def __init__(self, cache_repository=None):
+        self.cache_repository = cache_repository
+        
+        if TRANSCRIPTION_CACHE_SHARED and self.cache_repository is None:
+            from repositories.cache_repository import CacheRepository
+            self.cache_repository = CacheRepository()
+    
+    def get_by_media(self, media_url):
+        """Look up by media SID/URL, before downloading anything"""
+        entrada = self._get(self._media_key(media_url))
+        if entrada:
+            MetricsHelper.increment('transcricao.hit_midia')
+            MetricsHelper.increment('transcricao.bytes_economizados', entrada.get('tamanho', 0))
+            MetricsHelper.increment('transcricao.chamadas_gemini_evitadas')
+            return entrada['texto']
+        return None
+    
+    def get_by_hash(self, media_url, audio):
+        """Look up by content hash after download (forwarded voice notes get new SIDs)"""
+        if not audio.get('hash'):
+            return None
+        
+        entrada = self._get(self._hash_key(audio['hash']))
+        if entrada:
+            MetricsHelper.increment('transcricao.hit_conteudo')
+            MetricsHelper.increment('transcricao.chamadas_gemini_evitadas')
+            # Remember this SID too, so a retry of the same message skips the download
+            self._put(self._media_key(media_url), entrada)
+            return entrada['texto']
+        return None
+    
+    def set(self, media_url, audio, texto):
+        """Store a transcription under both keys"""
+        entrada = {'texto': texto, 'tamanho': audio.get('tamanho', 0)}
+        self._put(self._media_key(media_url), entrada)
+        if audio.get('hash'):
+            self._put(self._hash_key(audio['hash']), entrada)
+    
+    def get_stats(self):
+        """Hit ratios, bytes saved and Gemini calls avoided"""
+        consultas = MetricsHelper.get('transcricao.consultas')
+        hits = MetricsHelper.get('transcricao.hit_midia') + MetricsHelper.get('transcricao.hit_conteudo')
+        return {
+            'taxa_hit': hits / consultas if consultas else 0.0,
+            'taxa_hit_midia': MetricsHelper.ratio('transcricao.hit_midia', 'transcricao.consultas'),
+            'bytes_economizados': MetricsHelper.get('transcricao.bytes_economizados'),
+            'chamadas_gemini_evitadas': MetricsHelper.get('transcricao.chamadas_gemini_evitadas'),
+            **MetricsHelper.get_counters('cache.transcricao')
+        }
+    
+    def _get(self, chave):
+        """Read from the in-memory tier, then from the persistent tier"""
+        entrada = _transcricoes.get(chave)
+        if entrada is None and self.cache_repository:
+            entrada = self.cache_repository.get(chave)
+            if entrada is not None:
+                _transcricoes.set(chave, entrada)
+        return entrada
+    
+    def _put(self, chave, entrada):
+        """Write to both tiers"""
+        _transcricoes.set(chave, entrada)
+        if self.cache_repository:
+            self.cache_repository.put(chave, entrada, TRANSCRIPTION_CACHE_TTL)
+    
+    @staticmethod
+    def _media_key(media_url):
+        """Key from the media SID (ME...), or the whole URL when it has none"""
+        match = MEDIA_SID_RE.search(media_url or '')
+        return f"transcricao#midia#{match.group(1) if match else media_url}"
+    
+    @staticmethod
+    def _hash_key(audio_hash):
+        """Key from the sha256 of the audio bytes"""
+        return f"transcricao#hash#{audio_hash}"
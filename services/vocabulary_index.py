@@ -0,0 +1,145 @@
+import logging
+import re
+from config.settings import (
+    DEFAULT_FAMILY_ID, VOCABULARY_MIN_COUNT, VOCABULARY_MIN_SHARE, VOCABULARY_CACHE_SIZE, VOCABULARY_CACHE_TTL
+)
+from repositories.rollup_repository import RollupRepository
+from repositories.vocabulary_repository import create_vocabulary_repository
+from services.local_parser_service import NUMEROS_POR_EXTENSO, PALAVRAS_MOEDA
+from utils.lru_cache import LRUCache
+from utils.metrics_helper import MetricsHelper
+from utils.text_helper import TextHelper
+
+logger = logging.getLogger()
+
+# Module scope: the terms of each scope already read by a warm container (unknown ones as {})
+_vocabularios = LRUCache('vocabulario', VOCABULARY_CACHE_SIZE, VOCABULARY_CACHE_TTL)
+
+# Words that say nothing about the category (accents already stripped)
+PALAVRAS_VAZIAS = {
+    'de', 'do', 'da', 'dos', 'das', 'no', 'na', 'nos', 'nas', 'em', 'com', 'para', 'pra', 'pro', 'por',
+    'pelo', 'pela', 'os', 'as', 'ao', 'aos', 'que', 'uns', 'umas', 'meu', 'minha', 'meus', 'minhas',
+    'nosso', 'nossa', 'hoje', 'ontem', 'agora', 'dia', 'mes', 'semana', 'mais', 'quase', 'valor', 'total',
+    'gastei', 'gastamos', 'gastar', 'gastou', 'paguei', 'pagamos', 'pagar', 'pagou', 'pago', 'comprei',
+    'compramos', 'comprar', 'comprou', 'custou', 'custa', 'deu', 'saiu', 'foi', 'acabei', 'gasto', 'despesa',
+    'conta', 'centavos', 'mil', 'esse', 'essa', 'isso', 'este', 'esta', 'aquele', 'aquela'
+} | set(NUMEROS_POR_EXTENSO) | PALAVRAS_MOEDA
+
+# Words of three or more letters; amounts and short particles carry no category
+PALAVRA_RE = re.compile(r'[a-z]{3,}')
+
+# A pair of words ('farmacia bairro') is more specific than either word alone
+PESO_PAR = 2
+
+class VocabularyIndex:
+    """Inverted index of description terms -> category counts, per user and per family.
+    
+    Learned from every saved expense, it lets the local parser categorize a sender's
+    recurring descriptions ("padaria", "farmácia do bairro") without asking Gemini.
+    A classification only reads the counters of the description's own terms.
+    """
+    
+    def __init__(self, repository=None):
+        self.repository = repository or create_vocabulary_repository()
+    
+    @staticmethod
+    def terms(descricao):
+        """Category-bearing terms of a description: its words and each pair of adjacent words"""
+        palavras = [
+            palavra for palavra in PALAVRA_RE.findall(TextHelper.normalize(descricao or ''))
+            if palavra not in PALAVRAS_VAZIAS
+        ]
+        pares = [f'{anterior} {seguinte}' for anterior, seguinte in zip(palavras, palavras[1:])]
+        return list(dict.fromkeys(palavras + pares))
+    
+    def classify(self, descricao, usuario, familia_id=None):
+        """Category the user's (else the family's) past expenses give a description, or None when unsure"""
+        termos = self.terms(descricao)
+        if not usuario or not termos:
+            return None
+        
+        try:
+            for escopo in self._scopes(usuario, familia_id):
+                categoria = self._vote(self._load(escopo, termos), termos)
+                if categoria:
+                    MetricsHelper.increment('vocabulario.classificada')
+                    return categoria
+        except Exception as error:
+            logger.error(f'Error reading vocabulary: {str(error)}')
+            return None
+        
+        MetricsHelper.increment('vocabulario.incerta')
+        return None
+    
+    def learn(self, despesas):
+        """Add saved expenses to their user's and family's vocabularies"""
+        for escopo, contagens in self._count(despesas).items():
+            self.repository.add_counts(escopo, contagens)
+            # Reloaded on next use, with other containers' updates too
+            _vocabularios.delete(escopo)
+    
+    def rebuild(self, despesas):
+        """Recompute the vocabulary of every scope present in a stream of expenses; returns how many"""
+        contagens_por_escopo = self._count(despesas)
+        for escopo, contagens in contagens_por_escopo.items():
+            self.repository.replace(escopo, contagens)
+            _vocabularios.delete(escopo)
+        
+        logger.info(f'Vocabularies rebuilt: {len(contagens_por_escopo)} scopes')
+        return len(contagens_por_escopo)
+    
+    def _count(self, despesas):
+        """{escopo: {(termo, categoria): n}} of a batch of expenses"""
+        contagens_por_escopo = {}
+        for despesa in despesas:
+            termos = self.terms(despesa.get('descricao'))
+            if not termos:
+                continue
+            categoria = despesa.get('categoria', 'outros')
+            usuario = despesa.get('user_id', 'desconhecido')
+            for escopo in self._scopes(usuario, despesa.get('familia_id') or DEFAULT_FAMILY_ID):
+                contagens = contagens_por_escopo.setdefault(escopo, {})
+                for termo in termos:
+                    contagens[(termo, categoria)] = contagens.get((termo, categoria), 0) + 1
+        return contagens_por_escopo
+    
+    def _vote(self, vocabulario, termos):
+        """Winning category of the known terms, if it has enough support and a clear majority"""
+        votos = {}
+        apoio = {}
+        for termo in termos:
+            por_categoria = vocabulario.get(termo)
+            if not por_categoria:
+                continue
+            # Each known term casts PESO_PAR (pairs) or 1 vote, split by its category counts
+            peso = (PESO_PAR if ' ' in termo else 1) / sum(por_categoria.values())
+            for categoria, quantidade in por_categoria.items():
+                votos[categoria] = votos.get(categoria, 0) + peso * quantidade
+                apoio[categoria] = max(apoio.get(categoria, 0), quantidade)
+        
+        if not votos:
+            return None
+        categoria = max(votos, key=votos.get)
+        if apoio[categoria] < VOCABULARY_MIN_COUNT or votos[categoria] / sum(votos.values()) < VOCABULARY_MIN_SHARE:
+            return None
+        return categoria
+    
+    def _load(self, escopo, termos):
+        """A scope's counters of some terms: the ones this container already read, plus the rest from the store"""
+        vocabulario = _vocabularios.get(escopo)
+        if vocabulario is None:
+            vocabulario = {}
+            _vocabularios.set(escopo, vocabulario)
+        
+        faltantes = [termo for termo in termos if termo not in vocabulario]
+        if faltantes:
+            lidos = self.repository.get_counts(escopo, faltantes)
+            vocabulario.update({termo: lidos.get(termo, {}) for termo in faltantes})
+        return vocabulario
+    
+    def _scopes(self, usuario, familia_id):
+        """Vocabulary scopes of a sender, most specific first"""
+        escopos = [RollupRepository.user_scope(usuario)]
+        if familia_id:
+            escopos.append(RollupRepository.family_scope(familia_id))
+        return escopos
@@ -0,0 +1,79 @@
+import base64
+import json
+import struct
+
+# Stand-in for the inline audio inside a serialized Gemini payload
+AUDIO_PLACEHOLDER = '__AUDIO_BASE64__'
+
+# Opus always reports granule positions at 48 kHz
+OPUS_SAMPLE_RATE = 48000
+
+
+class Base64StreamEncoder:
+    """Incremental base64 encoder: feed chunks, never hold the raw audio in memory"""
+    
+    def __init__(self):
+        self.resultado = bytearray()
+        self._resto = b''
+        self.tamanho = 0
+    
+    def feed(self, chunk):
+        """Encode a chunk, carrying over bytes that do not complete a 3-byte group"""
+        self.tamanho += len(chunk)
+        dados = self._resto + chunk if self._resto else chunk
+        corte = len(dados) - len(dados) % 3
+        self.resultado += base64.b64encode(dados[:corte])
+        self._resto = bytes(dados[corte:])
+    
+    def finish(self):
+        """Flush the remaining bytes (with padding) and return the encoded buffer"""
+        if self._resto:
+            self.resultado += base64.b64encode(self._resto)
+            self._resto = b''
+        return self.resultado
+
+
+class SizedStream:
+    """Iterable request body with a known length, so requests streams it with Content-Length"""
+    
+    def __init__(self, chunks, tamanho):
+        self.chunks = chunks
+        self.tamanho = tamanho
+    
+    def __iter__(self):
+        return iter(self.chunks)
+    
+    def __len__(self):
+        return self.tamanho
+
+
+class AudioHelper:
+    """Helper class for audio size/duration checks and Gemini audio payloads"""
+    
+    @staticmethod
+    def ogg_duration(final_do_arquivo):
+        """Duration in seconds from the last Ogg page's granule position, or None"""
+        posicao = final_do_arquivo.rfind(b'OggS')
+        if posicao < 0 or len(final_do_arquivo) < posicao + 14:
+            return None
+        granule = struct.unpack_from('<q', final_do_arquivo, posicao + 6)[0]
+        if granule <= 0:
+            return None
+        return granule / OPUS_SAMPLE_RATE
+    
+    @staticmethod
+    def gemini_part(audio):
+        """Gemini content part for a downloaded audio (inline placeholder or uploaded file)"""
+        if audio.get('file_uri'):
+            return {"fileData": {"mimeType": audio['content_type'], "fileUri": audio['file_uri']}}
+        return {"inlineData": {"mimeType": audio['content_type'], "data": AUDIO_PLACEHOLDER}}
+    
+    @staticmethod
+    def serialize_payload(payload, audio=None):
+        """Serialize a Gemini payload, splicing the base64 audio in without re-encoding it"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        if not audio or audio.get('base64') is None:
+            return body
+        
+        prefixo, sufixo = body.split(AUDIO_PLACEHOLDER.encode('utf-8'), 1)
+        return b''.join((prefixo, audio['base64'], sufixo))
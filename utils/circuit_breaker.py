@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+from utils.metrics_helper import MetricsHelper
+
+logger = logging.getLogger()
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)"""
+    
+    def __init__(self, nome, limite_falhas=5, tempo_aberto=30.0):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """Whether a call may go through (one probe is let through after the cooldown)"""
+        with self._lock:
+            if self._falhas < self.limite_falhas:
+                return True
+            if time.monotonic() >= self._aberto_ate:
+                # Half-open: allow one probe and push the window forward
+                self._aberto_ate = time.monotonic() + self.tempo_aberto
+                return True
+            MetricsHelper.increment(f'circuito.{self.nome}.rejeitado')
+            return False
+    
+    def is_open(self):
+        """Whether calls are currently being short-circuited"""
+        with self._lock:
+            return self._falhas >= self.limite_falhas and time.monotonic() < self._aberto_ate
+    
+    def record_success(self):
+        """Close the circuit"""
+        with self._lock:
+            if self._falhas >= self.limite_falhas:
+                logger.info(f'Circuit {self.nome} closed')
+            self._falhas = 0
+    
+    def record_failure(self):
+        """Count a failure, opening the circuit at the threshold"""
+        with self._lock:
+            self._falhas += 1
+            if self._falhas == self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.tempo_aberto
+                MetricsHelper.increment(f'circuito.{self.nome}.aberto')
+                logger.warning(f'Circuit {self.nome} opened after {self._falhas} failures')
+            elif self._falhas > self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.tempo_aberto
@@ -0,0 +1,73 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from config.settings import IO_POOL_WORKERS
+from utils.deadline_helper import DeadlineHelper
+
+logger = logging.getLogger()
+
+# Module scope: one bounded pool per container, reused by warm invocations
+_executor = None
+_lock = threading.Lock()
+_local = threading.local()
+
+def _mark_worker():
+    _local.worker = True
+
+class ConcurrencyHelper:
+    """Helper class that runs independent I/O calls at once on a shared thread pool"""
+    
+    @staticmethod
+    def run_parallel(tarefas, timeout_maximo=None):
+        """Run {nome: funcao} concurrently and return {nome: resultado}.
+        
+        The first call runs on the calling thread and the others on the pool, so a
+        call may itself fan out without waiting on pool threads. The rest is awaited
+        up to timeout_maximo and the invocation deadline: on the first error, or when
+        time runs out, calls not yet started are cancelled and the error (or
+        TimeoutError) is raised; calls already running finish in the background and
+        their results are dropped.
+        """
+        # Inline when the pool is disabled, for a single call, or inside a pool thread (no nested waits)
+        if IO_POOL_WORKERS <= 0 or len(tarefas) < 2 or getattr(_local, 'worker', False):
+            return {nome: funcao() for nome, funcao in tarefas.items()}
+        
+        executor = ConcurrencyHelper._get_executor()
+        primeira, *demais = tarefas
+        futuros = {nome: executor.submit(tarefas[nome]) for nome in demais}
+        
+        try:
+            resultados = {primeira: tarefas[primeira]()}
+        except Exception:
+            for futuro in futuros.values():
+                futuro.cancel()
+            raise
+        
+        timeout = DeadlineHelper.timeout(timeout_maximo) if timeout_maximo is not None else DeadlineHelper.remaining()
+        concluidos, pendentes = wait(futuros.values(), timeout=timeout, return_when=FIRST_EXCEPTION)
+        
+        for futuro in pendentes:
+            futuro.cancel()
+        for futuro in concluidos:
+            if futuro.exception() is not None:
+                raise futuro.exception()
+        if pendentes:
+            atrasadas = [nome for nome, futuro in futuros.items() if futuro in pendentes]
+            logger.warning(f'Parallel calls out of time: {atrasadas}')
+            raise TimeoutError(f'Calls did not finish in time: {atrasadas}')
+        
+        for nome, futuro in futuros.items():
+            resultados[nome] = futuro.result()
+        return resultados
+    
+    @staticmethod
+    def _get_executor():
+        """Get the shared pool (IO_POOL_WORKERS threads, started on first use)"""
+        global _executor
+        if _executor is None:
+            with _lock:
+                if _executor is None:
+                    _executor = ThreadPoolExecutor(
+                        max_workers=IO_POOL_WORKERS, thread_name_prefix='io', initializer=_mark_worker
+                    )
+        return _executor
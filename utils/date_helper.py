@@ -8,4 +8,33 @@ class DateHelper:
             'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
             'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
         ]
-        return meses[numero_mes] if 0 <= numero_mes < 12 else 'Mês'
\ No newline at end of file
+        return meses[numero_mes] if 0 <= numero_mes < 12 else 'Mês'
+    
+    @staticmethod
+    def get_month_period(numero_mes):
+        """Get the period label of a month (1-12), e.g. 'mês de agosto'"""
+        return f"mês de {DateHelper.get_month_name(numero_mes - 1).lower()}"
+    
+    @staticmethod
+    def get_period_labels(data_iso):
+        """Period labels a report covering this timestamp may use"""
+        return ["semana atual", DateHelper.get_month_period(int(data_iso[5:7]))]
+    
+    @staticmethod
+    def get_month_key(data_iso):
+        """Get the YYYY-MM bucket for an ISO timestamp"""
+        return data_iso[:7]
+    
+    @staticmethod
+    def get_month_keys(inicio_data, fim_data):
+        """List the YYYY-MM buckets covered by an ISO date range"""
+        ano, mes = int(inicio_data[:4]), int(inicio_data[5:7])
+        ano_fim, mes_fim = int(fim_data[:4]), int(fim_data[5:7])
+        
+        meses = []
+        while (ano, mes) <= (ano_fim, mes_fim):
+            meses.append(f"{ano:04d}-{mes:02d}")
+            mes += 1
+            if mes > 12:
+                ano, mes = ano + 1, 1
+        return meses
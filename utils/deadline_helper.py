@@ -0,0 +1,40 @@
+import time
+from config.settings import DEADLINE_SAFETY_MARGIN
+
+# Module scope: one invocation at a time per container, shared by worker threads
+_deadline = None
+
+class DeadlineHelper:
+    """Helper class that tracks the time left in the current invocation"""
+    
+    @staticmethod
+    def start(context, limite_segundos=None):
+        """Start the deadline from the Lambda context (and an optional tighter limit)"""
+        global _deadline
+        restante = None
+        
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            restante = context.get_remaining_time_in_millis() / 1000
+        if limite_segundos is not None:
+            restante = limite_segundos if restante is None else min(restante, limite_segundos)
+        
+        _deadline = time.monotonic() + restante - DEADLINE_SAFETY_MARGIN if restante is not None else None
+    
+    @staticmethod
+    def clear():
+        """Forget the deadline (end of invocation)"""
+        global _deadline
+        _deadline = None
+    
+    @staticmethod
+    def remaining():
+        """Seconds left, or None when no deadline is set"""
+        if _deadline is None:
+            return None
+        return max(0.0, _deadline - time.monotonic())
+    
+    @staticmethod
+    def timeout(maximo):
+        """Timeout for the next call: the configured maximum, capped by the time left"""
+        restante = DeadlineHelper.remaining()
+        return maximo if restante is None else min(maximo, restante)
@@ -0,0 +1,23 @@
+import boto3
+
+# Module scope: created once per container and reused by warm invocations
+_dynamodb = None
+_tables = {}
+
+class DynamoDBHelper:
+    """Helper class that caches the DynamoDB resource and table handles"""
+    
+    @staticmethod
+    def get_resource():
+        """Get the shared DynamoDB resource"""
+        global _dynamodb
+        if _dynamodb is None:
+            _dynamodb = boto3.resource('dynamodb')
+        return _dynamodb
+    
+    @staticmethod
+    def get_table(nome_tabela):
+        """Get a cached table handle"""
+        if nome_tabela not in _tables:
+            _tables[nome_tabela] = DynamoDBHelper.get_resource().Table(nome_tabela)
+        return _tables[nome_tabela]
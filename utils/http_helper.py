@@ -0,0 +1,39 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Module scope: keep-alive connections survive across warm invocations
+_session = None
+
+class HttpHelper:
+    """Helper class that provides a pooled, retrying HTTP session"""
+    
+    @staticmethod
+    def get_session():
+        """Get the shared requests session (Gemini and Twilio)"""
+        global _session
+        if _session is None:
+            _session = HttpHelper._create_session()
+        return _session
+    
+    @staticmethod
+    def _create_session():
+        """Create a session with connection pooling and retries on transient errors.
+        
+        Only GETs (Twilio media) are retried here; Gemini POSTs are retried by
+        GeminiClient, which knows how much time the request has left.
+        """
+        retry = Retry(
+            total=2,
+            connect=2,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry)
+        
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
@@ -0,0 +1,21 @@
+CAMPOS_DESPESA = ('valor', 'categoria', 'descricao')
+
+class InterpretationHelper:
+    """Helper class for the shape of interpretations shared by Gemini, the local parser and the caches"""
+    
+    @staticmethod
+    def expense_items(interpretacao):
+        """Expenses of a 'despesa' interpretation: the 'despesas' list, or the legacy single-expense fields"""
+        itens = interpretacao.get('despesas')
+        if isinstance(itens, list):
+            return itens
+        return [{campo: interpretacao[campo] for campo in CAMPOS_DESPESA if campo in interpretacao}]
+    
+    @staticmethod
+    def normalize(interpretacao):
+        """Interpretation with its expenses always in the 'despesas' list"""
+        if interpretacao.get('tipo') != 'despesa' or isinstance(interpretacao.get('despesas'), list):
+            return interpretacao
+        normalizada = {campo: valor for campo, valor in interpretacao.items() if campo not in CAMPOS_DESPESA}
+        normalizada['despesas'] = InterpretationHelper.expense_items(interpretacao)
+        return normalizada
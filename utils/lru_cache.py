@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+from utils.metrics_helper import MetricsHelper
+
+class LRUCache:
+    """In-process LRU cache with per-entry TTL and hit/miss/eviction counters"""
+    
+    def __init__(self, nome, max_itens=256, ttl_segundos=None):
+        self.nome = nome
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._itens = OrderedDict()
+        # Requests fan reads out to worker threads, which may touch the same cache
+        self._lock = threading.Lock()
+    
+    def get(self, chave):
+        """Return a cached value (refreshing its recency) or None"""
+        with self._lock:
+            entrada = self._itens.get(chave)
+            if entrada is None:
+                MetricsHelper.increment(f'cache.{self.nome}.miss')
+                return None
+            
+            valor, expira_em = entrada
+            if expira_em is not None and expira_em <= time.monotonic():
+                del self._itens[chave]
+                MetricsHelper.increment(f'cache.{self.nome}.expirado')
+                MetricsHelper.increment(f'cache.{self.nome}.miss')
+                return None
+            
+            self._itens.move_to_end(chave)
+        MetricsHelper.increment(f'cache.{self.nome}.hit')
+        return valor
+    
+    def set(self, chave, valor, ttl_segundos=None):
+        """Store a value, evicting the least recently used entries when full"""
+        ttl = ttl_segundos if ttl_segundos is not None else self.ttl_segundos
+        expira_em = time.monotonic() + ttl if ttl else None
+        
+        with self._lock:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                MetricsHelper.increment(f'cache.{self.nome}.eviction')
+    
+    def delete(self, chave):
+        """Remove an entry if present"""
+        with self._lock:
+            self._itens.pop(chave, None)
+    
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._itens.clear()
+    
+    def __len__(self):
+        return len(self._itens)
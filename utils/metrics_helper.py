@@ -0,0 +1,40 @@
+import threading
+from utils.tracing_helper import TracingHelper
+
+# Module scope: counters accumulate for the lifetime of a warm container
+_counters = {}
+_lock = threading.Lock()
+
+class MetricsHelper:
+    """Helper class for lightweight in-process counters, also emitted with the current request"""
+    
+    @staticmethod
+    def increment(nome, valor=1):
+        """Increment a named counter (called from pool threads too)"""
+        with _lock:
+            _counters[nome] = _counters.get(nome, 0) + valor
+        # Per-request copy in the EMF line, so hit rates can be charted across containers
+        TracingHelper.add_metric(nome, valor)
+    
+    @staticmethod
+    def get(nome):
+        """Get the current value of a counter"""
+        return _counters.get(nome, 0)
+    
+    @staticmethod
+    def get_counters(prefixo=''):
+        """Snapshot of every counter whose name starts with a prefix"""
+        with _lock:
+            return {nome: valor for nome, valor in _counters.items() if nome.startswith(prefixo)}
+    
+    @staticmethod
+    def ratio(parte, total):
+        """Safe ratio between two counters"""
+        denominador = _counters.get(total, 0)
+        return _counters.get(parte, 0) / denominador if denominador else 0.0
+    
+    @staticmethod
+    def reset():
+        """Clear every counter (tests and benchmarks)"""
+        with _lock:
+            _counters.clear()
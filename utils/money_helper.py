@@ -0,0 +1,27 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+UM = Decimal('1')
+
+class MoneyHelper:
+    """Helper class for amounts kept as integer cents, so sums never touch float or Decimal"""
+    
+    @staticmethod
+    def to_cents(valor):
+        """Integer cents of an amount in reais (int, float, str or Decimal), rounded half up"""
+        if isinstance(valor, int):
+            return valor * 100
+        return int((Decimal(str(valor)) * 100).quantize(UM, rounding=ROUND_HALF_UP))
+    
+    @staticmethod
+    def item_cents(item, campo='valor'):
+        """Cents of a stored item: `<campo>_centavos`, or legacy Decimal reais in `<campo>`"""
+        centavos = item.get(f'{campo}_centavos')
+        if centavos is not None:
+            return int(centavos)
+        return MoneyHelper.to_cents(item.get(campo, 0))
+    
+    @staticmethod
+    def format(centavos):
+        """Reais with two decimals, e.g. 123456 -> '1234.56'"""
+        # centavos / 100 is the double nearest the exact amount, so rounding to 2 places is exact
+        return f'{centavos / 100:.2f}'
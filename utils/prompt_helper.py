@@ -0,0 +1,32 @@
+# Average characters per Gemini token in Portuguese prompts; only used for budgets
+CARACTERES_POR_TOKEN = 4
+
+class PromptHelper:
+    """Helper class for estimating and capping the tokens of prompt text"""
+    
+    @staticmethod
+    def estimate_tokens(texto):
+        """Rough token count of a text (rounded up)"""
+        return -(-len(texto) // CARACTERES_POR_TOKEN)
+    
+    @staticmethod
+    def fit_lines(linhas, orcamento_tokens):
+        """Leading lines that fit in a token budget (newlines included) and the budget left"""
+        escolhidas = []
+        for linha in linhas:
+            custo = PromptHelper.estimate_tokens(linha) + 1
+            if custo > orcamento_tokens:
+                break
+            escolhidas.append(linha)
+            orcamento_tokens -= custo
+        return escolhidas, orcamento_tokens
+    
+    @staticmethod
+    def clip(texto, max_caracteres):
+        """Text cut to a maximum length at a word boundary when possible"""
+        texto = ' '.join(texto.split())
+        if len(texto) <= max_caracteres:
+            return texto
+        cortado = texto[:max_caracteres]
+        espaco = cortado.rfind(' ')
+        return cortado[:espaco] if espaco > max_caracteres // 2 else cortado
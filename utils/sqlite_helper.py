@@ -0,0 +1,33 @@
+import sqlite3
+import threading
+
+# Module scope: one connection per database and thread, reused by warm invocations
+_local = threading.local()
+
+class SqliteHelper:
+    """Helper class that caches SQLite connections tuned for many small writes and range reads"""
+    
+    @staticmethod
+    def get_connection(caminho):
+        """Get this thread's connection to a database file (':memory:' is shared by the process)"""
+        conexoes = getattr(_local, 'conexoes', None)
+        if conexoes is None:
+            conexoes = _local.conexoes = {}
+        
+        if caminho not in conexoes:
+            conexoes[caminho] = SqliteHelper._connect(caminho)
+        return conexoes[caminho]
+    
+    @staticmethod
+    def _connect(caminho):
+        """Open a connection in autocommit mode with WAL (readers never block the writer)"""
+        if caminho == ':memory:':
+            # Named shared-cache database, so every thread sees the same data
+            conexao = sqlite3.connect('file:despesas?mode=memory&cache=shared', uri=True, isolation_level=None)
+        else:
+            conexao = sqlite3.connect(caminho, isolation_level=None, timeout=5)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            # With WAL, NORMAL only syncs at checkpoints: durable across crashes of the process
+            conexao.execute('PRAGMA synchronous=NORMAL')
+        
+        return conexao
@@ -0,0 +1,17 @@
+import re
+import unicodedata
+
+class TextHelper:
+    """Helper class for Portuguese text normalization"""
+    
+    @staticmethod
+    def strip_accents(texto):
+        """Remove accents (ç, ã, é...) from a string"""
+        decomposto = unicodedata.normalize('NFKD', texto)
+        return ''.join(c for c in decomposto if not unicodedata.combining(c))
+    
+    @staticmethod
+    def normalize(texto):
+        """Case-fold, strip accents and collapse whitespace"""
+        texto = TextHelper.strip_accents(texto.casefold())
+        return re.sub(r'\s+', ' ', texto).strip()
@@ -0,0 +1,110 @@
+import json
+import sys
+import threading
+import time
+from config.settings import TRACING_ENABLED, METRICS_NAMESPACE
+
+# Module scope: the request currently being traced (spans from worker threads add to it)
+_request = None
+_lock = threading.Lock()
+
+# Fixed EMF dimension set: other tags (erro, midia) stay plain properties, searchable in Logs Insights
+DIMENSOES = ('handler', 'intent')
+
+
+class _NoopSpan:
+    """Span used when tracing is disabled"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """Timed span that adds its duration (ms) to the current request"""
+    
+    __slots__ = ('nome', 'inicio')
+    
+    def __init__(self, nome):
+        self.nome = nome
+    
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        TracingHelper.add_metric(f'{self.nome}_ms', (time.perf_counter() - self.inicio) * 1000)
+        return False
+
+
+class TracingHelper:
+    """Helper class for per-stage latency spans emitted as CloudWatch EMF lines"""
+    
+    @staticmethod
+    def start_request(**tags):
+        """Start collecting spans and metrics for a new request"""
+        global _request
+        if not TRACING_ENABLED:
+            return
+        _request = {'inicio': time.perf_counter(), 'tags': dict(tags), 'metricas': {}}
+    
+    @staticmethod
+    def span(nome):
+        """Context manager timing one stage (parse, download, transcricao, ...)"""
+        if _request is None:
+            return _NOOP_SPAN
+        return _Span(nome)
+    
+    @staticmethod
+    def set_tag(nome, valor):
+        """Tag the request (handler and intent are EMF dimensions, other tags plain properties)"""
+        if _request is not None:
+            _request['tags'][nome] = valor
+    
+    @staticmethod
+    def add_metric(nome, valor):
+        """Add to a numeric metric of the current request (durations, token counts)"""
+        if _request is None:
+            return
+        with _lock:
+            metricas = _request['metricas']
+            metricas[nome] = metricas.get(nome, 0) + valor
+    
+    @staticmethod
+    def flush():
+        """Emit the request as one EMF JSON line on stdout and stop tracing"""
+        global _request
+        request, _request = _request, None
+        if request is None:
+            return None
+        
+        metricas = dict(request['metricas'])
+        metricas['total_ms'] = (time.perf_counter() - request['inicio']) * 1000
+        tags = {nome: str(valor) for nome, valor in request['tags'].items()}
+        # Every line carries the same dimensions, so each metric is one CloudWatch series per handler/intent
+        for nome in DIMENSOES:
+            tags.setdefault(nome, 'nenhuma')
+        
+        linha = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [list(DIMENSOES)],
+                    'Metrics': [
+                        {'Name': nome, 'Unit': 'Milliseconds' if nome.endswith('_ms') else 'Count'}
+                        for nome in sorted(metricas)
+                    ]
+                }]
+            },
+            **tags,
+            **{nome: round(valor, 3) for nome, valor in metricas.items()}
+        }
+        
+        sys.stdout.write(json.dumps(linha) + '\n')
+        return linha